@@ -0,0 +1,126 @@
+"""
+Async Chat History Database Module
+asyncio wrapper around ChatDatabase that runs SQLite calls on a dedicated thread pool
+"""
+
+import asyncio
+import functools
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from chat_database import ChatDatabase
+from history_cache import HistoryCache
+from write_behind import WriteBehindWriter
+
+
+class AsyncChatDatabase:
+    """Non-blocking mirror of the ChatDatabase API for use inside an event loop"""
+
+    def __init__(self, db_path: str = "chat_history.db", max_workers: int = 8,
+                 busy_timeout: int = 5000, synchronous: str = 'NORMAL',
+                 history_cache: Optional[HistoryCache] = None, compression: Optional[str] = None,
+                 write_behind_ms: Optional[float] = None):
+        """
+        Open a pooled ChatDatabase and the executor its calls run on
+
+        Args:
+            db_path: Path to the SQLite database file
+            max_workers: Number of threads serving database calls
+            busy_timeout: Milliseconds to wait on a locked database
+            synchronous: SQLite synchronous level
+            history_cache: Cache of formatted history kept up to date on writes
+            compression: Compact storage mode of the ChatDatabase ('zlib', 'zstd' or None)
+            write_behind_ms: Commit queue_messages() writes on a WriteBehindWriter with
+                this flush interval (0 = every batch); None writes them before returning
+        """
+        # Pooled mode gives every executor thread its own reader and serializes writes
+        self.db = ChatDatabase(db_path, pooled=True, busy_timeout=busy_timeout,
+                               synchronous=synchronous, history_cache=history_cache,
+                               compression=compression)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,
+                                           thread_name_prefix='chat-db')
+        self.writer = (WriteBehindWriter(self.db, flush_interval_ms=write_behind_ms)
+                       if write_behind_ms is not None else None)
+
+    async def _run(self, func, *args, **kwargs):
+        """Run a blocking ChatDatabase call on the executor and await its result"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    async def create_conversation(self, session_id: str, title: Optional[str] = None,
+                                  metadata: Optional[Dict] = None) -> int:
+        """Create a new conversation and return its ID"""
+        return await self._run(self.db.create_conversation, session_id, title, metadata)
+
+    async def get_or_create_conversation_with_history(self, session_id: str, title: Optional[str] = None,
+                                                      metadata: Optional[Dict] = None,
+                                                      since_id: int = 0) -> Tuple[int, List[Tuple[int, str, str]]]:
+        """Return a session's conversation ID with its messages newer than since_id, creating it if needed"""
+        return await self._run(self.db.get_or_create_conversation_with_history,
+                               session_id, title, metadata, since_id)
+
+    async def add_message(self, conversation_id: int, role: str, content: str,
+                          metadata: Optional[Dict] = None) -> int:
+        """Add a message to a conversation"""
+        return await self._run(self.db.add_message, conversation_id, role, content, metadata)
+
+    async def add_messages(self, conversation_id: int, messages: List[Tuple]) -> List[int]:
+        """Add several messages to a conversation in a single transaction"""
+        return await self._run(self.db.add_messages, conversation_id, messages)
+
+    async def queue_messages(self, conversation_id: int, messages: List[Tuple]):
+        """Hand messages to the write-behind writer, or add them now when there is none"""
+        if self.writer is None:
+            await self.add_messages(conversation_id, messages)
+            return
+        try:
+            self.writer.submit(conversation_id, messages, block=False)
+        except queue.Full:
+            # The writer is behind, wait for room off the event loop
+            await self._run(self.writer.submit, conversation_id, messages)
+
+    async def wait_for_writes(self, conversation_id: int):
+        """Wait until queued writes of a conversation are committed, so reads see them"""
+        future = self.writer.pending(conversation_id) if self.writer is not None else None
+        if future is not None:
+            await asyncio.wait([asyncio.wrap_future(future)])
+
+    async def get_conversation_messages(self, session_id: str) -> List[Tuple[str, str]]:
+        """Get all messages from a conversation by session ID"""
+        return await self._run(self.db.get_conversation_messages, session_id)
+
+    async def get_messages_since(self, session_id: str, since_id: int = 0) -> List[Tuple[int, str, str]]:
+        """Get (id, role, content) for messages of a session with an ID greater than since_id"""
+        return await self._run(self.db.get_messages_since, session_id, since_id)
+
+    async def get_recent_conversations(self, limit: int = 10) -> List[Dict]:
+        """Get most recent conversations"""
+        return await self._run(self.db.get_recent_conversations, limit)
+
+    async def delete_conversation(self, session_id: str):
+        """Delete a conversation and all its messages"""
+        return await self._run(self.db.delete_conversation, session_id)
+
+    async def search_messages(self, query: str, limit: int = 20) -> List[Dict]:
+        """Search for messages containing the query text"""
+        return await self._run(self.db.search_messages, query, limit)
+
+    async def export_conversation(self, session_id: str) -> Dict:
+        """Export a conversation in a structured format"""
+        return await self._run(self.db.export_conversation, session_id)
+
+    async def close(self):
+        """Wait for pending calls and queued writes, then close the executor and the database"""
+        await asyncio.to_thread(self.executor.shutdown, True)
+        if self.writer is not None:
+            await asyncio.to_thread(self.writer.close)
+        self.db.close()
+
+    async def __aenter__(self):
+        """Async context manager entry"""
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """Async context manager exit - ensure connections are closed"""
+        await self.close()
@@ -0,0 +1,121 @@
+"""
+Batch summarization CLI
+Precomputes summaries for every (paper, style, length) combination through the
+batch lane of an LLMScheduler (bounded concurrency, request and token rate limits,
+retries with jittered backoff), writing each result as soon as it arrives.
+Re-running the command skips combinations that are already stored, so an
+interrupted run resumes where it stopped.
+
+Usage:
+    python3 batch_summarize.py --papers papers.txt --concurrency 8 --rpm 300 --tpm 150000
+"""
+
+import argparse
+import asyncio
+import itertools
+import time
+
+from dotenv import load_dotenv
+
+from llm_scheduler import BATCH, LLMScheduler, scheduled
+from summary_options import LENGTHS, PAPERS, STYLES, TEMPLATE_PATH, TEMPLATE_VARIABLES
+from summary_store import SummaryStore
+from template_registry import registry
+
+
+def read_papers(path):
+    """Read one paper title per line, skipping blanks and # comments"""
+    with open(path, encoding='utf-8') as f:
+        lines = [line.strip() for line in f]
+    return [line for line in lines if line and not line.startswith('#')]
+
+
+def build_model(args, scheduler):
+    """Create the chat model, or the offline fake model with --fake, queued in the batch lane"""
+    if args.fake:
+        from fake_chat_model import FakeChatModel
+        model = FakeChatModel(latency=args.fake_latency)
+    else:
+        from langchain_openai import ChatOpenAI
+        model = ChatOpenAI(model=args.model, max_tokens=2000)
+    return scheduled(model, lane=BATCH, scheduler=scheduler)
+
+
+async def run_batch(jobs, chain, store, model_name, concurrency):
+    """
+    Run all jobs through the chain and store each summary as it completes
+
+    Returns:
+        Number of summaries stored and list of (job, exception) failures
+    """
+    inputs = [{'a': paper, 'b': style, 'c': length} for paper, style, length in jobs]
+    stored = 0
+    failures = []
+
+    async for index, result in chain.abatch_as_completed(
+        inputs, config={'max_concurrency': concurrency}, return_exceptions=True
+    ):
+        paper, style, length = jobs[index]
+        if isinstance(result, Exception):
+            failures.append((jobs[index], result))
+            print(f"  FAILED {paper} / {style} / {length}: {result}")
+            continue
+
+        store.save_summary(paper, style, length, result.content, model_name)
+        stored += 1
+        print(f"  [{stored}/{len(jobs)}] {paper} / {style} / {length}")
+
+    return stored, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarize every paper in every style and length')
+    parser.add_argument('--papers', help='Text file with one paper title per line (default: the UI paper list)')
+    parser.add_argument('--styles', nargs='+', default=STYLES, help='Summary styles to generate')
+    parser.add_argument('--lengths', nargs='+', default=LENGTHS, help='Summary lengths to generate')
+    parser.add_argument('--db', default='chat_history.db', help='Database the summaries are written to')
+    parser.add_argument('--model', default='gpt-4o', help='OpenAI model name')
+    parser.add_argument('--concurrency', type=int, default=8, help='Maximum requests in flight')
+    parser.add_argument('--rpm', type=float, default=300, help='Maximum requests per minute')
+    parser.add_argument('--tpm', type=float, help='Maximum prompt plus reply tokens per minute')
+    parser.add_argument('--retries', type=int, default=5, help='Attempts per request before giving up')
+    parser.add_argument('--fake', action='store_true', help='Use the offline fake chat model')
+    parser.add_argument('--fake-latency', type=float, default=0.5, help='Seconds per fake model call')
+    args = parser.parse_args()
+
+    load_dotenv()
+
+    papers = read_papers(args.papers) if args.papers else PAPERS
+    template = registry.get_template(TEMPLATE_PATH, TEMPLATE_VARIABLES)
+
+    # The scheduler retries rate-limit and transient API errors with jittered backoff
+    scheduler = LLMScheduler(
+        requests_per_minute=args.rpm,
+        tokens_per_minute=args.tpm,
+        max_concurrency=args.concurrency,
+        lane_limits={BATCH: args.concurrency},
+        max_retries=args.retries - 1
+    )
+    model = build_model(args, scheduler)
+    chain = template | model
+
+    with SummaryStore(args.db) as store:
+        done = store.completed()
+        jobs = [job for job in itertools.product(papers, args.styles, args.lengths) if job not in done]
+        total = len(papers) * len(args.styles) * len(args.lengths)
+        print(f"{total - len(jobs)} of {total} summaries already stored, {len(jobs)} to generate")
+
+        start = time.perf_counter()
+        stored, failures = asyncio.run(
+            run_batch(jobs, chain, store, 'fake-chat' if args.fake else args.model, args.concurrency)
+        )
+        elapsed = time.perf_counter() - start
+
+    scheduler.close()
+    print(f"\nStored {stored} summaries in {elapsed:.1f}s, {len(failures)} failed")
+    if failures:
+        print("Re-run the same command to retry the failed combinations")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Benchmark for history compaction policies
+Simulates long sessions against a fake LLM and reports prompt size and latency per turn
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from collections import namedtuple
+
+from chat_database import ChatDatabase
+from history_compaction import (HeadTailPolicy, LastNTokensPolicy, RollingSummaryPolicy,
+                                message_tokens)
+
+
+FakeMessage = namedtuple('FakeMessage', ['type', 'content'])
+
+WORDS = ['order', 'refund', 'shipping', 'account', 'password', 'warranty', 'payment',
+         'tracking', 'delivery', 'subscription', 'please', 'thanks', 'help', 'status']
+
+
+class FakeLLM:
+    """Offline stand-in for a chat model whose latency grows with prompt size"""
+
+    def __init__(self, base_ms: float = 1.0, ms_per_1k_tokens: float = 2.0):
+        self.base_ms = base_ms
+        self.ms_per_1k_tokens = ms_per_1k_tokens
+        self.calls = 0
+
+    def invoke(self, messages):
+        """Sleep like a model would for this prompt size and return a canned reply"""
+        self.calls += 1
+        tokens = sum(message_tokens(m) for m in messages)
+        time.sleep((self.base_ms + self.ms_per_1k_tokens * tokens / 1000) / 1000)
+        return FakeMessage('ai', 'fake summary ' * 40)
+
+    def summarize(self, previous_summary, messages):
+        """Summarizer callback for RollingSummaryPolicy"""
+        return self.invoke(messages).content
+
+
+class FullHistoryPolicy:
+    """Baseline that sends the whole transcript, as chat_with_history used to"""
+
+    def compact(self, messages, db=None, conversation_id=None):
+        return messages
+
+
+def random_message(rng, role):
+    """Generate a support-style message of random length"""
+    return FakeMessage(role, ' '.join(rng.choice(WORDS) for _ in range(rng.randint(10, 120))))
+
+
+def run_policy(name, make_policy, turns, report_every, seed=7):
+    """Play a session turn by turn and print prompt size and latency at checkpoints"""
+    rng = random.Random(seed)
+    llm = FakeLLM()
+    policy = make_policy(llm)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = ChatDatabase(os.path.join(tmp_dir, 'bench.db'))
+        conv_id = db.create_conversation('bench')
+        history = []
+
+        print(f'\n{name}')
+        print(f"{'turn':>6} {'history msgs':>13} {'prompt tokens':>14} {'compact ms':>11} "
+              f"{'turn ms':>9} {'llm calls':>10}")
+
+        for turn in range(1, turns + 1):
+            query = random_message(rng, 'human')
+
+            start = time.perf_counter()
+            compacted = policy.compact(history, db, conv_id)
+            compact_ms = (time.perf_counter() - start) * 1000
+            llm.invoke(compacted + [query])
+            turn_ms = (time.perf_counter() - start) * 1000
+
+            history.extend([query, random_message(rng, 'ai')])
+
+            if turn % report_every == 0:
+                prompt_tokens = sum(message_tokens(m) for m in compacted + [query])
+                print(f'{turn:>6} {len(history):>13} {prompt_tokens:>14} {compact_ms:>11.2f} '
+                      f'{turn_ms:>9.2f} {llm.calls:>10}')
+
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark history compaction policies')
+    parser.add_argument('--turns', type=int, default=500, help='Turns per simulated session')
+    parser.add_argument('--max-tokens', type=int, default=4000, help='Token budget per prompt')
+    parser.add_argument('--report-every', type=int, default=50, help='Print a row every N turns')
+    args = parser.parse_args()
+
+    identity = lambda role, content: FakeMessage(role, content)
+    policies = [
+        ('full history (no compaction)', lambda llm: FullHistoryPolicy()),
+        ('last-N tokens', lambda llm: LastNTokensPolicy(args.max_tokens)),
+        ('head + tail', lambda llm: HeadTailPolicy(args.max_tokens)),
+        ('rolling summary', lambda llm: RollingSummaryPolicy(llm.summarize, identity, args.max_tokens)),
+    ]
+
+    for name, make_policy in policies:
+        run_policy(name, make_policy, args.turns, args.report_every)
+
+
+if __name__ == '__main__':
+    main()
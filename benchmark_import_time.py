@@ -0,0 +1,103 @@
+"""
+Startup benchmark for the command line
+Runs each database-only CLI command in a fresh interpreter under
+`python -X importtime`, reports the import time attributable to the command
+(interpreter startup and site imports excluded) plus the process wall time,
+and exits non-zero when a command exceeds the threshold or pulls in LangChain.
+
+Usage:
+    python3 benchmark_import_time.py --threshold-ms 100
+"""
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from chat_database import ChatDatabase
+
+
+# Modules a database-only command must never import
+LLM_MODULES = ('langchain_core', 'langchain_openai', 'openai', 'dotenv', 'streamlit')
+
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+RUNNER = (
+    "import sys, cli; code = cli.main(sys.argv[1:]); "
+    "loaded = [m for m in {modules!r} if m in sys.modules]; "
+    "sys.stderr.write('LLM modules loaded: ' + ','.join(loaded) + '\\n'); sys.exit(code)"
+)
+
+
+def top_level_imports(stderr: str) -> dict:
+    """Map each top-level module in -X importtime output to its cumulative microseconds"""
+    imports = {}
+    for line in stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        # Nested imports are indented below their parent, top-level ones have one space
+        if match and len(match.group(3)) == 1:
+            imports[match.group(4)] = int(match.group(2))
+    return imports
+
+
+def run_command(argv, baseline):
+    """Run one CLI command, return (import ms, wall ms, LLM modules it loaded)"""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', RUNNER.format(modules=LLM_MODULES), *argv],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(f"{' '.join(argv)} failed:\n{result.stderr[-2000:]}")
+
+    imports = top_level_imports(result.stderr)
+    import_us = sum(us for name, us in imports.items() if name not in baseline)
+    loaded = result.stderr.rsplit('LLM modules loaded: ', 1)[1].strip()
+    return import_us / 1000, wall_ms, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure CLI startup import time')
+    parser.add_argument('--threshold-ms', type=float, default=100, help='Maximum median import time per command')
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters per command')
+    args = parser.parse_args()
+
+    # Modules imported by a bare interpreter (site, encodings, .pth hooks) are not the CLI's cost
+    bare = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'pass'], capture_output=True, text=True)
+    baseline = set(top_level_imports(bare.stderr))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, 'bench.db')
+        with ChatDatabase(db_path) as db:
+            conv_id = db.create_conversation('bench_session', 'Benchmark conversation')
+            db.add_messages(conv_id, [('human', 'Where is my refund?'), ('ai', 'It was issued today.')])
+
+        commands = {
+            'list': ['list', '--db', db_path],
+            'search': ['search', 'refund', '--db', db_path],
+            'export': ['export', 'bench_session', '--db', db_path, '--output', os.path.join(tmp_dir, 'out.json')],
+        }
+
+        failed = False
+        for name, argv in commands.items():
+            runs = [run_command(argv, baseline) for _ in range(args.runs)]
+            import_ms = statistics.median(r[0] for r in runs)
+            wall_ms = statistics.median(r[1] for r in runs)
+            loaded = runs[0][2]
+            ok = import_ms <= args.threshold_ms and not loaded
+            failed |= not ok
+            print(f"{name:8} imports {import_ms:6.1f} ms   process {wall_ms:6.1f} ms   "
+                  f"{'OK' if ok else 'FAIL'}{'  (loaded ' + loaded + ')' if loaded else ''}")
+
+    if failed:
+        print(f"Regression: a database-only command exceeded {args.threshold_ms:.0f} ms or imported LLM modules")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark for retention and archival
+Builds histories of growing size with a fixed number of active sessions and
+measures hot-path query latency with everything in one file versus after idle
+conversations were moved to monthly archives. With archival the hot database
+stays the same size, so its latency should stay flat as history grows.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from chat_database import ChatDatabase
+from retention import RetentionManager, VacuumScheduler
+
+
+def build_history(path, conversations, active, messages_per_conversation=4):
+    """Create a database where all but `active` conversations were last updated months ago"""
+    rng = random.Random(conversations)
+    with ChatDatabase(path) as db:
+        db.import_conversations(
+            {
+                'session_id': f'session_{i}',
+                'title': f'Conversation {i}',
+                'messages': [('human' if j % 2 == 0 else 'ai', f'message {j} of conversation {i} about order {rng.randint(1000, 9999)}')
+                             for j in range(messages_per_conversation)]
+            }
+            for i in range(conversations)
+        )
+        # Spread the idle conversations over the past year
+        db.conn.execute('''
+            UPDATE conversations
+            SET updated_at = datetime('now', '-' || (100 + id % 265) || ' days')
+            WHERE id > ?
+        ''', (active,))
+        db.conn.commit()
+
+
+def measure(db, active, queries, rng):
+    """Median and p95 milliseconds of each hot-path query"""
+    timings = {'recent': [], 'history': [], 'get_or_create': []}
+    for _ in range(queries):
+        session_id = f'session_{rng.randint(0, active - 1)}'
+
+        start = time.perf_counter()
+        db.get_recent_conversations(10)
+        timings['recent'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        db.get_conversation_messages(session_id)
+        timings['history'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        db.create_conversation(session_id)
+        timings['get_or_create'].append(time.perf_counter() - start)
+
+    return {name: (statistics.median(values) * 1000, statistics.quantiles(values, n=20)[-1] * 1000)
+            for name, values in timings.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Hot-path latency with and without archival')
+    parser.add_argument('--sizes', default='10000,50000,200000', help='Comma-separated conversation counts')
+    parser.add_argument('--active', type=int, default=1000, help='Conversations updated recently')
+    parser.add_argument('--queries', type=int, default=500, help='Queries per measurement')
+    args = parser.parse_args()
+
+    print(f"{'conversations':>13} {'layout':>14} {'MB':>6}   "
+          + '   '.join(f'{name:>22}' for name in ('recent p50/p95 ms', 'history p50/p95 ms', 'get_or_create p50/p95')))
+    for size in (int(s) for s in args.sizes.split(',')):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'chat.db')
+            build_history(path, size, args.active)
+
+            for layout in ('single file', 'hot + archive'):
+                with ChatDatabase(path) as db:
+                    if layout == 'hot + archive':
+                        VacuumScheduler(db, RetentionManager(db, max_idle_days=90)).run_once()
+                    results = measure(db, args.active, args.queries, random.Random(1))
+                print(f"{size:>13,} {layout:>14} {os.path.getsize(path) / 2**20:6.1f}   "
+                      + '   '.join(f'{p50:>10.3f} / {p95:>9.3f}' for p50, p95 in results.values()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark for ChatDatabase.search_messages
+Compares the FTS5 index against the LIKE full-scan fallback on a generated corpus
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from chat_database import ChatDatabase
+
+
+WORDS = [
+    'order', 'refund', 'shipping', 'tracking', 'package', 'delivery', 'account',
+    'password', 'login', 'subscription', 'premium', 'cancel', 'payment', 'charge',
+    'card', 'invoice', 'laptop', 'warranty', 'exchange', 'return', 'label', 'app',
+    'update', 'crash', 'photo', 'upload', 'email', 'support', 'issue', 'help',
+    'thanks', 'please', 'status', 'days', 'business', 'credit', 'discount', 'cart'
+]
+
+QUERIES = ['refund', 'tracking number', 'password reset', 'warranty', 'duplicate charge']
+
+
+def generate_corpus(db: ChatDatabase, total_messages: int, messages_per_conversation: int = 50,
+                    seed: int = 42):
+    """Fill the database with random support-style messages"""
+    rng = random.Random(seed)
+    batch = []
+    conv_id = None
+
+    for i in range(total_messages):
+        if i % messages_per_conversation == 0:
+            db.cursor.execute(
+                'INSERT INTO conversations (session_id, title) VALUES (?, ?)',
+                (f'bench_{i // messages_per_conversation}', 'Benchmark Conversation')
+            )
+            conv_id = db.cursor.lastrowid
+
+        role = 'human' if i % 2 == 0 else 'ai'
+        content = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 40)))
+        batch.append((conv_id, role, content))
+
+        if len(batch) >= 10000:
+            db.cursor.executemany(
+                'INSERT INTO messages (conversation_id, role, content) VALUES (?, ?, ?)', batch
+            )
+            batch = []
+
+    if batch:
+        db.cursor.executemany(
+            'INSERT INTO messages (conversation_id, role, content) VALUES (?, ?, ?)', batch
+        )
+    db.conn.commit()
+
+
+def time_queries(search, repeats: int) -> float:
+    """Return the mean latency in milliseconds of running every benchmark query"""
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for query in QUERIES:
+            search(query, 20)
+    return (time.perf_counter() - start) * 1000 / (repeats * len(QUERIES))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark FTS5 vs LIKE message search')
+    parser.add_argument('--messages', type=int, default=1_000_000, help='Number of messages to generate')
+    parser.add_argument('--repeats', type=int, default=3, help='Times each query is run')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, 'bench.db')
+        with ChatDatabase(db_path) as db:
+            if not db.fts_enabled:
+                print('FTS5 is not available in this SQLite build, nothing to compare')
+                return
+
+            print(f'Generating {args.messages:,} messages...')
+            start = time.perf_counter()
+            generate_corpus(db, args.messages)
+            print(f'  done in {time.perf_counter() - start:.1f}s')
+
+            fts_ms = time_queries(db.search_messages, args.repeats)
+            like_ms = time_queries(db._search_messages_like, args.repeats)
+
+            print(f'FTS5 search: {fts_ms:9.2f} ms/query')
+            print(f'LIKE search: {like_ms:9.2f} ms/query')
+            print(f'Speedup:     {like_ms / fts_ms:9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Multi-process write benchmark for the sharded chat database
+Starts several writer processes that each commit chat exchanges (one
+add_messages transaction per turn) to their own sessions. The run is repeated
+with a growing shard count. With one file every commit waits for the single
+SQLite write lock; with N shards the writers spread over N locks. Reports
+commits/sec per shard count and the speedup over one shard.
+
+Scaling is bounded by the machine. Writers are CPU-bound, so they stop scaling
+at the core count, and synchronous=FULL makes fsync part of each commit.
+
+Usage:
+    python3 benchmark_sharding.py --processes 8 --shards 1,2,4,8
+    python3 benchmark_sharding.py --synchronous FULL --turns 500
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+from sharded_database import ShardedChatDatabase
+
+
+def writer(directory: str, worker: int, args, ready, start, results):
+    """Commit args.turns exchanges round-robin over this worker's sessions"""
+    with ShardedChatDatabase(directory, synchronous=args.synchronous, busy_timeout=60000) as db:
+        conversation_ids = [db.create_conversation(f'writer{worker}-session{i}')
+                            for i in range(args.sessions_per_process)]
+        answer = 'Thanks for reaching out, your order is on its way. ' * 4
+        ready.put(worker)
+        start.wait()
+
+        begin = time.perf_counter()
+        for turn in range(args.turns):
+            db.add_messages(conversation_ids[turn % len(conversation_ids)],
+                            [('human', f'Where is my order #{turn}?'), ('ai', answer)])
+        results.put(time.perf_counter() - begin)
+
+
+def run(directory: str, shards: int, args) -> float:
+    """Run one round against a fresh directory, return commits/sec over all processes"""
+    ShardedChatDatabase(directory, shards=shards).close()
+    context = multiprocessing.get_context('spawn')
+    ready, results, start = context.Queue(), context.Queue(), context.Event()
+    processes = [context.Process(target=writer, args=(directory, worker, args, ready, start, results))
+                 for worker in range(args.processes)]
+    for process in processes:
+        process.start()
+    for _ in processes:
+        ready.get()
+
+    # Time from the common start until the slowest writer is done
+    begin = time.perf_counter()
+    start.set()
+    for _ in processes:
+        results.get()
+    seconds = time.perf_counter() - begin
+    for process in processes:
+        process.join()
+    return args.processes * args.turns / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write throughput of concurrent processes by shard count')
+    parser.add_argument('--processes', type=int, default=8, help='Writer processes')
+    parser.add_argument('--turns', type=int, default=300, help='Committed exchanges per process')
+    parser.add_argument('--sessions-per-process', type=int, default=50, help='Sessions each writer spreads over')
+    parser.add_argument('--shards', default='1,2,4,8', help='Comma-separated shard counts to compare')
+    parser.add_argument('--synchronous', default='NORMAL', choices=['OFF', 'NORMAL', 'FULL'],
+                        help='SQLite synchronous level of every shard')
+    args = parser.parse_args()
+
+    print(f"{args.processes} processes x {args.turns} commits, synchronous={args.synchronous}, "
+          f"{os.cpu_count()} CPUs")
+    baseline = None
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for shards in [int(count) for count in args.shards.split(',')]:
+            rate = run(os.path.join(tmp_dir, f'shards{shards}'), shards, args)
+            baseline = baseline or rate
+            print(f"{shards:3d} shards  {rate:10,.0f} commits/s  {rate / baseline:5.2f}x")
+
+
+if __name__ == '__main__':
+    main()
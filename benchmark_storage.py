@@ -0,0 +1,116 @@
+"""
+Benchmark for the compact storage mode
+Writes the same synthetic corpus (short customer messages, long AI answers,
+repeated metadata) in each storage mode and reports bytes per message after
+VACUUM plus bulk write and full-scan read throughput.
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from chat_database import ChatDatabase
+from content_codec import zstandard
+
+
+QUESTIONS = [
+    "Hi, I want to request a refund for my order #{n}.",
+    "My package with tracking number TRK{n} still hasn't arrived, can you check?",
+    "I can't log in to my account, the reset link for {n}@example.com doesn't work.",
+    "Can you tell me if the laptop model X{n} has 16GB of RAM?",
+    "Please cancel my premium subscription, the billing period ends on day {n}.",
+]
+
+ANSWER_SENTENCES = [
+    "I'd be happy to help you with that request.",
+    "I've checked your account and can see the order details on our side.",
+    "Refunds are usually processed within 5-7 business days after we receive the item.",
+    "You'll receive a confirmation email with all the details shortly.",
+    "If the issue persists, please clear your browser cache and try again.",
+    "The tracking information shows the package is currently in transit with the courier.",
+    "Our premium plan includes priority support, unlimited storage and early access to new features.",
+    "Is there anything else I can help you with today?",
+]
+
+METADATA = [None, {'generated': True}, {'generated': True, 'model': 'gpt-4o'}, {'channel': 'web'}]
+
+
+def make_corpus(rng, conversations, messages_per_conversation):
+    """Yield (session_id, role, content, metadata) rows"""
+    for c in range(conversations):
+        for i in range(messages_per_conversation):
+            if i % 2 == 0:
+                yield f'bench_{c}', 'human', rng.choice(QUESTIONS).format(n=rng.randint(1000, 99999)), METADATA[3]
+            else:
+                answer = ' '.join(rng.choice(ANSWER_SENTENCES) for _ in range(rng.randint(2, 12)))
+                yield f'bench_{c}', 'ai', answer, rng.choice(METADATA[:3])
+
+
+def write_corpus(db, rows, batch_size=1000):
+    """Insert corpus rows, creating conversations as needed, return elapsed seconds"""
+    conv_ids = {}
+    messages = []
+    for session_id, role, content, metadata in rows:
+        if session_id not in conv_ids:
+            conv_ids[session_id] = db.create_conversation(session_id, 'Benchmark')
+        messages.append((conv_ids[session_id], role, content, metadata))
+    return db.add_messages_bulk(messages, batch_size=batch_size)['seconds']
+
+
+def run_mode(tmp_dir, name, compression, dictionary, warmup, corpus):
+    path = os.path.join(tmp_dir, f'{name}.db')
+    with ChatDatabase(path, compression=compression) as db:
+        write_corpus(db, warmup)
+        if dictionary:
+            db.train_compression_dictionary()
+        write_s = write_corpus(db, corpus)
+        db.conn.execute('VACUUM')
+
+        start = time.perf_counter()
+        read = sum(len(batch) for batch in db.iter_all_messages())
+        read_s = time.perf_counter() - start
+
+    conn = sqlite3.connect(path)
+    # Table and index pages only, the full-text index is the same in every mode
+    try:
+        messages_bytes = conn.execute('''
+            SELECT SUM(pgsize) FROM dbstat
+            WHERE name IN ('messages', 'message_metadata', 'compression_dictionaries')
+        ''').fetchone()[0]
+    except sqlite3.OperationalError:  # SQLite built without the dbstat table
+        messages_bytes = None
+    conn.close()
+
+    total = len(warmup) + len(corpus)
+    print(f"{name:12} {os.path.getsize(path) / total:8.1f} B/msg file   "
+          + (f"{messages_bytes / total:8.1f} B/msg messages   " if messages_bytes else '')
+          + f"write {len(corpus) / write_s:9,.0f} msg/s   read {read / read_s:9,.0f} msg/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare storage size and throughput of plain and compact storage')
+    parser.add_argument('--conversations', type=int, default=2000, help='Number of conversations')
+    parser.add_argument('--messages-per-conversation', type=int, default=20, help='Messages per conversation')
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    rows = list(make_corpus(rng, args.conversations, args.messages_per_conversation))
+    # The first 10% stand in for history the dictionary is trained on
+    split = len(rows) // 10
+    warmup, corpus = rows[:split], rows[split:]
+
+    modes = [('plain', None, False), ('zlib', 'zlib', False), ('zlib+dict', 'zlib', True)]
+    if zstandard is not None:
+        modes += [('zstd', 'zstd', False), ('zstd+dict', 'zstd', True)]
+
+    print(f"{len(rows):,} messages, {sum(len(r[2]) for r in rows) / len(rows):.0f} characters on average")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, compression, dictionary in modes:
+            run_mode(tmp_dir, name, compression, dictionary, warmup, corpus)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,229 @@
+"""
+End-to-end benchmark suite
+Builds a synthetic corpus and runs the main workloads against it: ingest, history
+load, search, export and full chat_with_history turns with the offline fake chat
+model. Reports throughput and p50/p95/p99 latency per scenario as JSON, and can
+compare the run against a stored baseline, failing when a scenario got slower.
+
+Usage:
+    python3 benchmark_suite.py --save-baseline benchmark_baseline.json
+    python3 benchmark_suite.py --baseline benchmark_baseline.json --tolerance 0.25
+    python3 benchmark_suite.py --sessions 20000 --messages-per-session 50 --output report.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+
+from chat_database import ChatDatabase
+from synthetic_corpus import KEYWORDS, LENGTH_DISTRIBUTIONS, generate_conversations, session_ids
+
+
+SCENARIOS = ('ingest', 'history_load', 'search', 'export', 'chat_turn')
+
+# Latency figures compared against the baseline
+COMPARED_METRICS = ('p50_ms', 'p95_ms', 'p99_ms')
+
+
+def summarize(latencies: List[float], seconds: float) -> Dict[str, Any]:
+    """Throughput and latency percentiles of one scenario from per-operation seconds"""
+    ordered = sorted(latencies)
+    if len(ordered) > 1:
+        cuts = statistics.quantiles(ordered, n=100, method='inclusive')
+        p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+    else:
+        p50 = p95 = p99 = ordered[0] if ordered else 0.0
+    return {
+        'operations': len(ordered),
+        'seconds': seconds,
+        'throughput_per_sec': len(ordered) / seconds if seconds > 0 else 0.0,
+        'p50_ms': p50 * 1000,
+        'p95_ms': p95 * 1000,
+        'p99_ms': p99 * 1000,
+        'max_ms': ordered[-1] * 1000 if ordered else 0.0
+    }
+
+
+def timed(operations: int, operation: Callable[[int], Any]) -> Dict[str, Any]:
+    """Run operation(i) for i in range(operations) and summarize the latencies"""
+    latencies = []
+    start = time.perf_counter()
+    for i in range(operations):
+        op_start = time.perf_counter()
+        operation(i)
+        latencies.append(time.perf_counter() - op_start)
+    return summarize(latencies, time.perf_counter() - start)
+
+
+def run_ingest(db: ChatDatabase, config: Dict) -> Dict[str, Any]:
+    """Import the corpus one batch of conversations per operation, throughput in messages/sec"""
+    conversations = generate_conversations(
+        config['sessions'], config['messages_per_session'], config['length_distribution'],
+        config['mean_words'], config['seed']
+    )
+    batch = max(1, 1000 // config['messages_per_session'])
+    latencies = []
+    start = time.perf_counter()
+    while True:
+        chunk = [c for _, c in zip(range(batch), conversations)]
+        if not chunk:
+            break
+        op_start = time.perf_counter()
+        db.import_conversations(chunk)
+        latencies.append(time.perf_counter() - op_start)
+    result = summarize(latencies, time.perf_counter() - start)
+    result['messages_per_sec'] = config['sessions'] * config['messages_per_session'] / result['seconds']
+    return result
+
+
+def run_suite(db_path: str, config: Dict, scenarios=SCENARIOS) -> Dict[str, Any]:
+    """
+    Run the selected scenarios against a fresh database at db_path
+
+    Args:
+        db_path: Database file to create, must not exist yet
+        config: sessions, messages_per_session, length_distribution, mean_words,
+            seed, operations, model_latency_ms
+        scenarios: Names from SCENARIOS; ingest always runs since the others need the corpus
+
+    Returns:
+        {'config': config, 'environment': {...}, 'scenarios': {name: summary}}
+    """
+    from fake_chat_model import FakeChatModel
+    from history_cache import HistoryCache
+    from message_placeholder_db import chat_with_history, format_message
+
+    rng = random.Random(config['seed'])
+    sessions = session_ids(config['sessions'])
+    operations = config['operations']
+    results = {}
+
+    # A cache of its own, so a run starts cold and leaves nothing behind in the process
+    with ChatDatabase(db_path, history_cache=HistoryCache(formatter=format_message)) as db:
+        results['ingest'] = run_ingest(db, config)
+
+        if 'history_load' in scenarios:
+            results['history_load'] = timed(operations, lambda i: db.get_conversation_messages(rng.choice(sessions)))
+
+        if 'search' in scenarios:
+            queries = [' '.join(rng.sample(KEYWORDS, rng.randint(1, 2))) for _ in range(operations)]
+            results['search'] = timed(operations, lambda i: db.search_messages(queries[i]))
+
+        if 'export' in scenarios:
+            results['export'] = timed(operations, lambda i: db.export_conversation(rng.choice(sessions)))
+
+        if 'chat_turn' in scenarios:
+            model = FakeChatModel(latency=config['model_latency_ms'] / 1000)
+            # chat_with_history prints the transcript, keep it out of the report
+            with contextlib.redirect_stdout(io.StringIO()):
+                results['chat_turn'] = timed(
+                    operations,
+                    lambda i: chat_with_history(rng.choice(sessions), f'Where is my order #{10000 + i}?',
+                                                db=db, model=model)
+                )
+
+    return {
+        'config': config,
+        'environment': {'python': platform.python_version(), 'platform': platform.platform()},
+        'scenarios': {name: results[name] for name in SCENARIOS if name in results}
+    }
+
+
+def compare(report: Dict, baseline: Dict, tolerance: float = 0.2) -> List[Dict[str, Any]]:
+    """
+    Compare latency figures of a report with a baseline report
+
+    Args:
+        report: Output of run_suite
+        baseline: Earlier output of run_suite
+        tolerance: Allowed slowdown, 0.2 means up to 20% slower is not a regression
+
+    Returns:
+        One row per scenario and metric found in both reports:
+        {'scenario', 'metric', 'baseline', 'current', 'change', 'regression'}
+    """
+    rows = []
+    for scenario, current in report['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(scenario)
+        if previous is None:
+            continue
+        for metric in COMPARED_METRICS:
+            if metric not in previous:
+                continue
+            change = current[metric] / previous[metric] - 1 if previous[metric] > 0 else 0.0
+            rows.append({
+                'scenario': scenario,
+                'metric': metric,
+                'baseline': previous[metric],
+                'current': current[metric],
+                'change': change,
+                'regression': change > tolerance
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end benchmarks on a synthetic corpus')
+    parser.add_argument('--sessions', type=int, default=2000, help='Conversations in the corpus')
+    parser.add_argument('--messages-per-session', type=int, default=20, help='Messages per conversation')
+    parser.add_argument('--length-distribution', default='lognormal', choices=LENGTH_DISTRIBUTIONS)
+    parser.add_argument('--mean-words', type=int, default=30, help='Average message length in words')
+    parser.add_argument('--operations', type=int, default=500, help='Operations per read scenario')
+    parser.add_argument('--model-latency-ms', type=float, default=0.0, help='Fake chat model latency per call')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='Comma-separated scenarios to run')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Write the JSON report to this file (default: stdout)')
+    parser.add_argument('--baseline', help='Compare against this report and exit 1 on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed slowdown against the baseline')
+    parser.add_argument('--save-baseline', help='Write the report to this file as the new baseline')
+    args = parser.parse_args()
+
+    config = {
+        'sessions': args.sessions,
+        'messages_per_session': args.messages_per_session,
+        'length_distribution': args.length_distribution,
+        'mean_words': args.mean_words,
+        'seed': args.seed,
+        'operations': args.operations,
+        'model_latency_ms': args.model_latency_ms
+    }
+    scenarios = [name.strip() for name in args.scenarios.split(',')]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        report = run_suite(os.path.join(tmp_dir, 'bench.db'), config, scenarios)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+    if not args.output:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            rows = compare(report, json.load(f), args.tolerance)
+        print(f"\n{'scenario':>14} {'metric':>7} {'baseline':>10} {'current':>10} {'change':>8}", file=sys.stderr)
+        for row in rows:
+            flag = '  REGRESSION' if row['regression'] else ''
+            print(f"{row['scenario']:>14} {row['metric']:>7} {row['baseline']:>10.3f} {row['current']:>10.3f} "
+                  f"{row['change']:>+8.1%}{flag}", file=sys.stderr)
+        if any(row['regression'] for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
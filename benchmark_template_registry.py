@@ -0,0 +1,61 @@
+"""
+Benchmark for per-rerun prompt setup overhead
+Compares what a Streamlit rerun used to do (parse template.json, construct the
+chat model, compose the chain) with the registry lookups that replace it
+"""
+
+import argparse
+import statistics
+import time
+
+from langchain_core.prompts import load_prompt
+from langchain_openai import ChatOpenAI
+
+from summary_options import TEMPLATE_PATH, TEMPLATE_VARIABLES
+from template_registry import TemplateRegistry
+
+
+def make_model():
+    # A placeholder key is enough: constructing the client makes no request
+    return ChatOpenAI(model='gpt-4o', max_tokens=2000, api_key='sk-benchmark')
+
+
+def rerun_before():
+    """Setup work the UI scripts repeated on every rerun"""
+    template = load_prompt(TEMPLATE_PATH)
+    return template | make_model()
+
+
+def time_per_call(func, runs):
+    """Return per-call times in milliseconds"""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure prompt setup cost per Streamlit rerun')
+    parser.add_argument('--runs', type=int, default=200, help='Simulated reruns per variant')
+    args = parser.parse_args()
+
+    registry = TemplateRegistry()
+
+    def rerun_after():
+        return registry.get_chain(TEMPLATE_PATH, 'benchmark', make_model, TEMPLATE_VARIABLES)
+
+    rerun_after()  # first rerun pays the one-time load, as in the app
+    before = time_per_call(rerun_before, args.runs)
+    after = time_per_call(rerun_after, args.runs)
+
+    for name, times in (('before (load every rerun)', before), ('after (registry)', after)):
+        print(f'{name:26} median {statistics.median(times):8.3f} ms   '
+              f'max {max(times):8.3f} ms')
+    print(f'Speedup: {statistics.median(before) / statistics.median(after):,.0f}x, '
+          f'template loads in registry: {registry.loads}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmark for the local vector index
+Measures topic recall@k and query latency on a synthetic corpus of support messages
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+from sklearn.neighbors import NearestNeighbors
+
+from vector_index import VectorIndex
+
+
+TOPICS = {
+    'refund': ['refund', 'money back', 'reimburse', 'charge', 'credit card', 'return label'],
+    'shipping': ['shipping', 'tracking number', 'delivery', 'package', 'courier', 'in transit'],
+    'account': ['password', 'login', 'reset link', 'account locked', 'email address', 'two factor'],
+    'laptop': ['laptop', 'RAM', 'SSD', 'processor', 'warranty', 'screen size'],
+    'subscription': ['subscription', 'premium plan', 'cancel', 'billing period', 'monthly fee', 'upgrade'],
+    'app': ['app crash', 'update', 'photo upload', 'version', 'iPhone', 'permissions'],
+}
+FILLER = ['please', 'thanks', 'I', 'my', 'the', 'can you', 'help', 'today', 'again', 'still', 'with', 'about']
+
+
+def make_message(rng, topic):
+    """Build a message mixing a few topic phrases with filler words"""
+    words = rng.sample(TOPICS[topic], 2) + rng.sample(FILLER, 6)
+    rng.shuffle(words)
+    return ' '.join(words)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark recall and latency of the vector index')
+    parser.add_argument('--messages', type=int, default=200_000, help='Number of indexed messages')
+    parser.add_argument('--queries', type=int, default=200, help='Number of queries')
+    parser.add_argument('--k', type=int, default=10, help='Results per query')
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    topics = list(TOPICS)
+    labels = [rng.choice(topics) for _ in range(args.messages)]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        index = VectorIndex(os.path.join(tmp_dir, 'bench.db'))
+
+        start = time.perf_counter()
+        for offset in range(0, args.messages, 10_000):
+            batch = range(offset, min(offset + 10_000, args.messages))
+            index.add([i + 1 for i in batch], [make_message(rng, labels[i]) for i in batch])
+        build_s = time.perf_counter() - start
+        print(f'Indexed {args.messages:,} messages in {build_s:.1f}s '
+              f'({args.messages / build_s:,.0f} msg/s, {os.path.getsize(index.vectors_path) / 2**20:.0f} MiB)')
+
+        query_topics = [rng.choice(topics) for _ in range(args.queries)]
+        queries = [make_message(rng, topic) for topic in query_topics]
+
+        latencies = []
+        hits = 0
+        for query, topic in zip(queries, query_topics):
+            start = time.perf_counter()
+            results = index.search(query, args.k)
+            latencies.append((time.perf_counter() - start) * 1000)
+            hits += sum(labels[message_id - 1] == topic for message_id, _ in results)
+
+        start = time.perf_counter()
+        index.search_batch(queries, args.k)
+        batch_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+        # Reference answer from scikit-learn's exact nearest neighbour search
+        vectors, _ = index._mapped()
+        reference = NearestNeighbors(n_neighbors=args.k, metric='cosine', algorithm='brute').fit(vectors)
+        ref_scores, _ = reference.kneighbors(index.embedder.embed(queries))
+        # Compare by score so ties between equally similar messages don't count as misses
+        found = 0
+        for results, ref in zip(index.search_batch(queries, args.k), ref_scores):
+            threshold = 1 - ref[-1] - 1e-5
+            found += sum(score >= threshold for _, score in results)
+
+        print(f'Recall@{args.k} vs exact sklearn search: {found / (args.queries * args.k):.3f}')
+        print(f'Topic precision@{args.k}: {hits / (args.queries * args.k):.3f}')
+        print(f'Single query latency: p50 {np.percentile(latencies, 50):.1f} ms, '
+              f'p95 {np.percentile(latencies, 95):.1f} ms')
+        print(f'Batched query latency: {batch_ms:.2f} ms/query')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark for the write-behind message writer
+Runs full chat_with_history turns with the offline fake model from several
+threads at once. In sync mode each turn commits its own exchange. In the
+write-behind modes the exchange is queued and group-committed in the background.
+Reports turn latency percentiles, turns/sec and commits/sec for each mode.
+
+Usage:
+    python3 benchmark_write_behind.py --threads 8 --turns 200
+    python3 benchmark_write_behind.py --synchronous FULL --intervals 0,2,10
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import threading
+import time
+
+from benchmark_suite import summarize
+from chat_database import ChatDatabase
+from write_behind import WriteBehindWriter
+
+
+def run_mode(db_path: str, name: str, interval_ms, args):
+    """Run args.threads x args.turns turns with sync writes (interval_ms None) or write-behind"""
+    from fake_chat_model import FakeChatModel
+    from message_placeholder_db import chat_with_history
+
+    db = ChatDatabase(db_path, pooled=True, synchronous=args.synchronous)
+    writer = WriteBehindWriter(db, flush_interval_ms=interval_ms) if interval_ms is not None else None
+    model = FakeChatModel(latency=args.model_latency_ms / 1000, reply_words=60)
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(thread: int):
+        local = []
+        for turn in range(args.turns):
+            # Each thread cycles through its own sessions so turns hit different conversations
+            session_id = f'{name}-{thread}-{turn % args.sessions_per_thread}'
+            start = time.perf_counter()
+            chat_with_history(session_id, f'Where is my order #{turn}?', db=db, model=model, writer=writer)
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+    start = time.perf_counter()
+    # chat_with_history prints the transcript, keep it out of the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        turns_done = time.perf_counter() - start
+        if writer is not None:
+            writer.close()
+    seconds = time.perf_counter() - start
+
+    commits = writer.counters['commits'] if writer is not None else len(latencies)
+    result = summarize(latencies, turns_done)
+    stored = db.stats()['messages']
+    db.close()
+
+    print(f"{name:<18} turn p50 {result['p50_ms']:7.2f} ms  p99 {result['p99_ms']:7.2f} ms  "
+          f"{result['throughput_per_sec']:8.0f} turns/s  {commits:6d} commits  "
+          f"{commits / seconds:8.0f} commits/s  {len(latencies) / commits:5.1f} turns/commit  "
+          f"{stored} messages stored")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare synchronous and write-behind message writes')
+    parser.add_argument('--threads', type=int, default=8, help='Concurrent chat threads')
+    parser.add_argument('--turns', type=int, default=200, help='Turns per thread')
+    parser.add_argument('--sessions-per-thread', type=int, default=5, help='Sessions each thread rotates through')
+    parser.add_argument('--model-latency-ms', type=float, default=0.0, help='Fake chat model latency per call')
+    parser.add_argument('--synchronous', default='NORMAL', choices=['OFF', 'NORMAL', 'FULL'],
+                        help='SQLite synchronous level, FULL syncs the WAL on every commit')
+    parser.add_argument('--intervals', default='0,5', help='Write-behind flush intervals in ms to compare')
+    args = parser.parse_args()
+
+    modes = [('sync', None)] + [(f'write-behind {ms}ms', float(ms)) for ms in args.intervals.split(',')]
+    print(f"{args.threads} threads x {args.turns} turns, synchronous={args.synchronous}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for i, (name, interval_ms) in enumerate(modes):
+            run_mode(os.path.join(tmp_dir, f'mode{i}.db'), name.replace(' ', '-'), interval_ms, args)
+
+
+if __name__ == '__main__':
+    main()
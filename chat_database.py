@@ -6,20 +6,101 @@ Handles storage and retrieval of conversation history using SQLite
 import sqlite3
 import json
 from datetime import datetime
-from typing import List, Dict, Optional, Tuple
+import threading
+import time
+from typing import Any, Iterable, Iterator, List, Dict, Optional, Set, Tuple
 from pathlib import Path
 
+from connection_pool import ConnectionPool
+from content_codec import ContentCodec, train_dictionary
+from db_metrics import DatabaseMetrics
+from history_cache import HistoryCache
+
+
+# Remembered session_id -> conversation ID lookups, the map starts over when it grows past this
+CONVERSATION_ID_CACHE_SIZE = 100000
+
 
 class ChatDatabase:
     """Manages chat history storage in SQLite database"""
 
-    def __init__(self, db_path: str = "chat_history.db"):
-        """Initialize database connection and create tables if needed"""
+    def __init__(self, db_path: str = "chat_history.db", pooled: bool = False,
+                 busy_timeout: int = 5000, synchronous: str = 'NORMAL',
+                 history_cache: Optional[HistoryCache] = None, vector_index=None,
+                 compression: Optional[str] = None, compression_threshold: int = 512,
+                 metrics: Optional[DatabaseMetrics] = None):
+        """
+        Initialize database connection and create tables if needed
+
+        Args:
+            db_path: Path to the SQLite database file
+            pooled: Use WAL mode with per-thread reader connections and one shared
+                writer connection, so the instance can be used from many threads
+            busy_timeout: Milliseconds to wait on a locked database (pooled mode only)
+            synchronous: SQLite synchronous level (pooled mode only)
+            history_cache: Cache of formatted history kept up to date by add_message
+                and delete_conversation
+            vector_index: VectorIndex that new messages are appended to
+            compression: Compact storage mode, 'zlib' or 'zstd': message content is
+                compressed and message metadata interned. Compressed databases can be
+                read in any mode, None only means new messages are written plainly
+            compression_threshold: Content of at least this many bytes is compressed on
+                its own, shorter content only with a dictionary from train_compression_dictionary
+            metrics: Records latency, rows and slow queries of the public methods,
+                see stats(). None leaves the methods unwrapped
+        """
         self.db_path = db_path
-        self.conn = sqlite3.connect(db_path)
-        self.conn.row_factory = sqlite3.Row  # Enable column access by name
+        self.history_cache = history_cache
+        self.vector_index = vector_index
+        self.metrics = metrics
+        self.codec = ContentCodec(compression, threshold=compression_threshold,
+                                  dictionary_loader=self._load_dictionary)
+        # Interned metadata JSON -> message_metadata ID, only valid for committed rows
+        self._metadata_ids: Dict[str, int] = {}
+        # session_id -> conversation ID, only valid for committed rows. IDs are never
+        # reused (AUTOINCREMENT), but another process may delete or move the session,
+        # so an entry is checked against the conversations row whenever it is used
+        self._conversation_ids: Dict[str, int] = {}
+        if pooled:
+            self.pool = ConnectionPool(db_path, busy_timeout=busy_timeout, synchronous=synchronous,
+                                       on_connect=self._register_functions)
+            self.conn = self.pool.writer
+            self._write_lock = self.pool.write_lock
+        else:
+            self.pool = None
+            self.conn = sqlite3.connect(db_path)
+            self.conn.row_factory = sqlite3.Row  # Enable column access by name
+            self._register_functions(self.conn)
+            self._write_lock = threading.RLock()
+        # Shared cursor on the writer connection, only use it while holding the write lock
         self.cursor = self.conn.cursor()
-        self._create_tables()
+        with self._write_lock:
+            self._create_tables()
+        if metrics is not None:
+            metrics.instrument(self)
+
+    def _register_functions(self, conn: sqlite3.Connection):
+        """Make decode_content() available to the search index triggers and queries"""
+        conn.create_function('decode_content', 1, self.codec.decode, deterministic=True)
+        if self.metrics is not None and self.metrics.slow_query_seconds is not None:
+            conn.set_trace_callback(self.metrics.trace)
+
+    def _load_dictionary(self, dict_id: int) -> Optional[Tuple[str, bytes]]:
+        """Fetch a dictionary trained after this instance opened the database"""
+        # Own connection, the codec may be called from inside a query on any of ours
+        conn = sqlite3.connect(self.db_path)
+        try:
+            return conn.execute('''
+                SELECT algorithm, data FROM compression_dictionaries WHERE id = ?
+            ''', (dict_id,)).fetchone()
+        finally:
+            conn.close()
+
+    def _read_cursor(self) -> sqlite3.Cursor:
+        """Return a cursor for read queries, on the calling thread's reader in pooled mode"""
+        if self.pool is not None:
+            return self.pool.reader().cursor()
+        return self.cursor
 
     def _create_tables(self):
         """Create necessary database tables if they don't exist"""
@@ -48,10 +129,59 @@ class ChatDatabase:
             )
         ''')
 
+        # Summaries table - rolling summary of the oldest messages of a conversation
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS conversation_summaries (
+                conversation_id INTEGER PRIMARY KEY,
+                summary TEXT NOT NULL,
+                covered_messages INTEGER NOT NULL,  -- number of leading messages summarized
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (conversation_id) REFERENCES conversations(id) ON DELETE CASCADE
+            )
+        ''')
+
+        # Interned metadata - compact mode stores each distinct JSON blob once
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS message_metadata (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                json TEXT UNIQUE NOT NULL
+            )
+        ''')
+
+        # Compression dictionaries for short messages, kept forever so old rows stay readable
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS compression_dictionaries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                algorithm TEXT NOT NULL,
+                data BLOB NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        self.cursor.execute('PRAGMA table_info(messages)')
+        if 'metadata_id' not in [row['name'] for row in self.cursor.fetchall()]:
+            # One-time migration for databases created before compact storage existed
+            self.cursor.execute('''
+                ALTER TABLE messages ADD COLUMN metadata_id INTEGER REFERENCES message_metadata(id)
+            ''')
+
+        self.cursor.execute('''
+            SELECT id, algorithm, data FROM compression_dictionaries ORDER BY id
+        ''')
+        for row in self.cursor.fetchall():
+            # The newest dictionary of the configured algorithm is used for new messages
+            self.codec.load_dictionary(row['id'], row['algorithm'], row['data'], active=True)
+
         # Create indexes for better query performance
+        # (conversation_id, id) serves both conversation lookups and keyset pagination
+        # in message order, so it supersedes the old single-column index
         self.cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_messages_conversation
-            ON messages(conversation_id)
+            CREATE INDEX IF NOT EXISTS idx_messages_conversation_id
+            ON messages(conversation_id, id)
+        ''')
+
+        self.cursor.execute('''
+            DROP INDEX IF EXISTS idx_messages_conversation
         ''')
 
         self.cursor.execute('''
@@ -59,69 +189,715 @@ class ChatDatabase:
             ON conversations(session_id)
         ''')
 
+        # get_recent_conversations and retention scan conversations by last update
+        self.cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_conversations_updated
+            ON conversations(updated_at)
+        ''')
+
+        self.fts_enabled = self._create_search_index()
+
         self.conn.commit()
 
+    def _create_search_index(self) -> bool:
+        """Create the FTS5 index over message content, return False if FTS5 is unavailable"""
+        self.cursor.execute('''
+            SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'messages_fts_insert'
+        ''')
+        row = self.cursor.fetchone()
+        decoded = row is not None and 'decode_content' in row['sql']
+
+        if self.codec.algorithm is not None and row is not None and not decoded:
+            # The index reads plain text columns; switch it to decoded content before any
+            # message is compressed. The index is rebuilt from scratch below
+            self.cursor.execute('DROP TRIGGER IF EXISTS messages_fts_insert')
+            self.cursor.execute('DROP TRIGGER IF EXISTS messages_fts_delete')
+            self.cursor.execute('DROP TRIGGER IF EXISTS messages_fts_update')
+            self.cursor.execute('DROP TABLE IF EXISTS messages_fts')
+        decoded = decoded or self.codec.algorithm is not None
+
+        self.cursor.execute('''
+            SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'
+        ''')
+        needs_backfill = self.cursor.fetchone() is None
+
+        if decoded:
+            # Content may be a compressed BLOB, so the index reads through a decoding view
+            self.cursor.execute('''
+                CREATE VIEW IF NOT EXISTS messages_text AS
+                SELECT id, decode_content(content) AS content FROM messages
+            ''')
+            content_table, new_content, old_content = 'messages_text', 'decode_content(new.content)', 'decode_content(old.content)'
+        else:
+            content_table, new_content, old_content = 'messages', 'new.content', 'old.content'
+
+        try:
+            # External-content table: the text lives in messages, FTS5 only keeps the index
+            self.cursor.execute(f'''
+                CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+                    content,
+                    content='{content_table}',
+                    content_rowid='id'
+                )
+            ''')
+        except sqlite3.OperationalError:
+            # SQLite was built without FTS5, search_messages falls back to LIKE
+            return False
+
+        # Triggers keep the index in sync with every write to messages
+        self.cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+                INSERT INTO messages_fts(rowid, content) VALUES (new.id, {new_content});
+            END
+        ''')
+
+        self.cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+                INSERT INTO messages_fts(messages_fts, rowid, content)
+                VALUES ('delete', old.id, {old_content});
+            END
+        ''')
+
+        # Recompressing a message changes the stored bytes but not the text, skip reindexing then
+        self.cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages
+            WHEN {old_content} IS NOT {new_content} BEGIN
+                INSERT INTO messages_fts(messages_fts, rowid, content)
+                VALUES ('delete', old.id, {old_content});
+                INSERT INTO messages_fts(rowid, content) VALUES (new.id, {new_content});
+            END
+        ''')
+
+        if needs_backfill:
+            # One-time migration for databases created before the index existed
+            self.rebuild_search_index()
+
+        return True
+
+    def rebuild_search_index(self):
+        """Rebuild the full-text index from the messages table"""
+        with self._write_lock:
+            self.cursor.execute('''
+                INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')
+            ''')
+            self.conn.commit()
+
+    def train_compression_dictionary(self, sample_size: int = 5000, size: int = 16384) -> Optional[int]:
+        """
+        Train a dictionary on recent short messages and use it for new short messages
+
+        Args:
+            sample_size: Number of most recent messages below the threshold to sample
+            size: Maximum dictionary size in bytes
+
+        Returns:
+            ID of the stored dictionary, or None when there are too few messages to learn from
+        """
+        if self.codec.algorithm is None:
+            raise ValueError("Dictionaries need a compression algorithm, open the database with compression=...")
+
+        samples = []
+        with self._write_lock:
+            self.cursor.execute('''
+                SELECT content FROM messages ORDER BY id DESC LIMIT ?
+            ''', (sample_size * 4,))
+            for row in self.cursor.fetchall():
+                text = self.codec.decode(row['content'])
+                if len(text.encode('utf-8')) < self.codec.threshold:
+                    samples.append(text)
+                    if len(samples) >= sample_size:
+                        break
+            if not samples:
+                return None
+
+            data = train_dictionary(samples, self.codec.algorithm, size)
+            if not data:
+                return None
+            self.cursor.execute('''
+                INSERT INTO compression_dictionaries (algorithm, data) VALUES (?, ?)
+            ''', (self.codec.algorithm, data))
+            self.conn.commit()
+            dict_id = self.cursor.lastrowid
+
+        self.codec.load_dictionary(dict_id, self.codec.algorithm, data, active=True)
+        return dict_id
+
+    def recompress_messages(self, batch_size: int = 1000) -> Dict[str, Any]:
+        """
+        Rewrite every stored message with the current storage mode
+
+        Compresses content and interns metadata in compact mode, or writes plain
+        text and inline metadata when the database was opened with compression=None.
+        Each batch is its own transaction, so the rewrite can be interrupted and rerun.
+
+        Returns:
+            Message count, content bytes before and after, and elapsed seconds
+        """
+        start = time.perf_counter()
+        stats = {'messages': 0, 'bytes_before': 0, 'bytes_after': 0}
+        after_id = 0
+
+        with self._write_lock:
+            while True:
+                self.cursor.execute('''
+                    SELECT m.id, m.content, COALESCE(m.metadata, mm.json) AS metadata
+                    FROM messages m
+                    LEFT JOIN message_metadata mm ON mm.id = m.metadata_id
+                    WHERE m.id > ?
+                    ORDER BY m.id ASC
+                    LIMIT ?
+                ''', (after_id, batch_size))
+                rows = self.cursor.fetchall()
+                if not rows:
+                    break
+
+                updates = []
+                try:
+                    for row in rows:
+                        text = self.codec.decode(row['content'])
+                        metadata = json.loads(row['metadata']) if row['metadata'] else None
+                        content, metadata_json, metadata_id = self._encode_payload(text, metadata)
+                        updates.append((content, metadata_json, metadata_id, row['id']))
+                        stats['bytes_before'] += self._stored_size(row['content'])
+                        stats['bytes_after'] += self._stored_size(content)
+
+                    self.cursor.executemany('''
+                        UPDATE messages SET content = ?, metadata = ?, metadata_id = ? WHERE id = ?
+                    ''', updates)
+                    self.conn.commit()
+                except Exception:
+                    self._rollback()
+                    raise
+
+                stats['messages'] += len(rows)
+                after_id = rows[-1]['id']
+
+            # Interned blobs no message points at any more
+            self.cursor.execute('''
+                DELETE FROM message_metadata
+                WHERE id NOT IN (SELECT metadata_id FROM messages WHERE metadata_id IS NOT NULL)
+            ''')
+            self.conn.commit()
+            self._metadata_ids.clear()
+
+        stats['seconds'] = time.perf_counter() - start
+        return stats
+
+    @staticmethod
+    def _stored_size(value) -> int:
+        """Bytes a stored content value takes, text or BLOB"""
+        return len(value) if isinstance(value, bytes) else len(value.encode('utf-8'))
+
     def create_conversation(self, session_id: str, title: Optional[str] = None,
                           metadata: Optional[Dict] = None) -> int:
-        """Create a new conversation and return its ID"""
-        metadata_json = json.dumps(metadata) if metadata else None
+        """Create a new conversation and return its ID, or the existing ID of a known session"""
+        conversation_id = self._known_conversation(self._read_cursor(), session_id)
+        if conversation_id is not None:
+            return conversation_id
 
-        try:
+        metadata_json = json.dumps(metadata) if metadata else None
+        with self._write_lock:
+            # An existing session takes the no-op update and still returns its ID
             self.cursor.execute('''
                 INSERT INTO conversations (session_id, title, metadata)
                 VALUES (?, ?, ?)
+                ON CONFLICT(session_id) DO UPDATE SET session_id = excluded.session_id
+                RETURNING id
             ''', (session_id, title, metadata_json))
+            conversation_id = self.cursor.fetchall()[0]['id']
             self.conn.commit()
-            return self.cursor.lastrowid
-        except sqlite3.IntegrityError:
-            # Session already exists, return existing conversation ID
-            self.cursor.execute('''
-                SELECT id FROM conversations WHERE session_id = ?
-            ''', (session_id,))
-            return self.cursor.fetchone()['id']
+        return self._remember_conversation(session_id, conversation_id)
+
+    def get_or_create_conversation_with_history(self, session_id: str, title: Optional[str] = None,
+                                                metadata: Optional[Dict] = None,
+                                                since_id: int = 0) -> Tuple[int, List[Tuple[int, str, str]]]:
+        """
+        Return a session's conversation ID with its messages, creating the conversation if needed
+
+        A known session costs one query on its conversation ID, which also confirms
+        the session still owns it. An unknown one costs one query that finds the
+        conversation and its messages together, plus an insert only when the
+        session is new.
+
+        Args:
+            session_id: Conversation to read
+            title: Title of a newly created conversation
+            metadata: Metadata of a newly created conversation
+            since_id: Only return messages with an ID greater than this
+
+        Returns:
+            (conversation_id, [(id, role, content), ...]) in message order
+        """
+        cursor = self._read_cursor()
+        conversation_id = self._conversation_ids.get(session_id)
+        rows = []
+        if conversation_id is not None:
+            cursor.execute('''
+                SELECT c.id AS conversation_id, m.id, m.role, m.content
+                FROM conversations c
+                LEFT JOIN messages m ON m.conversation_id = c.id AND m.id > ?
+                WHERE c.id = ? AND c.session_id = ?
+                ORDER BY m.id ASC
+            ''', (since_id, conversation_id, session_id))
+            rows = cursor.fetchall()
+            if not rows:
+                # Deleted or moved by another process since it was remembered
+                self._conversation_ids.pop(session_id, None)
+        if not rows:
+            cursor.execute('''
+                SELECT c.id AS conversation_id, m.id, m.role, m.content
+                FROM conversations c
+                LEFT JOIN messages m ON m.conversation_id = c.id AND m.id > ?
+                WHERE c.session_id = ?
+                ORDER BY m.id ASC
+            ''', (since_id, session_id))
+            rows = cursor.fetchall()
+            if not rows:
+                return self.create_conversation(session_id, title, metadata), []
+            conversation_id = self._remember_conversation(session_id, rows[0]['conversation_id'])
+        # A conversation without newer messages comes back as one row of NULLs
+        rows = [row for row in rows if row['id'] is not None]
+
+        decode = self.codec.decode
+        return conversation_id, [(row['id'], row['role'], decode(row['content'])) for row in rows]
+
+    def _known_conversation(self, cursor, session_id: str) -> Optional[int]:
+        """Remembered conversation ID of a session if the session still owns it, else forget it"""
+        conversation_id = self._conversation_ids.get(session_id)
+        if conversation_id is None:
+            return None
+        cursor.execute('''
+            SELECT 1 FROM conversations WHERE id = ? AND session_id = ?
+        ''', (conversation_id, session_id))
+        if cursor.fetchone() is None:
+            self._conversation_ids.pop(session_id, None)
+            return None
+        return conversation_id
+
+    def _remember_conversation(self, session_id: str, conversation_id: int) -> int:
+        if len(self._conversation_ids) >= CONVERSATION_ID_CACHE_SIZE:
+            self._conversation_ids.clear()
+        self._conversation_ids[session_id] = conversation_id
+        return conversation_id
+
+    def forget_conversation_ids(self):
+        """Drop remembered session -> conversation IDs, after conversations were moved or deleted elsewhere"""
+        self._conversation_ids.clear()
 
     def add_message(self, conversation_id: int, role: str, content: str,
                    metadata: Optional[Dict] = None) -> int:
         """Add a message to a conversation"""
+        return self.add_messages(conversation_id, [(role, content, metadata)])[0]
+
+    def add_messages(self, conversation_id: int, messages: List[Tuple]) -> List[int]:
+        """
+        Add several messages to a conversation in a single transaction
+
+        Args:
+            conversation_id: Conversation the messages belong to
+            messages: (role, content) or (role, content, metadata) tuples in order
+
+        Returns:
+            IDs of the inserted messages
+        """
+        return self.add_message_groups([(conversation_id, messages)])[0]
+
+    def add_message_groups(self, groups: List[Tuple[int, List[Tuple]]]) -> List[List[int]]:
+        """
+        Add messages to several conversations in a single transaction
+
+        Args:
+            groups: (conversation_id, messages) pairs, messages as in add_messages;
+                rows are inserted in the order given
+
+        Returns:
+            IDs of the inserted messages, one list per group
+        """
+        message_ids = []
+        with self._write_lock:
+            try:
+                for conversation_id, messages in groups:
+                    ids = []
+                    for message in messages:
+                        row = self._message_row(conversation_id, message[0], message[1],
+                                                message[2] if len(message) > 2 else None)
+                        self.cursor.execute('''
+                            INSERT INTO messages (conversation_id, role, content, metadata, metadata_id, timestamp)
+                            VALUES (?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+                        ''', row)
+                        ids.append(self.cursor.lastrowid)
+                    message_ids.append(ids)
+
+                # Update each conversation's updated_at timestamp
+                self.cursor.executemany('''
+                    UPDATE conversations
+                    SET updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                ''', [(conversation_id,) for conversation_id in {group[0] for group in groups}])
+
+                self.conn.commit()
+            except Exception:
+                self._rollback()
+                raise
+
+        for (conversation_id, messages), ids in zip(groups, message_ids):
+            if self.history_cache is not None:
+                for message_id, message in zip(ids, messages):
+                    self.history_cache.on_message_added(self.db_path, conversation_id, message_id,
+                                                        message[0], message[1])
+            if self.vector_index is not None:
+                self.vector_index.add(ids, [message[1] for message in messages])
+        return message_ids
+
+    def add_messages_bulk(self, messages: Iterable[Tuple], batch_size: int = 1000) -> Dict:
+        """
+        Insert many messages using one transaction per batch
+
+        Args:
+            messages: Iterable of (conversation_id, role, content) or
+                (conversation_id, role, content, metadata) tuples, consumed lazily
+            batch_size: Number of messages written per transaction
+
+        Returns:
+            Ingest statistics: message count, elapsed seconds and rows per second
+        """
+        start = time.perf_counter()
+        batch = []
+        touched = set()
+        total = 0
+
+        with self._write_lock:
+            try:
+                for message in messages:
+                    conversation_id, role, content = message[:3]
+                    metadata = message[3] if len(message) > 3 else None
+                    batch.append(self._message_row(conversation_id, role, content, metadata))
+                    touched.add(conversation_id)
+
+                    if len(batch) >= batch_size:
+                        total += self._write_message_batch(batch, touched)
+                        batch, touched = [], set()
+
+                total += self._write_message_batch(batch, touched)
+            except Exception:
+                self._rollback()
+                raise
+
+        return self._ingest_stats(start, conversations=0, messages=total)
+
+    def import_conversations(self, conversations: Iterable[Dict], batch_size: int = 1000) -> Dict:
+        """
+        Import whole conversations, creating any session that does not exist yet
+
+        Args:
+            conversations: Iterable of dicts with 'session_id', optional 'title',
+                'metadata', 'created_at' and 'updated_at', and 'messages' as
+                (role, content[, metadata]) tuples or dicts with 'role', 'content'
+                and optional 'metadata' and 'timestamp'. 'messages' may be a lazy
+                iterator, it is consumed in order
+            batch_size: Number of messages written per transaction
+
+        Returns:
+            Ingest statistics: conversation and message counts, elapsed seconds
+            and rows per second
+        """
+        start = time.perf_counter()
+        batch = []
+        touched = set()
+        # Original updated_at of imported conversations, kept when their messages are written
+        updated_at = {}
+        conversation_count = 0
+        message_count = 0
+
+        with self._write_lock:
+            try:
+                for conversation in conversations:
+                    conv_id = self._get_or_insert_conversation(
+                        conversation['session_id'],
+                        conversation.get('title'),
+                        conversation.get('metadata'),
+                        conversation.get('created_at'),
+                        conversation.get('updated_at')
+                    )
+                    if conversation.get('updated_at'):
+                        updated_at[conv_id] = conversation['updated_at']
+                    conversation_count += 1
+
+                    for message in conversation.get('messages', ()):
+                        if isinstance(message, dict):
+                            role, content = message['role'], message['content']
+                            metadata = message.get('metadata')
+                            timestamp = message.get('timestamp')
+                        else:
+                            role, content = message[:2]
+                            metadata = message[2] if len(message) > 2 else None
+                            timestamp = None
+                        batch.append(self._message_row(conv_id, role, content, metadata, timestamp))
+                        touched.add(conv_id)
+
+                        if len(batch) >= batch_size:
+                            message_count += self._write_message_batch(batch, touched, updated_at)
+                            batch, touched = [], set()
+
+                message_count += self._write_message_batch(batch, touched, updated_at)
+            except Exception:
+                self._rollback()
+                raise
+
+        return self._ingest_stats(start, conversations=conversation_count, messages=message_count)
+
+    def _get_or_insert_conversation(self, session_id: str, title: Optional[str],
+                                    metadata: Optional[Dict], created_at: Optional[str] = None,
+                                    updated_at: Optional[str] = None) -> int:
+        """
+        Return the conversation ID for a session, inserting it without committing
+
+        Timestamps of None store the current time, imports pass the original ones.
+        An existing conversation keeps its own.
+        """
+        conversation_id = self._known_conversation(self.cursor, session_id)
+        if conversation_id is not None:
+            return conversation_id
+
+        self.cursor.execute('''
+            INSERT INTO conversations (session_id, title, metadata, created_at, updated_at)
+            VALUES (?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP), COALESCE(?, CURRENT_TIMESTAMP))
+            ON CONFLICT(session_id) DO UPDATE SET session_id = excluded.session_id
+            RETURNING id
+        ''', (session_id, title, json.dumps(metadata) if metadata else None, created_at, updated_at))
+        # Remembered before the commit, _rollback forgets it again
+        return self._remember_conversation(session_id, self.cursor.fetchall()[0]['id'])
+
+    def _message_row(self, conversation_id: int, role: str, content: str,
+                     metadata: Optional[Dict], timestamp: Optional[str] = None) -> Tuple:
+        """
+        Validate a message and convert it to an INSERT parameter tuple
+
+        A timestamp of None stores the current time, imports pass the original one.
+        In compact storage mode the content is encoded and the metadata interned,
+        which writes to message_metadata, so call this while holding the write lock.
+        """
         if role not in ['human', 'ai', 'system']:
             raise ValueError(f"Invalid role: {role}. Must be 'human', 'ai', or 'system'")
+        return (conversation_id, role) + self._encode_payload(content, metadata) + (timestamp,)
 
+    def _encode_payload(self, content: str, metadata: Optional[Dict]) -> Tuple:
+        """Return the stored (content, metadata, metadata_id) values for the current storage mode"""
         metadata_json = json.dumps(metadata) if metadata else None
+        if self.codec.algorithm is None or metadata_json is None:
+            return self.codec.encode(content), metadata_json, None
+        return self.codec.encode(content), None, self._intern_metadata(metadata_json)
 
-        self.cursor.execute('''
-            INSERT INTO messages (conversation_id, role, content, metadata)
-            VALUES (?, ?, ?, ?)
-        ''', (conversation_id, role, content, metadata_json))
+    def _intern_metadata(self, metadata_json: str) -> int:
+        """Return the message_metadata ID of a JSON blob, inserting it without committing"""
+        metadata_id = self._metadata_ids.get(metadata_json)
+        if metadata_id is None:
+            self.cursor.execute('''
+                INSERT OR IGNORE INTO message_metadata (json) VALUES (?)
+            ''', (metadata_json,))
+            self.cursor.execute('''
+                SELECT id FROM message_metadata WHERE json = ?
+            ''', (metadata_json,))
+            metadata_id = self.cursor.fetchone()['id']
+            if len(self._metadata_ids) >= 10000:
+                # Mostly-unique metadata would grow the map forever, start over instead
+                self._metadata_ids.clear()
+            self._metadata_ids[metadata_json] = metadata_id
+        return metadata_id
 
-        # Update conversation's updated_at timestamp
-        self.cursor.execute('''
-            UPDATE conversations
-            SET updated_at = CURRENT_TIMESTAMP
-            WHERE id = ?
-        ''', (conversation_id,))
+    def _rollback(self):
+        """Roll back the write transaction and forget metadata and conversation IDs it may have created"""
+        self.conn.rollback()
+        self._metadata_ids.clear()
+        self._conversation_ids.clear()
+
+    def _write_message_batch(self, rows: List[Tuple], conversation_ids: Set[int],
+                             updated_at: Optional[Dict[int, str]] = None) -> int:
+        """
+        Insert a batch of message rows and touch each conversation once, in one transaction
+
+        Conversations in updated_at are touched with that time instead of the
+        current one, unless they were updated more recently.
+        """
+        if rows:
+            self.cursor.executemany('''
+                INSERT INTO messages (conversation_id, role, content, metadata, metadata_id, timestamp)
+                VALUES (?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+            ''', rows)
+
+            updated_at = updated_at or {}
+            self.cursor.executemany('''
+                UPDATE conversations
+                SET updated_at = COALESCE(MAX(updated_at, ?), CURRENT_TIMESTAMP)
+                WHERE id = ?
+            ''', [(updated_at.get(conv_id), conv_id) for conv_id in conversation_ids])
 
         self.conn.commit()
-        return self.cursor.lastrowid
+
+        if self.history_cache is not None:
+            # Bulk rows bypass the write-through path, so cached sessions must reload
+            for conv_id in conversation_ids:
+                self.history_cache.invalidate_conversation(self.db_path, conv_id)
+        if self.vector_index is not None and rows:
+            self.vector_index.sync(self)
+        return len(rows)
+
+    @staticmethod
+    def _ingest_stats(start: float, conversations: int, messages: int) -> Dict[str, Any]:
+        """Summarize a bulk ingest run"""
+        seconds = time.perf_counter() - start
+        return {
+            'conversations': conversations,
+            'messages': messages,
+            'seconds': seconds,
+            'rows_per_sec': messages / seconds if seconds > 0 else 0.0
+        }
 
     def get_conversation_messages(self, session_id: str) -> List[Tuple[str, str]]:
         """Get all messages from a conversation by session ID"""
-        self.cursor.execute('''
+        cursor = self._read_cursor()
+        cursor.execute('''
             SELECT m.role, m.content, m.timestamp
             FROM messages m
             JOIN conversations c ON m.conversation_id = c.id
             WHERE c.session_id = ?
-            ORDER BY m.timestamp ASC
+            ORDER BY m.id ASC
         ''', (session_id,))
 
+        decode = self.codec.decode
         messages = []
-        for row in self.cursor.fetchall():
-            messages.append((row['role'], row['content']))
+        for row in cursor.fetchall():
+            messages.append((row['role'], decode(row['content'])))
 
         return messages
 
+    def get_messages_since(self, session_id: str, since_id: int = 0) -> List[Tuple[int, str, str]]:
+        """Get (id, role, content) for messages of a session with an ID greater than since_id"""
+        messages = []
+        for batch in self.iter_conversation_messages(session_id, since_id=since_id):
+            messages.extend(batch)
+        return messages
+
+    def get_messages_page(self, session_id: str, after_id: int = 0,
+                          limit: int = 500) -> Tuple[List[Tuple[int, str, str]], Optional[int]]:
+        """
+        Get one page of a conversation using keyset pagination on (conversation_id, id)
+
+        Args:
+            session_id: Conversation to read
+            after_id: Return messages with an ID greater than this cursor
+            limit: Maximum number of messages in the page
+
+        Returns:
+            (id, role, content) rows in message order, and the cursor for the next
+            page or None when this was the last page
+        """
+        cursor = self._read_cursor()
+        cursor.execute('''
+            SELECT m.id, m.role, m.content
+            FROM messages m
+            JOIN conversations c ON m.conversation_id = c.id
+            WHERE c.session_id = ? AND m.id > ?
+            ORDER BY m.id ASC
+            LIMIT ?
+        ''', (session_id, after_id, limit))
+
+        decode = self.codec.decode
+        rows = [(row['id'], row['role'], decode(row['content'])) for row in cursor.fetchall()]
+        next_cursor = rows[-1][0] if len(rows) == limit else None
+        return rows, next_cursor
+
+    def iter_conversation_messages(self, session_id: str, batch_size: int = 500,
+                                   since_id: int = 0,
+                                   last_n: Optional[int] = None) -> Iterator[List[Tuple[int, str, str]]]:
+        """
+        Stream a conversation as batches of (id, role, content) rows in message order
+
+        Args:
+            session_id: Conversation to read
+            batch_size: Number of rows fetched per query
+            since_id: Only yield messages with an ID greater than this
+            last_n: Only yield the newest last_n messages (combined with since_id)
+        """
+        if last_n is not None:
+            if last_n <= 0:
+                return
+            since_id = max(since_id, self._tail_start_id(session_id, last_n))
+
+        after_id = since_id
+        while after_id is not None:
+            rows, after_id = self.get_messages_page(session_id, after_id, batch_size)
+            if rows:
+                yield rows
+
+    def iter_all_messages(self, since_id: int = 0,
+                          batch_size: int = 5000) -> Iterator[List[Tuple[int, str, str]]]:
+        """Stream (id, role, content) rows of every conversation in ID order, in batches"""
+        after_id = since_id
+        while True:
+            cursor = self._read_cursor()
+            cursor.execute('''
+                SELECT id, role, content FROM messages
+                WHERE id > ?
+                ORDER BY id ASC
+                LIMIT ?
+            ''', (after_id, batch_size))
+
+            rows = [(row['id'], row['role'], self.codec.decode(row['content'])) for row in cursor.fetchall()]
+            if not rows:
+                return
+            yield rows
+            after_id = rows[-1][0]
+
+    def get_message_ids(self, session_id: str) -> List[int]:
+        """Get the IDs of all messages of a conversation in order"""
+        cursor = self._read_cursor()
+        cursor.execute('''
+            SELECT m.id
+            FROM messages m
+            JOIN conversations c ON m.conversation_id = c.id
+            WHERE c.session_id = ?
+            ORDER BY m.id ASC
+        ''', (session_id,))
+
+        return [row['id'] for row in cursor.fetchall()]
+
+    def get_messages_by_ids(self, message_ids: Iterable[int]) -> List[Tuple[int, str, str]]:
+        """Get (id, role, content) for the given message IDs in ID order"""
+        message_ids = list(message_ids)
+        if not message_ids:
+            return []
+
+        cursor = self._read_cursor()
+        placeholders = ','.join('?' * len(message_ids))
+        cursor.execute(f'''
+            SELECT id, role, content FROM messages
+            WHERE id IN ({placeholders})
+            ORDER BY id ASC
+        ''', message_ids)
+
+        decode = self.codec.decode
+        return [(row['id'], row['role'], decode(row['content'])) for row in cursor.fetchall()]
+
+    def _tail_start_id(self, session_id: str, last_n: int) -> int:
+        """Return the cursor just before the newest last_n messages of a conversation"""
+        cursor = self._read_cursor()
+        cursor.execute('''
+            SELECT m.id
+            FROM messages m
+            JOIN conversations c ON m.conversation_id = c.id
+            WHERE c.session_id = ?
+            ORDER BY m.id DESC
+            LIMIT 1 OFFSET ?
+        ''', (session_id, last_n - 1))
+
+        row = cursor.fetchone()
+        return row['id'] - 1 if row else 0
+
     def get_recent_conversations(self, limit: int = 10) -> List[Dict]:
         """Get most recent conversations"""
-        self.cursor.execute('''
+        cursor = self._read_cursor()
+        cursor.execute('''
             SELECT id, session_id, title, created_at, updated_at
             FROM conversations
             ORDER BY updated_at DESC
@@ -129,7 +905,7 @@ class ChatDatabase:
         ''', (limit,))
 
         conversations = []
-        for row in self.cursor.fetchall():
+        for row in cursor.fetchall():
             conversations.append({
                 'id': row['id'],
                 'session_id': row['session_id'],
@@ -140,68 +916,226 @@ class ChatDatabase:
 
         return conversations
 
+    def get_summary(self, conversation_id: int) -> Optional[Tuple[str, int]]:
+        """Get the stored (summary, covered_messages) of a conversation, if any"""
+        cursor = self._read_cursor()
+        cursor.execute('''
+            SELECT summary, covered_messages FROM conversation_summaries
+            WHERE conversation_id = ?
+        ''', (conversation_id,))
+
+        row = cursor.fetchone()
+        return (row['summary'], row['covered_messages']) if row else None
+
+    def save_summary(self, conversation_id: int, summary: str, covered_messages: int):
+        """Store the summary of the first covered_messages messages of a conversation"""
+        with self._write_lock:
+            self.cursor.execute('''
+                INSERT INTO conversation_summaries (conversation_id, summary, covered_messages)
+                VALUES (?, ?, ?)
+                ON CONFLICT(conversation_id) DO UPDATE SET
+                    summary = excluded.summary,
+                    covered_messages = excluded.covered_messages,
+                    updated_at = CURRENT_TIMESTAMP
+            ''', (conversation_id, summary, covered_messages))
+            self.conn.commit()
+
     def delete_conversation(self, session_id: str):
         """Delete a conversation and all its messages"""
-        self.cursor.execute('''
-            DELETE FROM conversations WHERE session_id = ?
-        ''', (session_id,))
-        self.conn.commit()
+        with self._write_lock:
+            # Foreign keys are not enforced, so ON DELETE CASCADE never runs
+            for table in ('messages', 'conversation_summaries'):
+                self.cursor.execute(f'''
+                    DELETE FROM {table}
+                    WHERE conversation_id IN (SELECT id FROM conversations WHERE session_id = ?)
+                ''', (session_id,))
+
+            self.cursor.execute('''
+                DELETE FROM conversations WHERE session_id = ?
+            ''', (session_id,))
+            self.conn.commit()
+            self._conversation_ids.pop(session_id, None)
+
+        if self.history_cache is not None:
+            self.history_cache.invalidate(self.db_path, session_id)
 
     def search_messages(self, query: str, limit: int = 20) -> List[Dict]:
-        """Search for messages containing the query text"""
-        self.cursor.execute('''
+        """Search for messages containing the query text, best matches first"""
+        match_expr = self._fts_match_expression(query)
+        if not self.fts_enabled or match_expr is None:
+            return self._search_messages_like(query, limit)
+
+        cursor = self._read_cursor()
+        cursor.execute('''
+            SELECT m.role, m.content, m.timestamp, c.session_id, c.title,
+                   snippet(messages_fts, 0, '[', ']', '...', 16) AS snippet,
+                   bm25(messages_fts) AS score
+            FROM messages_fts
+            JOIN messages m ON m.id = messages_fts.rowid
+            JOIN conversations c ON m.conversation_id = c.id
+            WHERE messages_fts MATCH ?
+            ORDER BY score
+            LIMIT ?
+        ''', (match_expr, limit))
+
+        return [self._search_result(row, row['snippet'], self.codec.decode(row['content']), row['score'])
+                for row in cursor.fetchall()]
+
+    def _search_messages_like(self, query: str, limit: int) -> List[Dict]:
+        """Substring search with a full scan, used when FTS5 is unavailable"""
+        cursor = self._read_cursor()
+        cursor.execute('''
             SELECT m.*, c.session_id, c.title
             FROM messages m
             JOIN conversations c ON m.conversation_id = c.id
-            WHERE m.content LIKE ?
+            WHERE decode_content(m.content) LIKE ?
             ORDER BY m.timestamp DESC
             LIMIT ?
         ''', (f'%{query}%', limit))
 
-        results = []
-        for row in self.cursor.fetchall():
-            results.append({
-                'session_id': row['session_id'],
-                'conversation_title': row['title'],
-                'role': row['role'],
-                'content': row['content'],
-                'timestamp': row['timestamp']
-            })
+        return [self._search_result(row, self.codec.decode(row['content'])) for row in cursor.fetchall()]
+
+    @staticmethod
+    def _fts_match_expression(query: str) -> Optional[str]:
+        """Turn free text into an FTS5 query of quoted prefix terms, e.g. "refund"* "order"*"""
+        terms = query.split()
+        if not terms:
+            return None
+        return ' '.join('"' + term.replace('"', '""') + '"*' for term in terms)
 
-        return results
+    @staticmethod
+    def _search_result(row: sqlite3.Row, snippet: str, content: Optional[str] = None,
+                       rank: Optional[float] = None) -> Dict:
+        """Build a search result dictionary from a joined message row and its decoded content"""
+        return {
+            'session_id': row['session_id'],
+            'conversation_title': row['title'],
+            'role': row['role'],
+            'content': snippet if content is None else content,
+            'timestamp': row['timestamp'],
+            'snippet': snippet,
+            'rank': rank  # BM25 score, lower is better; None for substring matches
+        }
 
     def export_conversation(self, session_id: str) -> Dict:
         """Export a conversation in a structured format"""
-        # Get conversation metadata
-        self.cursor.execute('''
-            SELECT * FROM conversations WHERE session_id = ?
+        cursor = self._read_cursor()
+
+        # Conversation and messages in one query, with interned metadata resolved;
+        # a conversation without messages comes back as one row with NULL message fields
+        cursor.execute('''
+            SELECT c.session_id, c.title, c.created_at, c.updated_at,
+                   m.id AS message_id, m.role, m.content,
+                   COALESCE(m.metadata, mm.json) AS metadata
+            FROM conversations c
+            LEFT JOIN messages m ON m.conversation_id = c.id
+            LEFT JOIN message_metadata mm ON mm.id = m.metadata_id
+            WHERE c.session_id = ?
+            ORDER BY m.id ASC
         ''', (session_id,))
 
-        conv_row = self.cursor.fetchone()
-        if not conv_row:
+        rows = cursor.fetchall()
+        if not rows:
             return None
 
         conversation = {
-            'session_id': conv_row['session_id'],
-            'title': conv_row['title'],
-            'created_at': conv_row['created_at'],
-            'updated_at': conv_row['updated_at'],
+            'session_id': rows[0]['session_id'],
+            'title': rows[0]['title'],
+            'created_at': rows[0]['created_at'],
+            'updated_at': rows[0]['updated_at'],
             'messages': []
         }
 
-        # Get all messages
-        messages = self.get_conversation_messages(session_id)
-        for role, content in messages:
-            conversation['messages'].append({
-                'role': role,
-                'content': content
-            })
+        for row in rows:
+            if row['message_id'] is None:
+                continue
+            message = {
+                'role': row['role'],
+                'content': self.codec.decode(row['content'])
+            }
+            if row['metadata']:
+                message['metadata'] = json.loads(row['metadata'])
+            conversation['messages'].append(message)
 
         return conversation
 
+    def iter_export_rows(self, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """
+        Stream every message of every conversation as flat rows, one ordered join
+
+        Rows are grouped by conversation (in creation order) and ordered by message
+        ID within it; a conversation without messages yields one row whose message
+        fields are None. Only batch_size rows are held in memory at a time.
+        """
+        # Own cursor, so the caller may use this instance while the export is running
+        cursor = (self.pool.reader() if self.pool is not None else self.conn).cursor()
+        cursor.execute('''
+            SELECT c.session_id, c.title, c.created_at, c.updated_at,
+                   c.metadata AS conversation_metadata,
+                   m.id AS message_id, m.role, m.content, m.timestamp,
+                   COALESCE(m.metadata, mm.json) AS metadata
+            FROM conversations c
+            LEFT JOIN messages m ON m.conversation_id = c.id
+            LEFT JOIN message_metadata mm ON mm.id = m.metadata_id
+            ORDER BY c.id, m.id
+        ''')
+
+        decode = self.codec.decode
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                for row in rows:
+                    yield {
+                        'session_id': row['session_id'],
+                        'title': row['title'],
+                        'created_at': row['created_at'],
+                        'updated_at': row['updated_at'],
+                        'conversation_metadata': row['conversation_metadata'],
+                        'message_id': row['message_id'],
+                        'role': row['role'],
+                        'content': decode(row['content']),
+                        'timestamp': row['timestamp'],
+                        'metadata': row['metadata']
+                    }
+        finally:
+            cursor.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Row counts of the database, plus method metrics when instrumented
+
+        Returns:
+            {'conversations': int, 'messages': int, 'messages_by_role': {role: count}},
+            merged with DatabaseMetrics.stats() when the instance has metrics
+        """
+        cursor = self._read_cursor()
+        cursor.execute('SELECT COUNT(*) FROM conversations')
+        conversations = cursor.fetchone()[0]
+        cursor.execute('''
+            SELECT role, COUNT(*) AS count
+            FROM messages
+            GROUP BY role
+            ORDER BY count DESC
+        ''')
+        by_role = {row['role']: row['count'] for row in cursor.fetchall()}
+
+        stats = {
+            'conversations': conversations,
+            'messages': sum(by_role.values()),
+            'messages_by_role': by_role
+        }
+        if self.metrics is not None:
+            stats.update(self.metrics.stats())
+        return stats
+
     def close(self):
         """Close database connection"""
-        self.conn.close()
+        if self.pool is not None:
+            self.pool.close()
+        else:
+            self.conn.close()
 
     def __enter__(self):
         """Context manager entry"""
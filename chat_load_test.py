@@ -0,0 +1,282 @@
+"""
+Chat Server Load Test
+Opens many concurrent sessions against chat_server.py. Each session sends a few
+turns over HTTP with streamed replies, or over WebSocket. The run reports
+sessions/sec, turns/sec, and p50/p95/p99 latency for whole turns and for the
+first token. Without --url it starts an in-process server that uses the offline
+fake model and a temporary database.
+
+Usage:
+    python3 chat_load_test.py --sessions 200 --turns 3 --concurrency 50
+    python3 chat_load_test.py --websocket --model-latency 0.5
+    python3 chat_load_test.py --url http://localhost:8080 --sessions 1000
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from benchmark_suite import summarize
+from chat_server import OP_CLOSE, OP_TEXT, encode_frame, read_frame
+
+
+class TurnResult:
+    """Outcome of one turn as seen by the client"""
+
+    __slots__ = ('reply', 'seconds', 'first_token_seconds', 'status')
+
+    def __init__(self, reply: str, seconds: float, first_token_seconds: float, status: int = 200):
+        self.reply = reply
+        self.seconds = seconds
+        self.first_token_seconds = first_token_seconds
+        self.status = status
+
+
+async def _read_head(reader: asyncio.StreamReader) -> Tuple[int, Dict[str, str]]:
+    lines = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+    status = int(lines[0].split(' ', 2)[1])
+    headers = {}
+    for line in lines[1:]:
+        if line:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+    return status, headers
+
+
+async def _read_chunks(reader: asyncio.StreamReader):
+    """Yield the chunks of a chunked response body"""
+    while True:
+        size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+        if size == 0:
+            await reader.readuntil(b'\r\n')
+            return
+        data = await reader.readexactly(size + 2)
+        yield data[:-2]
+
+
+class HTTPChatClient:
+    """One keep-alive connection sending turns for a single session"""
+
+    def __init__(self, host: str, port: int, session_id: str):
+        self.host = host
+        self.port = port
+        self.session_id = session_id
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    async def _request(self, method: str, path: str, payload: Any = None):
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+        self._writer.write((f'{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n'
+                            f'Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n')
+                           .encode('latin-1') + body)
+        await self._writer.drain()
+        return await _read_head(self._reader)
+
+    async def _read_json(self, headers: Dict[str, str]) -> Any:
+        body = await self._reader.readexactly(int(headers.get('content-length', 0)))
+        if headers.get('connection') == 'close':
+            await self.close()
+        return json.loads(body)
+
+    async def send(self, content: str) -> TurnResult:
+        """Send one message and read the streamed reply"""
+        start = time.perf_counter()
+        first_token = None
+        status, headers = await self._request('POST', f'/sessions/{self.session_id}/messages',
+                                              {'content': content})
+        if status != 200:
+            error = await self._read_json(headers)
+            return TurnResult(error.get('error', ''), time.perf_counter() - start, 0.0, status)
+
+        reply, buffer = None, b''
+        async for chunk in _read_chunks(self._reader):
+            buffer += chunk
+            while b'\n\n' in buffer:
+                event, buffer = buffer.split(b'\n\n', 1)
+                lines = dict(line.split(': ', 1) for line in event.decode('utf-8').split('\n'))
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                if lines.get('event') == 'done':
+                    reply = json.loads(lines['data'])['reply']
+                elif lines.get('event') == 'error':
+                    status = 500
+        seconds = time.perf_counter() - start
+        return TurnResult(reply or '', seconds, first_token or seconds, status)
+
+    async def history(self) -> List[Dict[str, str]]:
+        _, headers = await self._request('GET', f'/sessions/{self.session_id}/messages')
+        return (await self._read_json(headers))['messages']
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+class WebSocketChatClient:
+    """One WebSocket connection sending turns for a single session"""
+
+    def __init__(self, host: str, port: int, session_id: str):
+        self.host = host
+        self.port = port
+        self.session_id = session_id
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    async def connect(self):
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        key = base64.b64encode(os.urandom(16)).decode('ascii')
+        self._writer.write((f'GET /ws/{self.session_id} HTTP/1.1\r\nHost: {self.host}\r\n'
+                            f'Upgrade: websocket\r\nConnection: Upgrade\r\n'
+                            f'Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n')
+                           .encode('latin-1'))
+        await self._writer.drain()
+        status, _ = await _read_head(self._reader)
+        if status != 101:
+            raise ConnectionError(f'WebSocket upgrade refused with {status}')
+
+    async def send(self, content: str) -> TurnResult:
+        if self._writer is None:
+            await self.connect()
+        start = time.perf_counter()
+        first_token = None
+        self._writer.write(encode_frame(OP_TEXT, json.dumps({'content': content}).encode('utf-8'),
+                                        mask=os.urandom(4)))
+        await self._writer.drain()
+        while True:
+            _, opcode, payload = await read_frame(self._reader)
+            if opcode == OP_CLOSE:
+                raise ConnectionError('Server closed the WebSocket')
+            if opcode != OP_TEXT:
+                continue
+            message = json.loads(payload)
+            if first_token is None:
+                first_token = time.perf_counter() - start
+            if message['type'] == 'done':
+                return TurnResult(message['reply'], time.perf_counter() - start, first_token)
+            if message['type'] == 'error':
+                status = 503 if 'retry_after' in message else 500
+                return TurnResult(message['error'], time.perf_counter() - start, first_token, status)
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.write(encode_frame(OP_CLOSE, b'\x03\xe8', mask=os.urandom(4)))
+            self._writer.close()
+            self._writer = None
+
+
+async def run_load(host: str, port: int, sessions: int = 100, turns: int = 3, concurrency: int = 50,
+                   websocket: bool = False, prefix: str = 'load') -> Dict[str, Any]:
+    """
+    Run sessions concurrently, at most concurrency at a time, each sending turns messages
+
+    Returns:
+        Report with session throughput, turn latency and time-to-first-token summaries
+    """
+    client_class = WebSocketChatClient if websocket else HTTPChatClient
+    gate = asyncio.Semaphore(concurrency)
+    results: List[TurnResult] = []
+    failed_sessions = 0
+
+    async def session(index: int):
+        nonlocal failed_sessions
+        async with gate:
+            client = client_class(host, port, f'{prefix}-{index}')
+            try:
+                for turn in range(turns):
+                    results.append(await client.send(f'Question {turn} from session {index}'))
+            except (ConnectionError, asyncio.IncompleteReadError):
+                failed_sessions += 1
+            finally:
+                await client.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(session(i) for i in range(sessions)))
+    seconds = time.perf_counter() - start
+
+    ok = [result for result in results if result.status == 200]
+    return {
+        'transport': 'websocket' if websocket else 'http',
+        'sessions': sessions,
+        'turns_per_session': turns,
+        'concurrency': concurrency,
+        'seconds': seconds,
+        'sessions_per_sec': (sessions - failed_sessions) / seconds if seconds > 0 else 0.0,
+        'failed_sessions': failed_sessions,
+        'rejected_turns': sum(1 for result in results if result.status == 503),
+        'failed_turns': sum(1 for result in results if result.status not in (200, 503)),
+        'turn': summarize([result.seconds for result in ok], seconds),
+        'first_token': summarize([result.first_token_seconds for result in ok], seconds)
+    }
+
+
+async def run_local(args) -> Dict[str, Any]:
+    """Start a server with the fake model on a temporary database and load it"""
+    from async_chat_database import AsyncChatDatabase
+    from chat_server import ChatServer
+    from fake_chat_model import FakeChatModel
+    from message_placeholder_db import history_cache
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = AsyncChatDatabase(os.path.join(tmp, 'load.db'), history_cache=history_cache,
+                               write_behind_ms=None if args.sync_writes else args.write_behind_ms)
+        model = FakeChatModel(latency=args.model_latency, token_latency=args.token_latency,
+                              reply_words=args.reply_words)
+        server = ChatServer(db, model, port=0, max_active_turns=args.max_active_turns)
+        await server.start()
+        try:
+            return await run_load('127.0.0.1', server.port, args.sessions, args.turns,
+                                  args.concurrency, args.websocket)
+        finally:
+            await server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the chat server')
+    parser.add_argument('--url', help='Running server, e.g. http://localhost:8080 (default: start one)')
+    parser.add_argument('--sessions', type=int, default=200, help='Sessions to run')
+    parser.add_argument('--turns', type=int, default=3, help='Turns per session')
+    parser.add_argument('--concurrency', type=int, default=50, help='Sessions open at once')
+    parser.add_argument('--websocket', action='store_true', help='Use WebSocket instead of HTTP streaming')
+    parser.add_argument('--model-latency', type=float, default=0.05, help='Fake model seconds to first token')
+    parser.add_argument('--token-latency', type=float, default=0.002, help='Fake model seconds between tokens')
+    parser.add_argument('--reply-words', type=int, default=40, help='Fake reply length')
+    parser.add_argument('--max-active-turns', type=int, default=64, help='Local server turn limit')
+    parser.add_argument('--write-behind-ms', type=float, default=0, help='Local server group-commit interval')
+    parser.add_argument('--sync-writes', action='store_true', help='Local server commits each turn inline')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    args = parser.parse_args()
+
+    if args.url:
+        url = urlsplit(args.url)
+        report = asyncio.run(run_load(url.hostname, url.port or 80, args.sessions, args.turns,
+                                      args.concurrency, args.websocket))
+    else:
+        report = asyncio.run(run_local(args))
+
+    print(f"{report['sessions']} sessions x {report['turns_per_session']} turns over {report['transport']} "
+          f"in {report['seconds']:.2f}s")
+    print(f"  sessions/sec: {report['sessions_per_sec']:.1f}   turns/sec: {report['turn']['throughput_per_sec']:.1f}")
+    print(f"  turn latency ms      p50 {report['turn']['p50_ms']:.1f}  p95 {report['turn']['p95_ms']:.1f}  "
+          f"p99 {report['turn']['p99_ms']:.1f}")
+    print(f"  first token ms       p50 {report['first_token']['p50_ms']:.1f}  "
+          f"p99 {report['first_token']['p99_ms']:.1f}")
+    print(f"  rejected turns: {report['rejected_turns']}   failed turns: {report['failed_turns']}   "
+          f"failed sessions: {report['failed_sessions']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
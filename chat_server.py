@@ -0,0 +1,535 @@
+"""
+Chat Server Module
+Multi-session chat service over HTTP and WebSocket, built on asyncio streams and
+the standard library only. Conversations live in ChatDatabase, so any number of
+users can chat at once under their own session_id and pick up where they left
+off after a restart. Replies are streamed token by token.
+
+Each write waits for the socket to drain, so a slow reader only slows its own
+stream. At most max_active_turns turns run at once, up to max_queued_turns more
+wait, and anything beyond that gets 503 with Retry-After. Turns of one session
+run one at a time, and a turn waiting for the session's previous one counts
+toward neither limit. On SIGINT/SIGTERM the server stops accepting connections
+and lets running turns finish and save. It then closes the database once the
+write-behind queue is flushed.
+
+Endpoints:
+    GET  /health                          status and counters
+    GET  /sessions/{session_id}/messages  stored history
+    POST /sessions/{session_id}/messages  {"content": "...", "stream": true}, replies with a
+                                          text/event-stream of tokens, or JSON when stream is false
+    GET  /ws/{session_id}                 WebSocket: send text or {"content": "..."}, receive
+                                          {"type": "token"} frames and a final {"type": "done"}
+
+Usage:
+    python3 chat_server.py --port 8080
+    python3 chat_server.py --fake --fake-latency 0.2
+    curl -N -d '{"content": "Where is my order?"}' localhost:8080/sessions/s1/messages
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import signal
+import struct
+import weakref
+from contextlib import asynccontextmanager, suppress
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+
+from async_chat_database import AsyncChatDatabase
+
+logger = logging.getLogger(__name__)
+
+
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 1024 * 1024
+
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+OP_CONTINUATION, OP_TEXT, OP_BINARY, OP_CLOSE, OP_PING, OP_PONG = 0x0, 0x1, 0x2, 0x8, 0x9, 0xA
+
+REASONS = {101: 'Switching Protocols', 200: 'OK', 400: 'Bad Request', 404: 'Not Found',
+           405: 'Method Not Allowed', 413: 'Payload Too Large', 500: 'Internal Server Error',
+           503: 'Service Unavailable'}
+
+
+class HTTPError(Exception):
+    """Request that gets an error response and closes the connection"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class Overloaded(Exception):
+    """No room for another turn, or the server is shutting down"""
+
+
+class TurnFailed(Exception):
+    """A turn failed after its response started; the client was already told"""
+
+
+class Request:
+    """Parsed HTTP request"""
+
+    __slots__ = ('method', 'path', 'headers', 'body')
+
+    def __init__(self, method: str, path: str, headers: Dict[str, str], body: bytes):
+        self.method = method
+        self.path = path
+        self.headers = headers
+        self.body = body
+
+
+async def read_request(reader: asyncio.StreamReader) -> Optional[Request]:
+    """Read one request from a connection, None when the client closed it"""
+    try:
+        head = await reader.readuntil(b'\r\n\r\n')
+    except asyncio.IncompleteReadError as exc:
+        if not exc.partial.strip():
+            return None
+        raise HTTPError(400, 'Incomplete request')
+    except asyncio.LimitOverrunError:
+        raise HTTPError(400, 'Request headers too large')
+
+    lines = head.decode('latin-1').split('\r\n')
+    try:
+        method, target, _ = lines[0].split(' ', 2)
+    except ValueError:
+        raise HTTPError(400, 'Malformed request line')
+    headers = {}
+    for line in lines[1:]:
+        if line:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get('content-length') or 0)
+    except ValueError:
+        raise HTTPError(400, 'Malformed Content-Length')
+    if length < 0:
+        raise HTTPError(400, 'Malformed Content-Length')
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413, 'Request body too large')
+    body = await reader.readexactly(length) if length else b''
+    return Request(method.upper(), unquote(urlsplit(target).path), headers, body)
+
+
+def response_head(status: int, headers: Dict[str, Any]) -> bytes:
+    lines = [f'HTTP/1.1 {status} {REASONS.get(status, "")}']
+    lines.extend(f'{name}: {value}' for name, value in headers.items())
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+
+async def send_json(writer: asyncio.StreamWriter, status: int, payload: Any,
+                    keep_alive: bool = True, headers: Optional[Dict[str, Any]] = None):
+    body = json.dumps(payload).encode('utf-8')
+    writer.write(response_head(status, {
+        'Content-Type': 'application/json',
+        'Content-Length': len(body),
+        'Connection': 'keep-alive' if keep_alive else 'close',
+        **(headers or {})
+    }) + body)
+    await writer.drain()
+
+
+async def send_chunk(writer: asyncio.StreamWriter, data: bytes):
+    """Write one chunk of a chunked response and wait until the client has taken it"""
+    writer.write(f'{len(data):x}\r\n'.encode('ascii') + data + b'\r\n')
+    await writer.drain()
+
+
+def sse_event(payload: Any, event: Optional[str] = None) -> bytes:
+    prefix = f'event: {event}\n' if event else ''
+    return f'{prefix}data: {json.dumps(payload)}\n\n'.encode('utf-8')
+
+
+def _unmask(payload: bytes, mask: bytes) -> bytes:
+    """XOR a client frame's payload with its 4-byte mask"""
+    n = len(payload)
+    key = (mask * (n // 4 + 1))[:n]
+    return (int.from_bytes(payload, 'big') ^ int.from_bytes(key, 'big')).to_bytes(n, 'big')
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Tuple[bool, int, bytes]:
+    """Read one WebSocket frame, return (fin, opcode, unmasked payload)"""
+    first, second = await reader.readexactly(2)
+    length = second & 0x7F
+    if length == 126:
+        length = struct.unpack('!H', await reader.readexactly(2))[0]
+    elif length == 127:
+        length = struct.unpack('!Q', await reader.readexactly(8))[0]
+    if length > MAX_BODY_BYTES:
+        raise ConnectionError('WebSocket frame too large')
+    mask = await reader.readexactly(4) if second & 0x80 else None
+    payload = await reader.readexactly(length)
+    return bool(first & 0x80), first & 0x0F, _unmask(payload, mask) if mask else payload
+
+
+def encode_frame(opcode: int, payload: bytes, mask: Optional[bytes] = None) -> bytes:
+    """Build a single-frame WebSocket message; clients must pass a mask, servers must not"""
+    length = len(payload)
+    if length < 126:
+        header = struct.pack('!BB', 0x80 | opcode, length)
+    elif length < 1 << 16:
+        header = struct.pack('!BBH', 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+    if mask is None:
+        return header + payload
+    header = bytes([header[0], header[1] | 0x80]) + header[2:]
+    return header + mask + _unmask(payload, mask)
+
+
+class ChatServer:
+    """Serves chat turns for many sessions from one event loop"""
+
+    def __init__(self, db: AsyncChatDatabase, model, host: str = '127.0.0.1', port: int = 8080,
+                 max_active_turns: int = 64, max_queued_turns: int = 256, policy=None):
+        """
+        Args:
+            db: Database the conversations are read from and saved to; the server
+                closes it on shutdown
+            model: Chat model that streams the replies
+            host: Interface to listen on
+            port: TCP port, 0 picks a free one (see self.port after start)
+            max_active_turns: Turns generating a reply at the same time
+            max_queued_turns: Turns allowed to wait for a slot before 503 is returned
+            policy: History compaction policy, defaults to history_policy
+        """
+        self.db = db
+        self.model = model
+        self.host = host
+        self.port = port
+        self.max_queued_turns = max_queued_turns
+        self.policy = policy
+        self.draining = False
+        self.counters = {'turns': 0, 'failed_turns': 0, 'rejected_turns': 0}
+
+        self._slots = asyncio.Semaphore(max_active_turns)
+        self._active = 0
+        self._waiting = 0
+        # One turn at a time per session keeps each history in order
+        self._session_locks: 'weakref.WeakValueDictionary[str, asyncio.Lock]' = weakref.WeakValueDictionary()
+        self._connections: Dict[asyncio.Task, asyncio.StreamWriter] = {}
+        self._busy = set()
+        self._websockets = set()
+        self._server: Optional[asyncio.base_events.Server] = None
+
+    async def start(self):
+        """Start listening"""
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port,
+                                                  limit=MAX_HEADER_BYTES)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def shutdown(self, grace_seconds: float = 10.0):
+        """
+        Stop accepting work, let running turns finish, then close the database
+
+        Idle connections are closed at once. Turns still running after
+        grace_seconds are cancelled and not saved.
+        """
+        self.draining = True
+        if self._server is not None:
+            self._server.close()
+        for writer in list(self._websockets):
+            if writer not in self._busy:
+                with suppress(ConnectionError):
+                    writer.write(encode_frame(OP_CLOSE, struct.pack('!H', 1001)))
+        for task, writer in list(self._connections.items()):
+            if writer not in self._busy:
+                writer.close()
+
+        busy = [task for task, writer in self._connections.items() if writer in self._busy]
+        if busy:
+            _, pending = await asyncio.wait(busy, timeout=grace_seconds)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        # Waits for database calls still queued on the executor
+        await self.db.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'status': 'draining' if self.draining else 'ok',
+            'active_turns': self._active,
+            'queued_turns': self._waiting,
+            'connections': len(self._connections),
+            **self.counters
+        }
+
+    @asynccontextmanager
+    async def _turn(self, session_id: str, content: str):
+        """Admit a turn and yield the stream of its reply text"""
+        from message_placeholder_db import astream_chat_with_history
+
+        if self.draining:
+            self.counters['rejected_turns'] += 1
+            raise Overloaded('Server is shutting down')
+
+        # Wait for the session's previous turn before taking a slot, so turns queued
+        # behind one chatty session do not hold slots other sessions could use
+        lock = self._session_locks.get(session_id)
+        if lock is None:
+            lock = self._session_locks[session_id] = asyncio.Lock()
+        async with lock:
+            if self._slots.locked() and self._waiting >= self.max_queued_turns:
+                self.counters['rejected_turns'] += 1
+                raise Overloaded('Too many turns in progress')
+
+            self._waiting += 1
+            try:
+                await self._slots.acquire()
+            finally:
+                self._waiting -= 1
+            self._active += 1
+            try:
+                stream = astream_chat_with_history(session_id, content, db=self.db,
+                                                   model=self.model, policy=self.policy)
+                try:
+                    yield stream
+                    self.counters['turns'] += 1
+                except Exception:
+                    self.counters['failed_turns'] += 1
+                    raise
+                finally:
+                    await stream.aclose()
+            finally:
+                self._active -= 1
+                self._slots.release()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve requests on one connection until it closes, keep-alive included"""
+        task = asyncio.current_task()
+        self._connections[task] = writer
+        try:
+            while not self.draining:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                if request.headers.get('upgrade', '').lower() == 'websocket':
+                    await self._websocket(request, reader, writer)
+                    break
+                keep_alive = request.headers.get('connection', '').lower() != 'close'
+                self._busy.add(writer)
+                try:
+                    await self._route(request, writer, keep_alive)
+                finally:
+                    self._busy.discard(writer)
+                if not keep_alive:
+                    break
+        except HTTPError as exc:
+            with suppress(ConnectionError):
+                await send_json(writer, exc.status, {'error': str(exc)}, keep_alive=False)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            del self._connections[task]
+            writer.close()
+            with suppress(Exception):
+                await writer.wait_closed()
+
+    def _session_path(self, path: str) -> Tuple[str, str]:
+        """Split /sessions/{id}/messages and /ws/{id} into (kind, session_id)"""
+        parts = [part for part in path.split('/') if part]
+        if len(parts) == 3 and parts[0] == 'sessions' and parts[2] == 'messages':
+            return 'messages', parts[1]
+        if len(parts) == 2 and parts[0] == 'ws':
+            return 'ws', parts[1]
+        raise HTTPError(404, f'No route for {path}')
+
+    async def _route(self, request: Request, writer: asyncio.StreamWriter, keep_alive: bool):
+        if request.path == '/health':
+            await send_json(writer, 200, self.stats(), keep_alive)
+            return
+
+        kind, session_id = self._session_path(request.path)
+        if kind != 'messages':
+            raise HTTPError(400, 'WebSocket endpoint needs an Upgrade request')
+        if request.method == 'GET':
+            messages = await self.db.get_conversation_messages(session_id)
+            await send_json(writer, 200, {
+                'session_id': session_id,
+                'messages': [{'role': role, 'content': content} for role, content in messages]
+            }, keep_alive)
+            return
+        if request.method != 'POST':
+            raise HTTPError(405, 'Use GET or POST')
+
+        try:
+            body = json.loads(request.body or b'{}')
+            content = body['content']
+        except (ValueError, KeyError, TypeError):
+            raise HTTPError(400, 'Body must be JSON with a "content" string')
+        if not isinstance(content, str) or not content.strip():
+            raise HTTPError(400, '"content" must be a non-empty string')
+
+        try:
+            async with self._turn(session_id, content) as tokens:
+                if body.get('stream', True):
+                    await self._stream_reply(writer, tokens)
+                else:
+                    await self._send_reply(writer, session_id, tokens, keep_alive)
+        except Overloaded as exc:
+            await send_json(writer, 503, {'error': str(exc)}, keep_alive, headers={'Retry-After': 1})
+        except TurnFailed:
+            # Counted as a failed turn by _turn, the connection stays usable
+            pass
+
+    async def _send_reply(self, writer: asyncio.StreamWriter, session_id: str, tokens, keep_alive: bool):
+        """Send the whole reply as one JSON response, or a 500 if the turn fails"""
+        try:
+            reply = ''.join([text async for text in tokens])
+        except (ConnectionError, asyncio.CancelledError):
+            raise
+        except Exception as exc:
+            logger.exception("Turn failed")
+            await send_json(writer, 500, {'error': str(exc)}, keep_alive)
+            raise TurnFailed(str(exc)) from exc
+        await send_json(writer, 200, {'session_id': session_id, 'reply': reply}, keep_alive)
+
+    async def _stream_reply(self, writer: asyncio.StreamWriter, tokens):
+        """Send the reply as server-sent events, one per token, then a done event"""
+        writer.write(response_head(200, {
+            'Content-Type': 'text/event-stream',
+            'Cache-Control': 'no-cache',
+            'Transfer-Encoding': 'chunked',
+            'Connection': 'keep-alive'
+        }))
+        parts = []
+        try:
+            async for text in tokens:
+                parts.append(text)
+                await send_chunk(writer, sse_event({'token': text}))
+        except (ConnectionError, asyncio.CancelledError):
+            raise
+        except Exception as exc:
+            # Headers are out, report the failure inside the stream
+            logger.exception("Turn failed")
+            await send_chunk(writer, sse_event({'error': str(exc)}, event='error'))
+            writer.write(b'0\r\n\r\n')
+            await writer.drain()
+            raise TurnFailed(str(exc)) from exc
+        await send_chunk(writer, sse_event({'reply': ''.join(parts)}, event='done'))
+        writer.write(b'0\r\n\r\n')
+        await writer.drain()
+
+    async def _websocket(self, request: Request, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Upgrade the connection and run one turn per text message until either side closes"""
+        kind, session_id = self._session_path(request.path)
+        key = request.headers.get('sec-websocket-key')
+        if kind != 'ws' or not key:
+            raise HTTPError(400, 'WebSocket upgrades are served on /ws/{session_id}')
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode('ascii')).digest()).decode('ascii')
+        writer.write(response_head(101, {'Upgrade': 'websocket', 'Connection': 'Upgrade',
+                                         'Sec-WebSocket-Accept': accept}))
+        await writer.drain()
+
+        async def send(payload):
+            writer.write(encode_frame(OP_TEXT, json.dumps(payload).encode('utf-8')))
+            await writer.drain()
+
+        self._websockets.add(writer)
+        try:
+            fragments = []
+            while not self.draining:
+                fin, opcode, payload = await read_frame(reader)
+                if opcode == OP_CLOSE:
+                    writer.write(encode_frame(OP_CLOSE, payload[:2]))
+                    await writer.drain()
+                    return
+                if opcode == OP_PING:
+                    writer.write(encode_frame(OP_PONG, payload))
+                    continue
+                if opcode == OP_PONG:
+                    continue
+                fragments.append(payload)
+                if not fin:
+                    continue
+                text, fragments = b''.join(fragments).decode('utf-8', 'replace'), []
+
+                try:
+                    message = json.loads(text)
+                    content = message['content'] if isinstance(message, dict) else str(message)
+                except (ValueError, KeyError):
+                    content = text
+                self._busy.add(writer)
+                try:
+                    async with self._turn(session_id, content) as tokens:
+                        parts = []
+                        async for chunk in tokens:
+                            parts.append(chunk)
+                            await send({'type': 'token', 'text': chunk})
+                    await send({'type': 'done', 'reply': ''.join(parts)})
+                except Overloaded as exc:
+                    await send({'type': 'error', 'error': str(exc), 'retry_after': 1})
+                except (ConnectionError, asyncio.CancelledError):
+                    raise
+                except Exception as exc:
+                    logger.exception("Turn failed")
+                    await send({'type': 'error', 'error': str(exc)})
+                finally:
+                    self._busy.discard(writer)
+            # Draining: tell the client to reconnect elsewhere
+            writer.write(encode_frame(OP_CLOSE, struct.pack('!H', 1001)))
+            await writer.drain()
+        finally:
+            self._websockets.discard(writer)
+
+
+def build_model(args):
+    """Offline fake model with --fake, otherwise the shared router behind the scheduler"""
+    if args.fake:
+        from fake_chat_model import FakeChatModel
+        return FakeChatModel(latency=args.fake_latency, token_latency=args.fake_token_latency)
+    from message_placeholder_db import default_model
+    return default_model()
+
+
+async def serve(args):
+    from message_placeholder_db import history_cache
+
+    db = AsyncChatDatabase(args.db, max_workers=args.db_workers, history_cache=history_cache,
+                           write_behind_ms=None if args.sync_writes else args.write_behind_ms)
+    server = ChatServer(db, build_model(args), args.host, args.port,
+                        max_active_turns=args.max_active_turns, max_queued_turns=args.max_queued_turns)
+    await server.start()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    print(f"Serving chat on http://{args.host}:{server.port} (Ctrl+C to stop)")
+    await stop.wait()
+
+    print("Shutting down, waiting for running turns to finish...")
+    await server.shutdown(args.grace)
+    print(f"Stopped after {server.counters['turns']} turns")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Multi-session chat server over HTTP and WebSocket')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--db', default='chat_history.db', help='Chat history database')
+    parser.add_argument('--db-workers', type=int, default=8, help='Threads serving database calls')
+    parser.add_argument('--max-active-turns', type=int, default=64, help='Replies generated at once')
+    parser.add_argument('--max-queued-turns', type=int, default=256, help='Turns waiting before 503')
+    parser.add_argument('--write-behind-ms', type=float, default=0,
+                        help='Group-commit interval of saved turns, 0 commits each batch at once')
+    parser.add_argument('--sync-writes', action='store_true', help='Commit each turn before its reply ends')
+    parser.add_argument('--grace', type=float, default=10.0, help='Seconds running turns get on shutdown')
+    parser.add_argument('--fake', action='store_true', help='Use the offline fake chat model')
+    parser.add_argument('--fake-latency', type=float, default=0.2, help='Seconds before the fake reply starts')
+    parser.add_argument('--fake-token-latency', type=float, default=0.01, help='Seconds between fake tokens')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='[%(name)s] %(message)s')
+    asyncio.run(serve(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,16 @@
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
 from dotenv import load_dotenv
+from llm_scheduler import scheduled
 
 load_dotenv()
 
-model = ChatOpenAI(
+# Calls go through the shared scheduler, which enforces rate limits and retries 429s
+model = scheduled(ChatOpenAI(
     model='gpt-4o',
     max_tokens=2000,
     temperature=0.5
-)
+))
 
 chat_history = []
 
@@ -1,14 +1,19 @@
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
 from dotenv import load_dotenv
+from llm_scheduler import scheduled
+from model_router import build_router
+from streaming import timed_stream
+import logging
 
 load_dotenv()
+logging.basicConfig(level=logging.INFO, format='[%(name)s] %(message)s')
 
-model = ChatOpenAI(
-    model='gpt-4o',
+# Calls go to the fastest healthy provider in LLM_PROVIDERS, through the shared
+# scheduler, which enforces rate limits and retries 429s
+model = scheduled(build_router(
     max_tokens=2000,
     temperature=0.5
-)
+))
 
 chat_history = [
     SystemMessage(content='You are a helpful AI Assistant.')
@@ -19,8 +24,13 @@ while True:
     chat_history.append(HumanMessage(content=user_input))
     if user_input == 'exit':
         break
-    result = model.invoke(chat_history)
-    chat_history.append(AIMessage(content=result.content))
-    print(f"AI: {result.content}")
+    # Print tokens as they arrive and keep the full reply for the history
+    print("AI: ", end='', flush=True)
+    parts = []
+    for text in timed_stream(model.stream(chat_history), label='chatbot'):
+        print(text, end='', flush=True)
+        parts.append(text)
+    print()
+    chat_history.append(AIMessage(content=''.join(parts)))
 
 print(chat_history)
\ No newline at end of file
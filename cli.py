@@ -0,0 +1,194 @@
+"""
+Research assistant command line
+One entry point for the chat history database and the summarizer. Only the
+standard library and the database modules are imported up front; LangChain, OpenAI and
+dotenv are imported inside the commands that call a model, so the database
+commands start without paying for the LLM import graph.
+
+Usage:
+    python3 cli.py list
+    python3 cli.py search "refund order"
+    python3 cli.py export session_001 --output session_001.json
+    python3 cli.py export-all backup.jsonl.gz
+    python3 cli.py import backup.jsonl.gz --db restored.db
+    python3 cli.py chat session_001 "What was my order number?"
+    python3 cli.py summarize "Attention Is All You Need" --style Technical
+"""
+
+import argparse
+import json
+import os
+import sys
+
+
+def cmd_list(args):
+    """Print the most recently updated conversations"""
+    from sharded_database import open_database
+
+    with open_database(args.db) as db:
+        for conv in db.get_recent_conversations(args.limit):
+            print(f"{conv['session_id']:20} {conv['updated_at']:20} {conv['title'] or ''}")
+
+
+def cmd_search(args):
+    """Print messages matching the query, best matches first"""
+    from sharded_database import open_database
+
+    with open_database(args.db) as db:
+        results = db.search_messages(args.query, limit=args.limit)
+    for result in results:
+        print(f"{result['session_id']:20} {result['role'].upper():6} {result['snippet']}")
+    if not results:
+        print("No matching messages")
+
+
+def cmd_export(args):
+    """Write one conversation as JSON to a file or stdout"""
+    from sharded_database import open_database
+
+    with open_database(args.db) as db:
+        conversation = db.export_conversation(args.session_id)
+    if conversation is None:
+        print(f"No conversation with session ID {args.session_id}", file=sys.stderr)
+        return 1
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(conversation, f, indent=2)
+        print(f"Exported {len(conversation['messages'])} messages to {args.output}")
+    else:
+        json.dump(conversation, sys.stdout, indent=2)
+        print()
+
+
+def cmd_export_all(args):
+    """Stream every conversation to a JSON Lines or Parquet archive"""
+    from sharded_database import open_database
+    from conversation_archive import export_archive
+
+    with open_database(args.db) as db:
+        count = export_archive(db, args.path)
+    print(f"Exported {count:,} rows to {args.path}")
+
+
+def cmd_import(args):
+    """Stream an archive written by export-all into the database"""
+    from sharded_database import open_database
+    from conversation_archive import import_archive
+
+    with open_database(args.db) as db:
+        stats = import_archive(db, args.path)
+    print(f"Imported {stats['conversations']:,} conversations and {stats['messages']:,} messages "
+          f"({stats['rows_per_sec']:,.0f} rows/sec)")
+
+
+def cmd_chat(args):
+    """Continue a stored conversation with the chat model"""
+    from message_placeholder_db import chat_with_history, history_cache
+    from sharded_database import open_database
+
+    with open_database(args.db, history_cache=history_cache) as db:
+        response = chat_with_history(args.session_id, args.query, stream=args.stream,
+                                     retrieval_k=args.retrieval_k, db=db)
+    if not args.stream:
+        print(response)
+
+
+def cmd_summarize(args):
+    """Summarize a paper by title, or its full text when given a PDF or text file"""
+    from dotenv import load_dotenv
+    from summary_options import TEMPLATE_PATH, TEMPLATE_VARIABLES
+    from summary_store import SummaryStore
+
+    load_dotenv()
+    if args.fake:
+        from fake_chat_model import FakeChatModel
+        model, model_name = FakeChatModel(), 'fake-chat'
+    else:
+        from langchain_openai import ChatOpenAI
+        model, model_name = ChatOpenAI(model=args.model, max_tokens=2000), args.model
+
+    with SummaryStore(args.db) as store:
+        if os.path.isfile(args.paper):
+            import asyncio
+            from pathlib import Path
+            from paper_ingest import summarize_paper
+
+            print(asyncio.run(summarize_paper(
+                args.paper, args.title or Path(args.paper).stem, args.style, args.length,
+                model, store, model_name
+            )))
+            return
+
+        summary = store.get_summary(args.paper, args.style, args.length)
+        if summary is None:
+            from template_registry import registry
+
+            template = registry.get_template(TEMPLATE_PATH, TEMPLATE_VARIABLES)
+            summary = (template | model).invoke({'a': args.paper, 'b': args.style, 'c': args.length}).content
+            store.save_summary(args.paper, args.style, args.length, summary, model_name)
+        print(summary)
+
+
+def build_parser():
+    """Create the argument parser with one subcommand per operation"""
+    # summary_options is plain data, cheap enough to import for the --style/--length choices
+    from summary_options import LENGTHS, STYLES
+
+    parser = argparse.ArgumentParser(description='Chat history and research paper tools')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    list_parser = commands.add_parser('list', help='List recent conversations')
+    list_parser.add_argument('--limit', type=int, default=10, help='Number of conversations')
+    list_parser.set_defaults(func=cmd_list)
+
+    search_parser = commands.add_parser('search', help='Full-text search over all messages')
+    search_parser.add_argument('query', help='Words to search for')
+    search_parser.add_argument('--limit', type=int, default=20, help='Maximum results')
+    search_parser.set_defaults(func=cmd_search)
+
+    export_parser = commands.add_parser('export', help='Export a conversation as JSON')
+    export_parser.add_argument('session_id', help='Session to export')
+    export_parser.add_argument('--output', help='File to write (default: stdout)')
+    export_parser.set_defaults(func=cmd_export)
+
+    export_all_parser = commands.add_parser('export-all', help='Export every conversation for backup or analytics')
+    export_all_parser.add_argument('path', help='Archive file: .jsonl, .jsonl.gz or .parquet')
+    export_all_parser.set_defaults(func=cmd_export_all)
+
+    import_parser = commands.add_parser('import', help='Import an archive written by export-all')
+    import_parser.add_argument('path', help='Archive file: .jsonl, .jsonl.gz or .parquet')
+    import_parser.set_defaults(func=cmd_import)
+
+    chat_parser = commands.add_parser('chat', help='Continue a conversation with the chat model')
+    chat_parser.add_argument('session_id', help='Session to continue')
+    chat_parser.add_argument('query', help='New user message')
+    chat_parser.add_argument('--stream', action='store_true', help='Print tokens as they arrive')
+    chat_parser.add_argument('--retrieval-k', type=int, help='Send only the k most relevant past messages')
+    chat_parser.set_defaults(func=cmd_chat)
+
+    for command_parser in (list_parser, search_parser, export_parser, export_all_parser, import_parser,
+                           chat_parser):
+        command_parser.add_argument('--db', default='chat_history.db',
+                                    help='Chat history database file or shard directory')
+
+    summarize_parser = commands.add_parser('summarize', help='Summarize a research paper')
+    summarize_parser.add_argument('paper', help='Paper title, or a PDF or text file with the paper')
+    summarize_parser.add_argument('--title', help='Paper title when summarizing a file (default: file name)')
+    summarize_parser.add_argument('--style', default=STYLES[1], choices=STYLES)
+    summarize_parser.add_argument('--length', default=LENGTHS[0], choices=LENGTHS)
+    summarize_parser.add_argument('--db', default='chat_history.db', help='Database holding stored summaries')
+    summarize_parser.add_argument('--model', default='gpt-4o', help='OpenAI model name')
+    summarize_parser.add_argument('--fake', action='store_true', help='Use the offline fake chat model')
+    summarize_parser.set_defaults(func=cmd_summarize)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args) or 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
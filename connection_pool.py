@@ -0,0 +1,76 @@
+"""
+SQLite Connection Pool Module
+Per-thread reader connections plus a single shared writer connection in WAL mode
+"""
+
+import sqlite3
+import threading
+from typing import Callable, List, Optional
+
+
+SYNCHRONOUS_LEVELS = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+
+class ConnectionPool:
+    """Hands out thread-local read connections and one lock-protected writer connection"""
+
+    def __init__(self, db_path: str, busy_timeout: int = 5000, synchronous: str = 'NORMAL',
+                 on_connect: Optional[Callable[[sqlite3.Connection], None]] = None):
+        """
+        Open the writer connection and switch the database to WAL mode
+
+        Args:
+            db_path: Path to the SQLite database file
+            busy_timeout: Milliseconds a connection waits on a locked database before failing
+            synchronous: SQLite synchronous level (OFF, NORMAL, FULL or EXTRA)
+            on_connect: Called with every new connection, e.g. to register SQL functions
+        """
+        synchronous = synchronous.upper()
+        if synchronous not in SYNCHRONOUS_LEVELS:
+            raise ValueError(f"Invalid synchronous level: {synchronous}. Must be one of {SYNCHRONOUS_LEVELS}")
+
+        self.db_path = db_path
+        self.busy_timeout = busy_timeout
+        self.synchronous = synchronous
+        self.on_connect = on_connect
+
+        # Writers are serialized by this lock, so the writer may be shared across threads
+        self.write_lock = threading.RLock()
+        self.writer = self._connect()
+        # WAL lets readers keep reading the last committed snapshot while the writer works
+        self.writer.execute('PRAGMA journal_mode = WAL')
+
+        self._local = threading.local()
+        self._readers: List[sqlite3.Connection] = []
+        self._readers_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection with the pool's pragmas applied"""
+        # Readers stay on their own thread, but close() must be able to close them from any thread
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row  # Enable column access by name
+        conn.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout)}')
+        conn.execute(f'PRAGMA synchronous = {self.synchronous}')
+        if self.on_connect is not None:
+            self.on_connect(conn)
+        return conn
+
+    def reader(self) -> sqlite3.Connection:
+        """Return the calling thread's read-only connection, opening it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            conn.execute('PRAGMA query_only = ON')
+            self._local.conn = conn
+            with self._readers_lock:
+                self._readers.append(conn)
+        return conn
+
+    def close(self):
+        """Close every reader connection and the writer connection"""
+        with self._readers_lock:
+            for conn in self._readers:
+                conn.close()
+            self._readers = []
+        self._local = threading.local()
+        self.writer.close()
@@ -0,0 +1,191 @@
+"""
+Content Codec Module
+Compresses message text for the compact storage mode of ChatDatabase. Long
+messages are compressed on their own; short messages are compressed against a
+dictionary trained on earlier messages. Compressed values are stored as BLOBs
+and plain text stays TEXT, so a column can hold both and decoding is
+transparent.
+"""
+
+import re
+import struct
+import threading
+import zlib
+from collections import Counter
+from typing import Callable, Dict, Iterable, Optional, Tuple, Union
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional, zlib is always available
+    zstandard = None
+
+
+ALGORITHMS = ('zlib', 'zstd')
+
+# First byte of every compressed BLOB
+TAG_ZLIB = 1
+TAG_ZLIB_DICT = 2
+TAG_ZSTD = 3
+TAG_ZSTD_DICT = 4
+
+DICT_ID = struct.Struct('<I')
+
+# Shorter texts don't compress even with a dictionary
+MIN_COMPRESS_BYTES = 16
+
+
+class ContentCodec:
+    """Encodes message text as TEXT or compressed BLOB and decodes either back to text"""
+
+    def __init__(self, algorithm: Optional[str] = 'zlib', threshold: int = 512, level: Optional[int] = None,
+                 dictionary_loader: Optional[Callable[[int], Optional[Tuple[str, bytes]]]] = None):
+        """
+        Args:
+            algorithm: 'zlib', 'zstd' or None to write plain text (decoding still works)
+            threshold: Texts of at least this many UTF-8 bytes are compressed without
+                a dictionary; shorter ones only when a dictionary is active
+            level: Compression level, defaults to 6 for zlib and 3 for zstd
+            dictionary_loader: Returns (algorithm, data) of a dictionary ID this codec
+                hasn't seen, e.g. one trained by another process
+        """
+        if algorithm is not None and algorithm not in ALGORITHMS:
+            raise ValueError(f"Invalid compression algorithm: {algorithm}. Must be one of {ALGORITHMS}")
+        if algorithm == 'zstd':
+            _require_zstandard()
+
+        self.algorithm = algorithm
+        self.threshold = threshold
+        self.level = level if level is not None else (3 if algorithm == 'zstd' else 6)
+        self.dictionaries: Dict[int, Tuple[str, bytes]] = {}
+        self.active_dictionary: Optional[int] = None
+        self.dictionary_loader = dictionary_loader
+        self._zstd_compressors = {}
+        self._local = threading.local()
+
+    def load_dictionary(self, dict_id: int, algorithm: str, data: bytes, active: bool = False):
+        """Register a stored dictionary for decoding, and for encoding when active"""
+        self.dictionaries[dict_id] = (algorithm, bytes(data))
+        if active and algorithm == self.algorithm:
+            self.active_dictionary = dict_id
+
+    def encode(self, text: str) -> Union[str, bytes]:
+        """Return the value to store: the text itself, or a compressed BLOB when that is smaller"""
+        if self.algorithm is None:
+            return text
+        raw = text.encode('utf-8')
+        if len(raw) < MIN_COMPRESS_BYTES:
+            return text
+
+        if len(raw) >= self.threshold:
+            encoded = self._compress(raw, None)
+        elif self.active_dictionary is not None:
+            encoded = self._compress(raw, self.active_dictionary)
+        else:
+            return text
+        return encoded if len(encoded) < len(raw) else text
+
+    def decode(self, value: Union[str, bytes, None]) -> Optional[str]:
+        """Return the text of a stored value, plain or compressed"""
+        if value is None or isinstance(value, str):
+            return value
+
+        tag = value[0]
+        if tag == TAG_ZLIB:
+            return zlib.decompress(value[1:], -15).decode('utf-8')
+        if tag == TAG_ZSTD:
+            return self._zstd_decompressor(None).decompress(value[1:]).decode('utf-8')
+
+        dict_id = DICT_ID.unpack_from(value, 1)[0]
+        if dict_id not in self.dictionaries:
+            loaded = self.dictionary_loader(dict_id) if self.dictionary_loader else None
+            if loaded is None:
+                raise ValueError(f"Message compressed with unknown dictionary {dict_id}")
+            self.load_dictionary(dict_id, *loaded)
+        payload = value[1 + DICT_ID.size:]
+        if tag == TAG_ZLIB_DICT:
+            decompressor = zlib.decompressobj(-15, zdict=self.dictionaries[dict_id][1])
+            return (decompressor.decompress(payload) + decompressor.flush()).decode('utf-8')
+        if tag == TAG_ZSTD_DICT:
+            return self._zstd_decompressor(dict_id).decompress(payload).decode('utf-8')
+        raise ValueError(f"Unknown compressed content tag {tag}")
+
+    def _compress(self, raw: bytes, dict_id: Optional[int]) -> bytes:
+        """Compress with the configured algorithm, optionally against a dictionary"""
+        if self.algorithm == 'zlib':
+            if dict_id is None:
+                compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15)
+                return bytes([TAG_ZLIB]) + compressor.compress(raw) + compressor.flush()
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15,
+                                          zdict=self.dictionaries[dict_id][1])
+            return bytes([TAG_ZLIB_DICT]) + DICT_ID.pack(dict_id) + compressor.compress(raw) + compressor.flush()
+
+        compressor = self._zstd_compressors.get(dict_id)
+        if compressor is None:
+            dict_data = None
+            if dict_id is not None:
+                dict_data = zstandard.ZstdCompressionDict(self.dictionaries[dict_id][1])
+            # Writes are serialized by the database write lock, so one compressor per dictionary is safe
+            compressor = self._zstd_compressors[dict_id] = zstandard.ZstdCompressor(
+                level=self.level, dict_data=dict_data, write_checksum=False
+            )
+        if dict_id is None:
+            return bytes([TAG_ZSTD]) + compressor.compress(raw)
+        return bytes([TAG_ZSTD_DICT]) + DICT_ID.pack(dict_id) + compressor.compress(raw)
+
+    def _zstd_decompressor(self, dict_id: Optional[int]):
+        """Return this thread's zstd decompressor for a dictionary (zstandard objects aren't thread-safe)"""
+        _require_zstandard()
+        decompressors = getattr(self._local, 'zstd', None)
+        if decompressors is None:
+            decompressors = self._local.zstd = {}
+        decompressor = decompressors.get(dict_id)
+        if decompressor is None:
+            dict_data = None
+            if dict_id is not None:
+                dict_data = zstandard.ZstdCompressionDict(self.dictionaries[dict_id][1])
+            decompressor = decompressors[dict_id] = zstandard.ZstdDecompressor(dict_data=dict_data)
+        return decompressor
+
+
+def train_dictionary(samples: Iterable[str], algorithm: str = 'zlib', size: int = 16384) -> bytes:
+    """
+    Build a compression dictionary from sample messages
+
+    zstd uses its own trainer. For zlib the dictionary is the most valuable
+    recurring phrases (frequency x length), least valuable first, since deflate
+    reaches the end of its preset dictionary with the shortest distances.
+    Returns an empty dictionary when the samples have nothing in common.
+    """
+    samples = [s for s in samples if s]
+    if algorithm == 'zstd':
+        _require_zstandard()
+        try:
+            return zstandard.train_dictionary(size, [s.encode('utf-8') for s in samples]).as_bytes()
+        except zstandard.ZstdError:
+            # Too few samples to learn from
+            return b''
+    if algorithm != 'zlib':
+        raise ValueError(f"Invalid compression algorithm: {algorithm}. Must be one of {ALGORITHMS}")
+
+    phrases = Counter()
+    for sample in samples:
+        words = re.findall(r'\S+\s*', sample)
+        for n in (1, 2, 3, 4):
+            for i in range(len(words) - n + 1):
+                phrases[''.join(words[i:i + n])] += 1
+
+    chosen, total = [], 0
+    for phrase, count in sorted(phrases.items(), key=lambda item: item[1] * len(item[0]), reverse=True):
+        if count < 2:
+            continue
+        encoded = phrase.encode('utf-8')
+        if total + len(encoded) > size:
+            continue
+        chosen.append(encoded)
+        total += len(encoded)
+    return b''.join(reversed(chosen))
+
+
+def _require_zstandard():
+    if zstandard is None:
+        raise ImportError("zstd compression requires the zstandard package: pip install zstandard")
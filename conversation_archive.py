@@ -0,0 +1,152 @@
+"""
+Conversation Archive Module
+Streaming export and import of the whole chat history for backups and analytics.
+Archives hold one row per message (conversation fields repeated on every row),
+as JSON Lines (optionally gzip-compressed) or Parquet when pyarrow is installed.
+Both directions run in constant memory: the export walks a single ordered join,
+and the import feeds rows to ChatDatabase.import_conversations as they are read.
+
+Usage:
+    python3 cli.py export-all backup.jsonl.gz
+    python3 cli.py export-all analytics.parquet
+    python3 cli.py import backup.jsonl.gz --db restored.db
+"""
+
+import gzip
+import itertools
+import json
+from typing import Any, Dict, Iterable, Iterator
+
+from chat_database import ChatDatabase
+
+
+# Column order of every archive row
+FIELDS = ('session_id', 'title', 'created_at', 'updated_at', 'conversation_metadata',
+          'message_id', 'role', 'content', 'timestamp', 'metadata')
+
+# Metadata columns hold JSON text in the database and in Parquet, objects in JSON Lines
+JSON_FIELDS = ('conversation_metadata', 'metadata')
+
+
+def _is_parquet(path: str) -> bool:
+    return path.endswith('.parquet')
+
+
+def _open_text(path: str, mode: str):
+    """Open a JSON Lines file, gzip-compressed when the name ends in .gz"""
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as exc:
+        raise ImportError("Parquet archives require pyarrow: pip install pyarrow") from exc
+    return pyarrow, pyarrow.parquet
+
+
+def export_jsonl(db: ChatDatabase, path: str, batch_size: int = 1000) -> int:
+    """Write every message as one JSON object per line, return the number of rows"""
+    count = 0
+    with _open_text(path, 'w') as f:
+        for row in db.iter_export_rows(batch_size):
+            for field in JSON_FIELDS:
+                if row[field] is not None:
+                    row[field] = json.loads(row[field])
+            f.write(json.dumps(row, ensure_ascii=False))
+            f.write('\n')
+            count += 1
+    return count
+
+
+def export_parquet(db: ChatDatabase, path: str, batch_size: int = 10000) -> int:
+    """Write every message to a Parquet file one row group per batch, return the number of rows"""
+    pa, pq = _require_pyarrow()
+    schema = pa.schema([(field, pa.int64() if field == 'message_id' else pa.string()) for field in FIELDS])
+
+    count = 0
+    with pq.ParquetWriter(path, schema, compression='zstd') as writer:
+        rows = db.iter_export_rows(batch_size)
+        while True:
+            batch = list(itertools.islice(rows, batch_size))
+            if not batch:
+                break
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            count += len(batch)
+    return count
+
+
+def read_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield archive rows from a JSON Lines file"""
+    with _open_text(path, 'r') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def read_parquet(path: str, batch_size: int = 10000) -> Iterator[Dict[str, Any]]:
+    """Yield archive rows from a Parquet file, one record batch in memory at a time"""
+    _, pq = _require_pyarrow()
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+        for row in batch.to_pylist():
+            for field in JSON_FIELDS:
+                if row.get(field) is not None:
+                    row[field] = json.loads(row[field])
+            yield row
+
+
+def group_conversations(rows: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """
+    Turn consecutive rows of the same session into import_conversations input
+
+    The 'messages' of each conversation is a lazy generator, so a session is never
+    materialized; it must be consumed before the next conversation is requested.
+    """
+    for session_id, session_rows in itertools.groupby(rows, key=lambda row: row['session_id']):
+        first = next(session_rows)
+
+        def messages(first=first, rest=session_rows):
+            for row in itertools.chain([first], rest):
+                if row.get('role') is None:  # conversation exported without messages
+                    continue
+                yield {
+                    'role': row['role'],
+                    'content': row['content'],
+                    'metadata': row.get('metadata'),
+                    'timestamp': row.get('timestamp')
+                }
+
+        yield {
+            'session_id': session_id,
+            'title': first.get('title'),
+            'metadata': first.get('conversation_metadata'),
+            'created_at': first.get('created_at'),
+            'updated_at': first.get('updated_at'),
+            'messages': messages()
+        }
+
+
+def export_archive(db: ChatDatabase, path: str, batch_size: int = 1000) -> int:
+    """Export the whole database, as Parquet for .parquet paths and JSON Lines otherwise"""
+    if _is_parquet(path):
+        return export_parquet(db, path, max(batch_size, 1000))
+    return export_jsonl(db, path, batch_size)
+
+
+def import_archive(db: ChatDatabase, path: str, batch_size: int = 1000) -> Dict:
+    """
+    Import an archive written by export_archive
+
+    Messages are appended to sessions that already exist, so import into an
+    empty database to restore a backup. Conversation and message timestamps
+    are preserved.
+
+    Returns:
+        Ingest statistics from import_conversations
+    """
+    rows = read_parquet(path) if _is_parquet(path) else read_jsonl(path)
+    return db.import_conversations(group_conversations(rows), batch_size=batch_size)
+
@@ -0,0 +1,257 @@
+"""
+Database Metrics Module
+Timing histograms, row counters and a slow-query log for ChatDatabase.
+Instrumentation is opt-in: pass a DatabaseMetrics to ChatDatabase and the public
+methods in INSTRUMENTED_METHODS are wrapped on that instance only. Without it the
+class methods are called directly, so disabled instrumentation costs nothing.
+
+Usage:
+    metrics = DatabaseMetrics(slow_query_ms=50)
+    db = ChatDatabase('chat_history.db', metrics=metrics)
+    ...
+    print(metrics.to_prometheus())
+"""
+
+import bisect
+import functools
+import json
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+
+# Public ChatDatabase methods that are timed when metrics are enabled
+INSTRUMENTED_METHODS = (
+    'create_conversation', 'get_or_create_conversation_with_history', 'add_message',
+    'add_messages', 'add_message_groups', 'add_messages_bulk', 'import_conversations',
+    'get_conversation_messages', 'get_messages_since', 'get_messages_page', 'get_messages_by_ids', 'get_recent_conversations',
+    'delete_conversation', 'search_messages', 'export_conversation'
+)
+
+# Upper bounds in seconds of the latency histogram buckets, the last bucket is unbounded
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+           0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Statements worth an EXPLAIN QUERY PLAN in the slow-query log
+_EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE')
+
+
+def count_rows(result: Any) -> int:
+    """Number of rows a ChatDatabase method returned or wrote"""
+    if result is None:
+        return 0
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, tuple):
+        if result and isinstance(result[0], list):  # get_messages_page: (rows, next_cursor)
+            return len(result[0])
+        if len(result) == 2 and isinstance(result[1], list):  # (conversation_id, history rows)
+            return len(result[1])
+        return 1
+    if isinstance(result, dict):
+        if 'messages' in result:  # export_conversation and ingest statistics
+            messages = result['messages']
+            return len(messages) if isinstance(messages, list) else messages
+        return 1
+    return 1
+
+
+class _MethodStats:
+    """Latency histogram and counters of one method"""
+
+    __slots__ = ('buckets', 'calls', 'errors', 'rows', 'seconds', 'max_seconds')
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+
+    def quantile(self, q: float) -> float:
+        """Estimate a latency quantile in seconds by interpolating inside its bucket"""
+        if not self.calls:
+            return 0.0
+        rank = q * self.calls
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            if count and seen + count >= rank:
+                lower = BUCKETS[i - 1] if i > 0 else 0.0
+                upper = BUCKETS[i] if i < len(BUCKETS) else self.max_seconds
+                return min(lower + (upper - lower) * (rank - seen) / count, self.max_seconds)
+            seen += count
+        return self.max_seconds
+
+
+class DatabaseMetrics:
+    """Per-method latency histograms, row counters and an optional slow-query log"""
+
+    def __init__(self, slow_query_ms: Optional[float] = None, slow_log_size: int = 100):
+        """
+        Args:
+            slow_query_ms: Calls taking at least this long are added to the slow-query
+                log with the statements they ran and their EXPLAIN QUERY PLAN output.
+                None disables the log and the statement tracing it needs
+            slow_log_size: Number of most recent slow calls to keep
+        """
+        self.slow_query_seconds = slow_query_ms / 1000 if slow_query_ms is not None else None
+        self.slow_queries: deque = deque(maxlen=slow_log_size)
+        self.slow_query_count = 0
+        self._methods: Dict[str, _MethodStats] = {}
+        self._lock = threading.Lock()
+        # Nesting depth of instrumented calls on the current thread, and the
+        # statements run by its outermost call
+        self._local = threading.local()
+
+    def instrument(self, db) -> None:
+        """
+        Wrap the instrumented methods of one ChatDatabase instance
+
+        Only the outermost call is recorded: add_message runs add_messages, which
+        runs add_message_groups, and counting each level would inflate the call
+        counts and report the same time three times.
+        """
+        for name in INSTRUMENTED_METHODS:
+            setattr(db, name, self._timed(name, getattr(db, name), db))
+
+    def trace(self, statement: str):
+        """sqlite3 trace callback, records statements while an instrumented call runs"""
+        statements = getattr(self._local, 'statements', None)
+        if statements is not None and (not statements or statements[-1] != statement):
+            statements.append(statement)
+
+    def _timed(self, name: str, method: Callable, db) -> Callable:
+        """Return a wrapper that records the latency and rows of each call"""
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            if getattr(self._local, 'depth', 0):
+                # Part of an instrumented call that is already being timed
+                return method(*args, **kwargs)
+            tracing = self.slow_query_seconds is not None
+            if tracing:
+                self._local.statements = []
+            self._local.depth = 1
+            start = time.perf_counter()
+            try:
+                result = method(*args, **kwargs)
+            except Exception:
+                self.record(name, time.perf_counter() - start, error=True)
+                raise
+            finally:
+                self._local.depth = 0
+                if tracing:
+                    statements, self._local.statements = self._local.statements, None
+            elapsed = time.perf_counter() - start
+            self.record(name, elapsed, count_rows(result))
+            if tracing and elapsed >= self.slow_query_seconds:
+                self._log_slow_call(db, name, elapsed, statements)
+            return result
+        return wrapper
+
+    def record(self, method: str, seconds: float, rows: int = 0, error: bool = False):
+        """Add one call to a method's histogram and counters"""
+        with self._lock:
+            stats = self._methods.get(method)
+            if stats is None:
+                stats = self._methods[method] = _MethodStats()
+            stats.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+            stats.calls += 1
+            stats.seconds += seconds
+            stats.rows += rows
+            if error:
+                stats.errors += 1
+            if seconds > stats.max_seconds:
+                stats.max_seconds = seconds
+
+    def _log_slow_call(self, db, method: str, seconds: float, statements: List[str]):
+        """Add a slow call to the log with the query plan of each statement it ran"""
+        conn = db._read_cursor().connection
+        explained = []
+        for sql in statements:
+            if not sql.lstrip().upper().startswith(_EXPLAINABLE):
+                continue
+            try:
+                plan = [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql)]
+            except Exception as exc:  # e.g. the statement dropped what it referenced
+                plan = [f'EXPLAIN failed: {exc}']
+            explained.append({'sql': sql, 'plan': plan})
+
+        with self._lock:
+            self.slow_query_count += 1
+            self.slow_queries.append({
+                'method': method,
+                'ms': seconds * 1000,
+                'time': time.time(),
+                'statements': explained
+            })
+
+    def reset(self):
+        """Forget all recorded calls and slow queries"""
+        with self._lock:
+            self._methods.clear()
+            self.slow_queries.clear()
+            self.slow_query_count = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Snapshot of everything recorded so far
+
+        Returns:
+            {'methods': {name: {'calls', 'errors', 'rows', 'total_ms', 'mean_ms',
+            'p50_ms', 'p95_ms', 'p99_ms', 'max_ms'}}, 'slow_query_count': int,
+            'slow_queries': [{'method', 'ms', 'time', 'statements': [{'sql', 'plan'}]}]}
+        """
+        with self._lock:
+            methods = {
+                name: {
+                    'calls': s.calls,
+                    'errors': s.errors,
+                    'rows': s.rows,
+                    'total_ms': s.seconds * 1000,
+                    'mean_ms': s.seconds * 1000 / s.calls if s.calls else 0.0,
+                    'p50_ms': s.quantile(0.50) * 1000,
+                    'p95_ms': s.quantile(0.95) * 1000,
+                    'p99_ms': s.quantile(0.99) * 1000,
+                    'max_ms': s.max_seconds * 1000
+                }
+                for name, s in sorted(self._methods.items())
+            }
+            return {
+                'methods': methods,
+                'slow_query_count': self.slow_query_count,
+                'slow_queries': list(self.slow_queries)
+            }
+
+    def to_json(self, indent: Optional[int] = 2) -> str:
+        """stats() as JSON"""
+        return json.dumps(self.stats(), indent=indent)
+
+    def to_prometheus(self, prefix: str = 'chat_db') -> str:
+        """Render the histograms and counters in the Prometheus text exposition format"""
+        lines = [
+            f'# HELP {prefix}_method_duration_seconds Latency of ChatDatabase methods',
+            f'# TYPE {prefix}_method_duration_seconds histogram'
+        ]
+        with self._lock:
+            methods = sorted(self._methods.items())
+            for name, s in methods:
+                cumulative = 0
+                for bound, count in zip(BUCKETS + (float('inf'),), s.buckets):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{prefix}_method_duration_seconds_bucket{{method="{name}",le="{le}"}} {cumulative}')
+                lines.append(f'{prefix}_method_duration_seconds_sum{{method="{name}"}} {s.seconds!r}')
+                lines.append(f'{prefix}_method_duration_seconds_count{{method="{name}"}} {s.calls}')
+
+            for metric, attr, help_text in (('rows_total', 'rows', 'Rows returned or written'),
+                                            ('errors_total', 'errors', 'Calls that raised')):
+                lines.append(f'# HELP {prefix}_method_{metric} {help_text} by ChatDatabase methods')
+                lines.append(f'# TYPE {prefix}_method_{metric} counter')
+                lines.extend(f'{prefix}_method_{metric}{{method="{name}"}} {getattr(s, attr)}' for name, s in methods)
+
+            lines.append(f'# HELP {prefix}_slow_queries_total Calls slower than the slow-query threshold')
+            lines.append(f'# TYPE {prefix}_slow_queries_total counter')
+            lines.append(f'{prefix}_slow_queries_total {self.slow_query_count}')
+        return '\n'.join(lines) + '\n'
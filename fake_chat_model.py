@@ -0,0 +1,98 @@
+"""
+Fake Chat Model Module
+Deterministic offline chat model with configurable latency for tests and benchmarks
+"""
+
+import asyncio
+import hashlib
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+class FakeRateLimitError(Exception):
+    """Raised by FakeChatModel for its first fail_calls calls, looks like an HTTP 429"""
+
+    status_code = 429
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model that derives its reply from a hash of the prompt, no network needed"""
+
+    model_name: str = 'fake-chat'
+    latency: float = 0.0
+    """Seconds each call sleeps before answering"""
+    reply_words: int = 40
+    """Number of words in each reply"""
+    token_latency: float = 0.0
+    """Seconds between streamed words, after the initial latency"""
+    calls: int = 0
+    """Number of times the model was actually called (cache hits don't count)"""
+    fail_calls: int = 0
+    """Number of initial calls that raise FakeRateLimitError instead of answering"""
+    latency_script: List[float] = []
+    """Latency of each initial call in order, later calls use latency"""
+
+    @property
+    def _llm_type(self) -> str:
+        return 'fake-chat'
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {'model_name': self.model_name, 'reply_words': self.reply_words}
+
+    def _reply(self, messages: List[BaseMessage]) -> str:
+        """Build a deterministic reply so the same prompt always gets the same answer"""
+        prompt = '\n'.join(str(message.content) for message in messages)
+        digest = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        words = [digest[i % len(digest):][:6] for i in range(0, self.reply_words * 3, 3)]
+        return ' '.join(words)
+
+    def _start_call(self) -> float:
+        """Count the call, fail it while scripted failures remain, return its latency"""
+        self.calls += 1
+        call = self.calls
+        if call <= self.fail_calls:
+            raise FakeRateLimitError(f'Rate limit exceeded (fake call {call})')
+        return self.latency_script[call - 1] if call <= len(self.latency_script) else self.latency
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        latency = self._start_call()
+        if latency:
+            time.sleep(latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._reply(messages)))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                         **kwargs: Any) -> ChatResult:
+        latency = self._start_call()
+        if latency:
+            await asyncio.sleep(latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._reply(messages)))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None,
+                **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        latency = self._start_call()
+        if latency:
+            time.sleep(latency)
+        for i, word in enumerate(self._reply(messages).split(' ')):
+            if i and self.token_latency:
+                time.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else ' ' + word))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        latency = self._start_call()
+        if latency:
+            await asyncio.sleep(latency)
+        for i, word in enumerate(self._reply(messages).split(' ')):
+            if i and self.token_latency:
+                await asyncio.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else ' ' + word))
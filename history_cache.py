@@ -0,0 +1,159 @@
+"""
+Chat History Cache Module
+In-memory LRU cache of formatted conversation history, bounded by total content bytes
+
+One cache may be shared by several databases, entries are keyed by the database
+path as well as the session because conversation and message IDs are per database.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+class _CacheEntry:
+    """Formatted messages of one session plus the bookkeeping needed to extend them"""
+
+    __slots__ = ('db_path', 'conversation_id', 'messages', 'last_id', 'size')
+
+    def __init__(self, db_path: str, conversation_id: int):
+        self.db_path = db_path
+        self.conversation_id = conversation_id
+        self.messages: List[Any] = []
+        self.last_id = 0
+        self.size = 0
+
+
+class HistoryCache:
+    """Write-through LRU cache of formatted messages per session"""
+
+    def __init__(self, formatter: Callable[[str, str], Any], max_bytes: int = 32 * 1024 * 1024):
+        """
+        Args:
+            formatter: Converts a (role, content) pair into the cached message object,
+                e.g. a LangChain HumanMessage/AIMessage
+            max_bytes: Upper bound on the total UTF-8 size of cached message content
+        """
+        self.formatter = formatter
+        self.max_bytes = max_bytes
+        self._entries: 'OrderedDict[Tuple[str, str], _CacheEntry]' = OrderedDict()
+        self._sessions_by_conversation: Dict[Tuple[str, int], Tuple[str, str]] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def last_id(self, db_path: str, session_id: str) -> Optional[int]:
+        """Return the ID of the newest cached message for a session, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get((db_path, session_id))
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end((db_path, session_id))
+            return entry.last_id
+
+    def conversation_id(self, db_path: str, session_id: str) -> Optional[int]:
+        """Return the conversation ID a session's cached history belongs to, None if not cached"""
+        with self._lock:
+            entry = self._entries.get((db_path, session_id))
+            return entry.conversation_id if entry is not None else None
+
+    def extend(self, db_path: str, session_id: str, conversation_id: int,
+               rows: Iterable[Tuple[int, str, str]]) -> List[Any]:
+        """
+        Add database rows to a session's cached history and return the full history
+
+        Args:
+            db_path: Database the rows were read from
+            session_id: Session the rows belong to
+            conversation_id: Database ID of the session's conversation; a cached copy
+                of another conversation (the session was deleted and recreated) is
+                dropped, so rows must then be the whole history
+            rows: (message_id, role, content) tuples ordered by message ID; rows
+                already in the cache are skipped
+        """
+        key = (db_path, session_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.conversation_id != conversation_id:
+                self._drop(self._entries.pop(key))
+                entry = None
+            if entry is None:
+                entry = _CacheEntry(db_path, conversation_id)
+                self._entries[key] = entry
+                self._sessions_by_conversation[(db_path, conversation_id)] = key
+            self._entries.move_to_end(key)
+
+            for message_id, role, content in rows:
+                self._append(entry, message_id, role, content)
+
+            messages = list(entry.messages)
+            self._evict()
+            return messages
+
+    def on_message_added(self, db_path: str, conversation_id: int, message_id: int, role: str, content: str):
+        """Write-through hook called by ChatDatabase after a message is committed"""
+        with self._lock:
+            key = self._sessions_by_conversation.get((db_path, conversation_id))
+            if key is None:
+                return
+            self._append(self._entries[key], message_id, role, content)
+            self._evict()
+
+    def invalidate(self, db_path: str, session_id: str):
+        """Drop a session from the cache"""
+        with self._lock:
+            entry = self._entries.pop((db_path, session_id), None)
+            if entry is not None:
+                self._drop(entry)
+
+    def invalidate_conversation(self, db_path: str, conversation_id: int):
+        """Drop a session from the cache by its conversation ID"""
+        with self._lock:
+            key = self._sessions_by_conversation.get((db_path, conversation_id))
+            if key is not None:
+                self._drop(self._entries.pop(key))
+
+    def clear(self):
+        """Drop every cached session, keeping the counters"""
+        with self._lock:
+            self._entries.clear()
+            self._sessions_by_conversation.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss/eviction counters and current size"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'sessions': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes
+            }
+
+    def _append(self, entry: _CacheEntry, message_id: int, role: str, content: str):
+        """Append one message unless the entry already holds it"""
+        if message_id <= entry.last_id:
+            return
+        size = len(content.encode('utf-8'))
+        entry.messages.append(self.formatter(role, content))
+        entry.last_id = message_id
+        entry.size += size
+        self._bytes += size
+
+    def _drop(self, entry: _CacheEntry):
+        """Forget an entry that was already removed from the LRU order"""
+        self._sessions_by_conversation.pop((entry.db_path, entry.conversation_id), None)
+        self._bytes -= entry.size
+
+    def _evict(self):
+        """Evict least recently used sessions until the cache fits in max_bytes"""
+        while self._bytes > self.max_bytes and self._entries:
+            _, entry = self._entries.popitem(last=False)
+            self._drop(entry)
+            self.evictions += 1
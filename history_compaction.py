@@ -0,0 +1,110 @@
+"""
+History Compaction Module
+Keeps the chat history sent to the model within a token budget
+"""
+
+from typing import Any, Callable, List, Optional
+
+
+# Rough per-message cost of role markers and separators in chat prompts
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def count_tokens(text: str) -> int:
+    """
+    Estimate the number of tokens in a text
+
+    Uses the common ~4 characters per token rule for English, which is accurate
+    enough for budgeting and costs nothing compared to running a tokenizer.
+    """
+    return (len(text) + 3) // 4
+
+
+def message_tokens(message: Any) -> int:
+    """Estimate the prompt tokens taken by one chat message"""
+    return count_tokens(message.content) + MESSAGE_OVERHEAD_TOKENS
+
+
+def _tail_start(messages: List[Any], budget: int, floor: int = 0) -> int:
+    """Return the index where the newest messages that fit in budget begin"""
+    used = 0
+    start = len(messages)
+    while start > floor:
+        cost = message_tokens(messages[start - 1])
+        if used + cost > budget:
+            break
+        used += cost
+        start -= 1
+    return start
+
+
+class LastNTokensPolicy:
+    """Keep only the newest messages that fit in the token budget"""
+
+    def __init__(self, max_tokens: int = 8000):
+        self.max_tokens = max_tokens
+
+    def compact(self, messages: List[Any], db=None, conversation_id: Optional[int] = None) -> List[Any]:
+        """Return the newest messages whose total size fits in max_tokens"""
+        return messages[_tail_start(messages, self.max_tokens):]
+
+
+class HeadTailPolicy:
+    """Keep the opening messages for context plus the newest messages that fit"""
+
+    def __init__(self, max_tokens: int = 8000, head_messages: int = 2):
+        self.max_tokens = max_tokens
+        self.head_messages = head_messages
+
+    def compact(self, messages: List[Any], db=None, conversation_id: Optional[int] = None) -> List[Any]:
+        """Return the first head_messages messages followed by as much of the tail as fits"""
+        head = messages[:self.head_messages]
+        budget = self.max_tokens - sum(message_tokens(m) for m in head)
+        if budget <= 0:
+            return head
+        return head + messages[_tail_start(messages, budget, floor=len(head)):]
+
+
+class RollingSummaryPolicy:
+    """Replace older messages with a running summary stored in the database"""
+
+    def __init__(self, summarizer: Callable[[Optional[str], List[Any]], str],
+                 formatter: Callable[[str, str], Any], max_tokens: int = 8000,
+                 summary_tokens: int = 1000):
+        """
+        Args:
+            summarizer: Called with (previous_summary, messages) and returns a new
+                summary covering both
+            formatter: Converts (role, content) into a chat message, used to insert
+                the summary as a system message
+            max_tokens: Budget for the summary plus the verbatim tail
+            summary_tokens: Part of the budget reserved for the summary
+        """
+        self.summarizer = summarizer
+        self.formatter = formatter
+        self.max_tokens = max_tokens
+        self.summary_tokens = summary_tokens
+
+    def compact(self, messages: List[Any], db=None, conversation_id: Optional[int] = None) -> List[Any]:
+        """Return the stored summary followed by the newest messages"""
+        tail_budget = self.max_tokens - self.summary_tokens
+        summary, covered = None, 0
+        if db is not None and conversation_id is not None:
+            stored = db.get_summary(conversation_id)
+            if stored is not None:
+                summary, covered = stored
+                covered = min(covered, len(messages))
+
+        # Only call the summarizer once unsummarized messages overflow the tail budget
+        if _tail_start(messages, tail_budget, floor=covered) > covered:
+            # Fold down to half the tail budget so the next summary is many turns away
+            fold_to = _tail_start(messages, tail_budget // 2, floor=covered)
+            summary = self.summarizer(summary, messages[covered:fold_to])
+            covered = fold_to
+            if db is not None and conversation_id is not None:
+                db.save_summary(conversation_id, summary, covered)
+
+        compacted = messages[covered:]
+        if summary:
+            compacted = [self.formatter('system', f'Summary of the earlier conversation: {summary}')] + compacted
+        return compacted
@@ -0,0 +1,537 @@
+"""
+LLM Scheduler Module
+Shared admission control in front of chat model calls. Requests wait in priority
+lanes (interactive chat ahead of batch summarization) and are released only when
+the requests-per-minute and tokens-per-minute buckets allow it. Identical prompts
+already in flight share one call, and rate-limit or transient errors are retried
+with jittered exponential backoff.
+
+Usage:
+    scheduler = LLMScheduler(requests_per_minute=500, tokens_per_minute=200000)
+    model = ScheduledChatModel(model=ChatOpenAI(model='gpt-4o'), scheduler=scheduler)
+    batch_model = model.with_lane(BATCH)
+"""
+
+import asyncio
+import hashlib
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Sequence
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.load import dumps
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from history_compaction import message_tokens
+
+
+# Priority lanes, earlier lanes are always served first
+INTERACTIVE = 'interactive'
+BATCH = 'batch'
+
+# HTTP statuses worth retrying: timeouts, conflicts, rate limits and server errors
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+# Reply tokens reserved when the model has no max_tokens setting
+DEFAULT_COMPLETION_TOKENS = 500
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """True for rate limits, timeouts, connection failures and 5xx responses"""
+    status = getattr(exc, 'status_code', None)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return (isinstance(exc, (TimeoutError, ConnectionError))
+            or type(exc).__name__ in ('APIConnectionError', 'APITimeoutError', 'RateLimitError'))
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """Seconds the provider asked us to wait, from a retry_after attribute or Retry-After header"""
+    value = getattr(exc, 'retry_after', None)
+    if value is None:
+        headers = getattr(getattr(exc, 'response', None), 'headers', None)
+        value = headers.get('retry-after') if headers is not None else None
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Continuously refilled budget; not thread-safe, the scheduler lock guards it"""
+
+    def __init__(self, rate_per_minute: float, capacity: float):
+        self.rate = rate_per_minute / 60
+        self.capacity = capacity
+        self.level = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float, now: float) -> float:
+        """Seconds until amount is available, 0 if it is available now"""
+        self._refill(now)
+        # A request larger than the bucket would wait forever, let it drain the bucket instead
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float, now: float):
+        self._refill(now)
+        self.level -= min(amount, self.capacity)
+
+    def adjust(self, amount: float):
+        """Charge (positive) or refund (negative) tokens after the real usage is known"""
+        self.level = min(self.capacity, self.level - amount)
+
+
+class _Job:
+    """One queued call, or with fn None a slot reservation for a stream"""
+
+    __slots__ = ('fn', 'lane', 'tokens', 'key', 'future', 'attempt', 'waiters')
+
+    def __init__(self, fn: Optional[Callable[[], Any]], lane: str, tokens: int, key: Optional[str]):
+        self.fn = fn
+        self.lane = lane
+        self.tokens = tokens
+        self.key = key
+        self.future: Future = Future()
+        self.attempt = 0
+        # Callers still waiting for the result, see LLMScheduler._waiter
+        self.waiters = 0
+
+
+class LLMScheduler:
+    """Rate-limited, prioritized, coalescing executor for model calls"""
+
+    def __init__(self, requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None, max_concurrency: int = 8,
+                 lanes: Sequence[str] = (INTERACTIVE, BATCH),
+                 lane_limits: Optional[Dict[str, int]] = None, max_retries: int = 3,
+                 base_delay: float = 1.0, max_delay: float = 60.0, burst_seconds: float = 10.0,
+                 retryable: Callable[[BaseException], bool] = is_retryable):
+        """
+        Args:
+            requests_per_minute: Request budget, None for no limit
+            tokens_per_minute: Prompt plus reply token budget, None for no limit
+            max_concurrency: Calls in flight at once across all lanes
+            lanes: Lane names in priority order
+            lane_limits: Maximum calls in flight per lane. By default batch work may use
+                all but two slots, so interactive requests never wait for a batch to drain
+            max_retries: Retries after the first attempt for retryable errors
+            base_delay: Backoff before the first retry in seconds, doubled on each retry
+            max_delay: Upper bound on a single backoff
+            burst_seconds: Bucket capacity in seconds of budget, how much may be spent at once
+            retryable: Decides whether an exception is worth retrying
+        """
+        self.lanes = tuple(lanes)
+        self.max_concurrency = max_concurrency
+        if lane_limits is None:
+            lane_limits = {BATCH: max(1, max_concurrency - 2)} if BATCH in self.lanes else {}
+        self.lane_limits = lane_limits
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retryable = retryable
+
+        self._buckets: List[TokenBucket] = []
+        self._request_bucket = self._token_bucket = None
+        if requests_per_minute:
+            self._request_bucket = TokenBucket(requests_per_minute, max(1.0, requests_per_minute * burst_seconds / 60))
+            self._buckets.append(self._request_bucket)
+        if tokens_per_minute:
+            self._token_bucket = TokenBucket(tokens_per_minute, max(1.0, tokens_per_minute * burst_seconds / 60))
+            self._buckets.append(self._token_bucket)
+
+        self._queues: Dict[str, deque] = {lane: deque() for lane in self.lanes}
+        self._delayed: List = []  # (ready_at, seq, job) heap of calls waiting to be retried
+        self._running: Dict[str, int] = {lane: 0 for lane in self.lanes}
+        self._total_running = 0
+        self._inflight: Dict[str, _Job] = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+        self.counters = {'submitted': 0, 'coalesced': 0, 'retries': 0, 'completed': 0, 'failed': 0}
+
+        self._executor = ThreadPoolExecutor(max_concurrency, thread_name_prefix='llm-scheduler')
+        self._dispatcher = threading.Thread(target=self._dispatch, name='llm-scheduler-dispatch', daemon=True)
+        self._dispatcher.start()
+
+    def submit(self, fn: Callable[[], Any], lane: str = INTERACTIVE, tokens: int = 0,
+               key: Optional[str] = None) -> Future:
+        """
+        Queue a call and return a Future for its result
+
+        Each caller gets its own Future. Cancelling it withdraws only that caller,
+        the call itself is cancelled once no caller is waiting for it.
+
+        Args:
+            fn: The model call, run on a scheduler thread once admitted
+            lane: Priority lane
+            tokens: Estimated prompt plus reply tokens, charged to the token bucket
+            key: Calls with the same key while one is in flight share its result
+        """
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('LLMScheduler is closed')
+            inflight = self._inflight.get(key) if key is not None else None
+            # A call cancelled while queued never runs, so nothing may coalesce onto it
+            if inflight is not None and not inflight.future.cancelled():
+                self.counters['coalesced'] += 1
+                return self._waiter(inflight)
+            job = self._enqueue(fn, lane, tokens, key)
+            if key is not None:
+                self._inflight[key] = job
+            return self._waiter(job)
+
+    def run(self, fn: Callable[[], Any], **kwargs) -> Any:
+        """Submit a call and wait for its result"""
+        return self.submit(fn, **kwargs).result()
+
+    async def arun(self, fn: Callable[[], Any], **kwargs) -> Any:
+        """Submit a call and await its result without blocking the event loop"""
+        return await asyncio.wrap_future(self.submit(fn, **kwargs))
+
+    def admit(self, lane: str = INTERACTIVE, tokens: int = 0) -> Future:
+        """
+        Reserve a slot for a call the caller runs itself, e.g. a stream
+
+        The Future completes once the slot is granted; the caller must call
+        release(lane) when done. Reservations are neither retried nor coalesced.
+        """
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('LLMScheduler is closed')
+            return self._enqueue(None, lane, tokens, None).future
+
+    async def aadmit(self, lane: str = INTERACTIVE, tokens: int = 0):
+        """
+        Await a slot reserved by admit()
+
+        If the awaiting task is cancelled, e.g. by asyncio.wait_for timing out,
+        the reservation is withdrawn, or the slot and its rate budget are given
+        back when it was granted in the meantime.
+        """
+        future = self.admit(lane, tokens)
+        try:
+            await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            if not future.cancel():
+                future.add_done_callback(lambda granted: self._give_back(granted, lane, tokens))
+            raise
+
+    def release(self, lane: str):
+        """Give back a slot granted by admit()"""
+        with self._cond:
+            self._finish(lane)
+
+    def _give_back(self, future: Future, lane: str, tokens: int):
+        """Undo a reservation nobody will use, refunding what the dispatcher charged for it"""
+        if future.cancelled() or future.exception() is not None:
+            return
+        with self._cond:
+            if self._request_bucket is not None:
+                self._request_bucket.adjust(-1)
+            if self._token_bucket is not None:
+                self._token_bucket.adjust(-tokens)
+            self._finish(lane)
+
+    @contextmanager
+    def slot(self, lane: str = INTERACTIVE, tokens: int = 0):
+        """Hold a slot for the duration of the block"""
+        self.admit(lane, tokens).result()
+        try:
+            yield
+        finally:
+            self.release(lane)
+
+    def adjust_tokens(self, tokens: float):
+        """Correct the token bucket once a call reports its real usage, negative refunds"""
+        if self._token_bucket is not None and tokens:
+            with self._cond:
+                self._token_bucket.adjust(tokens)
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and in-flight calls per lane plus lifetime counters"""
+        with self._cond:
+            return {
+                'queued': {lane: len(queue) for lane, queue in self._queues.items()},
+                'running': dict(self._running),
+                'retrying': len(self._delayed),
+                **self.counters
+            }
+
+    def close(self, wait: bool = True):
+        """Stop admitting calls; queued calls fail with RuntimeError"""
+        with self._cond:
+            self._closed = True
+            pending = [job for queue in self._queues.values() for job in queue]
+            pending += [job for _, _, job in self._delayed]
+            for queue in self._queues.values():
+                queue.clear()
+            self._delayed.clear()
+            self._cond.notify_all()
+        for job in pending:
+            if not job.future.done():
+                job.future.set_exception(RuntimeError('LLMScheduler closed before the call ran'))
+        self._dispatcher.join()
+        self._executor.shutdown(wait=wait)
+
+    def _waiter(self, job: _Job) -> Future:
+        """A caller's own Future chained to a job's, called with the lock held"""
+        waiter = Future()
+        job.waiters += 1
+
+        def settle(done: Future):
+            try:
+                if done.cancelled():
+                    waiter.cancel()
+                elif done.exception() is not None:
+                    waiter.set_exception(done.exception())
+                else:
+                    waiter.set_result(done.result())
+            except InvalidStateError:
+                pass  # The caller cancelled its own Future in the meantime
+
+        def withdraw(done: Future):
+            if not done.cancelled() or job.future.done():
+                return
+            with self._cond:
+                job.waiters -= 1
+                if job.waiters == 0:
+                    # Only succeeds while queued, a running call finishes unobserved
+                    job.future.cancel()
+
+        waiter.add_done_callback(withdraw)
+        job.future.add_done_callback(settle)
+        return waiter
+
+    def _enqueue(self, fn, lane: str, tokens: int, key: Optional[str]) -> _Job:
+        """Append a new job to its lane, called with the lock held"""
+        if lane not in self._queues:
+            raise ValueError(f"Unknown lane {lane!r}, expected one of {self.lanes}")
+        job = _Job(fn, lane, tokens, key)
+        self._queues[lane].append(job)
+        self.counters['submitted'] += 1
+        self._cond.notify_all()
+        return job
+
+    def _finish(self, lane: str):
+        """Free a slot, called with the lock held"""
+        self._running[lane] -= 1
+        self._total_running -= 1
+        self._cond.notify_all()
+
+    def _next_job(self) -> Optional[_Job]:
+        """Head of the highest-priority lane with a free slot"""
+        if self._total_running >= self.max_concurrency:
+            return None
+        for lane in self.lanes:
+            queue = self._queues[lane]
+            if queue and self._running[lane] < self.lane_limits.get(lane, self.max_concurrency):
+                return queue[0]
+        return None
+
+    def _dispatch(self):
+        """Admit jobs in priority order as slots and rate budget become available"""
+        with self._cond:
+            while not self._closed:
+                now = time.monotonic()
+                while self._delayed and self._delayed[0][0] <= now:
+                    # Retries go to the front of their lane, they have waited longest
+                    job = heapq.heappop(self._delayed)[2]
+                    self._queues[job.lane].appendleft(job)
+
+                job = self._next_job()
+                wait = None
+                if job is not None:
+                    wait = max((b.delay(job.tokens if b is self._token_bucket else 1, now) for b in self._buckets),
+                               default=0.0)
+                    if wait <= 0:
+                        self._queues[job.lane].popleft()
+                        # A retry's Future is already running; a new one may have been cancelled
+                        if job.attempt == 0 and not job.future.set_running_or_notify_cancel():
+                            self._forget(job)
+                            continue
+                        if self._request_bucket is not None:
+                            self._request_bucket.take(1, now)
+                        if self._token_bucket is not None:
+                            self._token_bucket.take(job.tokens, now)
+                        self._running[job.lane] += 1
+                        self._total_running += 1
+                        if job.fn is None:
+                            job.future.set_result(None)
+                        else:
+                            self._executor.submit(self._run, job)
+                        continue
+
+                if self._delayed:
+                    retry_wait = self._delayed[0][0] - now
+                    wait = retry_wait if wait is None else min(wait, retry_wait)
+                self._cond.wait(wait)
+
+    def _run(self, job: _Job):
+        """Execute an admitted job on a worker thread"""
+        try:
+            result = job.fn()
+        except BaseException as exc:
+            with self._cond:
+                self._finish(job.lane)
+                if not self._closed and job.attempt < self.max_retries and self.retryable(exc):
+                    job.attempt += 1
+                    self.counters['retries'] += 1
+                    heapq.heappush(self._delayed, (time.monotonic() + self._backoff(job.attempt, exc),
+                                                   next(self._seq), job))
+                    return
+                self.counters['failed'] += 1
+                self._forget(job)
+            job.future.set_exception(exc)
+        else:
+            with self._cond:
+                self._finish(job.lane)
+                self.counters['completed'] += 1
+                self._forget(job)
+            job.future.set_result(result)
+
+    def _forget(self, job: _Job):
+        """Stop coalescing onto a finished call, called with the lock held"""
+        if job.key is not None and self._inflight.get(job.key) is job:
+            del self._inflight[job.key]
+
+    def _backoff(self, attempt: int, exc: BaseException) -> float:
+        """Exponential backoff with equal jitter, never shorter than the provider's Retry-After"""
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        delay = delay / 2 + random.uniform(0, delay / 2)
+        return max(delay, retry_after(exc) or 0.0)
+
+
+class ScheduledChatModel(BaseChatModel):
+    """Chat model that sends every call of the wrapped model through an LLMScheduler"""
+
+    model: BaseChatModel
+    """Model that makes the actual calls"""
+    scheduler: Any
+    """LLMScheduler shared by every model that counts against the same provider limits"""
+    lane: str = INTERACTIVE
+    """Priority lane of this model's calls"""
+    completion_tokens: Optional[int] = None
+    """Reply tokens reserved per call, defaults to the wrapped model's max_tokens"""
+    coalesce: bool = True
+    """Share one call between identical prompts in flight at the same time"""
+
+    @property
+    def _llm_type(self) -> str:
+        return f'scheduled-{self.model._llm_type}'
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        # The lane is left out, so cached responses are shared by all lanes
+        return {'model': self.model._llm_type, **self.model._identifying_params}
+
+    @property
+    def model_name(self) -> str:
+        return getattr(self.model, 'model_name', None) or self.model._llm_type
+
+    def with_lane(self, lane: str) -> 'ScheduledChatModel':
+        """Same model and scheduler, calls queued in another lane"""
+        return self.model_copy(update={'lane': lane})
+
+    def _estimate_tokens(self, messages: List[BaseMessage]) -> int:
+        reply = self.completion_tokens or getattr(self.model, 'max_tokens', None) or DEFAULT_COMPLETION_TOKENS
+        return sum(message_tokens(message) for message in messages) + reply
+
+    def _key(self, messages: List[BaseMessage], stop: Optional[List[str]], kwargs: Dict) -> Optional[str]:
+        if not self.coalesce:
+            return None
+        description = dumps([self._llm_type, self._identifying_params, stop, sorted(kwargs.items())])
+        return hashlib.sha256((description + dumps(messages)).encode('utf-8')).hexdigest()
+
+    def _call(self, messages: List[BaseMessage], stop: Optional[List[str]], kwargs: Dict, tokens: int):
+        """Run the wrapped model and settle the token estimate against the reported usage"""
+        message = self.model.invoke(messages, stop=stop, **kwargs)
+        usage = getattr(message, 'usage_metadata', None)
+        if usage:
+            self.scheduler.adjust_tokens(usage['total_tokens'] - tokens)
+        return message
+
+    def _submit(self, messages: List[BaseMessage], stop: Optional[List[str]], kwargs: Dict) -> Future:
+        tokens = self._estimate_tokens(messages)
+        return self.scheduler.submit(lambda: self._call(messages, stop, kwargs, tokens),
+                                     lane=self.lane, tokens=tokens, key=self._key(messages, stop, kwargs))
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        message = self._submit(messages, stop, kwargs).result()
+        # Coalesced callers share the reply, give each its own copy
+        return ChatResult(generations=[ChatGeneration(message=message.model_copy())])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                         **kwargs: Any) -> ChatResult:
+        message = await asyncio.wrap_future(self._submit(messages, stop, kwargs))
+        return ChatResult(generations=[ChatGeneration(message=message.model_copy())])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None,
+                **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        # The slot is held until the stream ends; streams are not retried or coalesced
+        with self.scheduler.slot(self.lane, self._estimate_tokens(messages)):
+            for chunk in self.model.stream(messages, stop=stop, **kwargs):
+                generation = ChatGenerationChunk(message=chunk)
+                if run_manager:
+                    run_manager.on_llm_new_token(chunk.content, chunk=generation)
+                yield generation
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        await self.scheduler.aadmit(self.lane, self._estimate_tokens(messages))
+        try:
+            async for chunk in self.model.astream(messages, stop=stop, **kwargs):
+                generation = ChatGenerationChunk(message=chunk)
+                if run_manager:
+                    await run_manager.on_llm_new_token(chunk.content, chunk=generation)
+                yield generation
+        finally:
+            self.scheduler.release(self.lane)
+
+
+# Process-wide scheduler, created on first use from the LLM_* environment variables
+_default_scheduler: Optional[LLMScheduler] = None
+_default_lock = threading.Lock()
+
+
+def default_scheduler() -> LLMScheduler:
+    """
+    Scheduler shared by every entry point in this process
+
+    Configured from LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE and
+    LLM_MAX_CONCURRENCY; limits are off when the variables are unset.
+    """
+    global _default_scheduler
+    with _default_lock:
+        if _default_scheduler is None:
+            rpm = os.getenv('LLM_REQUESTS_PER_MINUTE')
+            tpm = os.getenv('LLM_TOKENS_PER_MINUTE')
+            _default_scheduler = LLMScheduler(
+                requests_per_minute=float(rpm) if rpm else None,
+                tokens_per_minute=float(tpm) if tpm else None,
+                max_concurrency=int(os.getenv('LLM_MAX_CONCURRENCY', '8'))
+            )
+        return _default_scheduler
+
+
+def scheduled(model: BaseChatModel, lane: str = INTERACTIVE,
+              scheduler: Optional[LLMScheduler] = None, **kwargs) -> ScheduledChatModel:
+    """Wrap a model so its calls go through the scheduler, the shared default if none is given"""
+    return ScheduledChatModel(model=model, scheduler=scheduler or default_scheduler(), lane=lane, **kwargs)
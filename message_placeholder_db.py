@@ -3,110 +3,325 @@ Updated message placeholder script that uses SQLite database for chat history
 Demonstrates integration of LangChain with persistent database storage
 """
 
-from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from dotenv import load_dotenv
 from chat_database import ChatDatabase
+from async_chat_database import AsyncChatDatabase
+from history_cache import HistoryCache
+from history_compaction import LastNTokensPolicy, RollingSummaryPolicy
+from streaming import timed_stream
+from template_registry import registry
+from write_behind import WriteBehindWriter
+from typing import AsyncIterator, Optional
+from functools import lru_cache
+import asyncio
 import sys
+import threading
 
 load_dotenv()
 
+def format_message(role, content):
+    """Convert one database message to its LangChain message type"""
+    if role == 'human':
+        return HumanMessage(content=content)
+    elif role == 'ai':
+        return AIMessage(content=content)
+    elif role == 'system':
+        return SystemMessage(content=content)
+
+
 def format_messages_for_langchain(messages):
     """Convert database messages to LangChain message format"""
-    formatted_messages = []
+    return [format_message(role, content) for role, content in messages]
+
+
+# Formatted history per database and session, shared by every chat_with_history call in this process
+history_cache = HistoryCache(formatter=format_message)
 
-    for role, content in messages:
-        if role == 'human':
-            formatted_messages.append(HumanMessage(content=content))
-        elif role == 'ai':
-            formatted_messages.append(AIMessage(content=content))
-        elif role == 'system':
-            formatted_messages.append(SystemMessage(content=content))
 
-    return formatted_messages
+def _cache_for(db) -> HistoryCache:
+    """The history cache a database keeps up to date, else the process-wide one"""
+    return db.history_cache if db.history_cache is not None else history_cache
 
 
-def chat_with_history(session_id: str, new_query: str):
+def load_chat_history(db, session_id):
     """
-    Continue a conversation using history from database
+    Return (conversation ID, formatted history) of a session, creating the conversation if it is new
 
-    Args:
-        session_id: The conversation session to continue
-        new_query: The new user query to respond to
+    One round trip reads the conversation ID together with the rows newer than the cached copy.
     """
+    cache = _cache_for(db)
+    since_id = cache.last_id(db.db_path, session_id) or 0
+    conv_id, rows = db.get_or_create_conversation_with_history(
+        session_id, title="New Support Conversation", since_id=since_id
+    )
+    if since_id and cache.conversation_id(db.db_path, session_id) != conv_id:
+        # Another instance deleted and recreated the session, the cached copy is of the old one
+        conv_id, rows = db.get_or_create_conversation_with_history(session_id, title="New Support Conversation")
+    return conv_id, cache.extend(db.db_path, session_id, conv_id, rows)
+
+
+# Default compaction stage between loading history and building the prompt
+history_policy = LastNTokensPolicy(max_tokens=8000)
+
+
+# Embedding index of each database's stored messages, opened on first use by retrieval mode
+_vector_indexes = {}
+_vector_index_lock = threading.Lock()
+
+
+def get_vector_index(db):
+    """Open the vector index next to the database and index any messages it is missing"""
+    with _vector_index_lock:
+        index = _vector_indexes.get(db.db_path)
+        if index is None:
+            # NumPy and scikit-learn are only needed in retrieval mode
+            from sharded_database import ShardedChatDatabase, ShardedVectorIndex
+            from vector_index import VectorIndex
+            if isinstance(db, ShardedChatDatabase):
+                index = ShardedVectorIndex(db)
+            else:
+                index = VectorIndex(db.db_path)
+            _vector_indexes[db.db_path] = index
+    index.sync(db)
+    return index
+
+
+def retrieve_relevant_history(db, index, session_id, query, k=5, recent=2):
+    """Return the k messages of a session most relevant to the query plus the most recent ones"""
+    session_ids = db.get_message_ids(session_id)
+    hits = index.search(query, k, ids=session_ids)
+    keep = {message_id for message_id, _ in hits} | set(session_ids[-recent:])
+    return format_messages_for_langchain(
+        (role, content) for _, role, content in db.get_messages_by_ids(sorted(keep))
+    )
 
-    # Instantiate model
-    model = ChatOpenAI()
 
-    # Create chat template with placeholder for history
-    chat_template = ChatPromptTemplate([
+def default_model():
+    """Shared routed model (LLM_PROVIDERS), imported on first use so database-only callers skip the provider SDKs"""
+    from llm_scheduler import scheduled
+    from model_router import build_router
+    return registry.get_model('default-router', lambda: scheduled(build_router()))
+
+
+def make_summarizer(model):
+    """Create a RollingSummaryPolicy summarizer that asks the model to fold messages into a summary"""
+    def summarize(previous_summary, messages):
+        transcript = '\n'.join(f"{msg.type}: {msg.content}" for msg in messages)
+        instructions = 'Summarize this customer support conversation, keeping names, order numbers and open issues.'
+        if previous_summary:
+            instructions += f'\nExtend this existing summary: {previous_summary}'
+        return model.invoke([
+            SystemMessage(content=instructions),
+            HumanMessage(content=transcript)
+        ]).content
+
+    return summarize
+
+
+def rolling_summary_policy(model, max_tokens=8000):
+    """Compaction policy that replaces old messages with a persisted rolling summary"""
+    return RollingSummaryPolicy(make_summarizer(model), format_message, max_tokens=max_tokens)
+
+
+@lru_cache(maxsize=None)
+def build_chat_template():
+    """Create chat template with placeholder for history, built once and shared by every call"""
+    return ChatPromptTemplate([
         ('system', 'You are a helpful customer support agent. Use the conversation history to provide context-aware responses.'),
         MessagesPlaceholder(variable_name='chat_history'),
         ('human', '{query}')
     ])
 
-    # Load chat history from database
-    db = ChatDatabase()
-
-    # Get messages from the specified session
-    messages = db.get_conversation_messages(session_id)
 
-    if not messages:
-        print(f"No conversation found with session_id: {session_id}")
-        print("Starting a new conversation...")
-        # Create new conversation if it doesn't exist
-        conv_id = db.create_conversation(
-            session_id=session_id,
-            title="New Support Conversation"
-        )
-    else:
-        print(f"Found {len(messages)} messages in conversation history")
-        # Get conversation ID for adding new messages
-        db.cursor.execute('SELECT id FROM conversations WHERE session_id = ?', (session_id,))
-        conv_id = db.cursor.fetchone()['id']
+def chat_with_history(session_id: str, new_query: str, policy=None, stream: bool = False,
+                      retrieval_k: Optional[int] = None, db: Optional[ChatDatabase] = None, model=None,
+                      writer: Optional[WriteBehindWriter] = None):
+    """
+    Continue a conversation using history from database
 
-    # Format messages for LangChain
-    chat_history = format_messages_for_langchain(messages)
+    Args:
+        session_id: The conversation session to continue
+        new_query: The new user query to respond to
+        policy: History compaction policy, defaults to history_policy
+        stream: Print the response token by token as it is generated
+        retrieval_k: Send only the retrieval_k most relevant prior messages (plus the
+            latest exchange) instead of the whole transcript
+        db: Shared ChatDatabase, a private one is opened and closed if omitted
+        model: Chat model to use, defaults to the shared provider router
+        writer: Queue the exchange on this write-behind writer instead of committing
+            it before returning; db defaults to writer.db
+    """
 
-    print("\n" + "="*50)
-    print("CONVERSATION HISTORY:")
-    print("="*50)
-    for msg in chat_history:
-        role = "Human" if isinstance(msg, HumanMessage) else "AI" if isinstance(msg, AIMessage) else "System"
-        print(f"{role}: {msg.content}")
+    # Shared model instance, its HTTP client is reused across calls
+    if model is None:
+        model = default_model()
 
-    print("\n" + "="*50)
-    print("NEW QUERY:")
-    print("="*50)
-    print(f"Human: {new_query}")
+    # Create chat template with placeholder for history
+    chat_template = build_chat_template()
+
+    # Load chat history from database, add_message keeps the cache up to date
+    if db is None and writer is not None:
+        db = writer.db
+    owns_db = db is None
+    if owns_db:
+        db = ChatDatabase(history_cache=history_cache)
+
+    try:
+        if writer is not None:
+            # The previous turn may still be queued; the conversation ID is remembered after the first turn
+            writer.wait(db.create_conversation(session_id, title="New Support Conversation"))
+
+        # Conversation ID and formatted messages of the session in one call
+        conv_id, chat_history = load_chat_history(db, session_id)
+
+        if not chat_history:
+            print(f"No conversation found with session_id: {session_id}")
+            print("Starting a new conversation...")
+        else:
+            print(f"Found {len(chat_history)} messages in conversation history")
+
+        if retrieval_k:
+            # The index catches up on messages stored since the last retrieval turn
+            chat_history = retrieve_relevant_history(db, get_vector_index(db), session_id, new_query, retrieval_k)
+        else:
+            # Keep the prompt within the token budget
+            chat_history = (policy or history_policy).compact(chat_history, db, conv_id)
+
+        print("\n" + "="*50)
+        print("CONVERSATION HISTORY:")
+        print("="*50)
+        for msg in chat_history:
+            role = "Human" if isinstance(msg, HumanMessage) else "AI" if isinstance(msg, AIMessage) else "System"
+            print(f"{role}: {msg.content}")
+
+        print("\n" + "="*50)
+        print("NEW QUERY:")
+        print("="*50)
+        print(f"Human: {new_query}")
+
+        # Create prompt with history and new query
+        prompt = chat_template.invoke({
+            'chat_history': chat_history,
+            'query': new_query
+        })
+
+        print("\n" + "="*50)
+        print("AI RESPONSE:")
+        print("="*50)
+
+        # Get response from model
+        if stream:
+            parts = []
+            for text in timed_stream(model.stream(prompt), label=f'chat {session_id}'):
+                print(text, end='', flush=True)
+                parts.append(text)
+            print()
+            response = ''.join(parts)
+        else:
+            response = model.invoke(prompt).content
+            print(response)
+
+        # Save the new exchange to database in one transaction
+        if writer is not None:
+            writer.submit(conv_id, [('human', new_query), ('ai', response)])
+        else:
+            db.add_messages(conv_id, [('human', new_query), ('ai', response)])
+
+        print("\n" + "="*50)
+        print("Conversation updated in database!")
+    finally:
+        if owns_db:
+            db.close()
+
+    return response
+
+
+async def _aprepare_turn(db: AsyncChatDatabase, session_id: str, new_query: str, policy=None):
+    """Load and compact a session's history off the event loop, return (conversation ID, prompt)"""
+    if db.writer is not None:
+        # The previous turn may still be queued on the write-behind writer
+        await db.wait_for_writes(await db.create_conversation(session_id, title="New Support Conversation"))
+
+    cache, db_path = _cache_for(db.db), db.db.db_path
+    since_id = cache.last_id(db_path, session_id) or 0
+    conv_id, rows = await db.get_or_create_conversation_with_history(
+        session_id, title="New Support Conversation", since_id=since_id
+    )
+    if since_id and cache.conversation_id(db_path, session_id) != conv_id:
+        # Another instance deleted and recreated the session, the cached copy is of the old one
+        conv_id, rows = await db.get_or_create_conversation_with_history(
+            session_id, title="New Support Conversation"
+        )
+    chat_history = cache.extend(db_path, session_id, conv_id, rows)
+    # Summarizing policies may call the model and the database, keep them off the loop
+    chat_history = await asyncio.to_thread(
+        (policy or history_policy).compact, chat_history, db.db, conv_id
+    )
 
-    # Create prompt with history and new query
-    prompt = chat_template.invoke({
+    prompt = build_chat_template().invoke({
         'chat_history': chat_history,
         'query': new_query
     })
+    return conv_id, prompt
 
-    # Get response from model
-    result = model.invoke(prompt)
 
-    print("\n" + "="*50)
-    print("AI RESPONSE:")
-    print("="*50)
-    print(result.content)
+async def achat_with_history(session_id: str, new_query: str,
+                             db: Optional[AsyncChatDatabase] = None, model=None, policy=None):
+    """
+    Async version of chat_with_history that never blocks the event loop
 
-    # Save the new exchange to database
-    db.add_message(conv_id, 'human', new_query)
-    db.add_message(conv_id, 'ai', result.content)
+    Database calls run on the AsyncChatDatabase executor and the model is
+    awaited through ainvoke, so one event loop can serve many sessions at once.
 
-    print("\n" + "="*50)
-    print("Conversation updated in database!")
+    Args:
+        session_id: The conversation session to continue
+        new_query: The new user query to respond to
+        db: Shared AsyncChatDatabase, a private one is opened and closed if omitted
+        model: Chat model to use, defaults to the shared provider router
+        policy: History compaction policy, defaults to history_policy
+    """
+    owns_db = db is None
+    if owns_db:
+        db = AsyncChatDatabase(history_cache=history_cache)
+    if model is None:
+        model = default_model()
 
-    db.close()
+    try:
+        conv_id, prompt = await _aprepare_turn(db, session_id, new_query, policy)
+
+        result = await model.ainvoke(prompt)
+
+        await db.queue_messages(conv_id, [('human', new_query), ('ai', result.content)])
+    finally:
+        if owns_db:
+            await db.close()
 
     return result.content
 
 
+async def astream_chat_with_history(session_id: str, new_query: str, db: AsyncChatDatabase,
+                                    model=None, policy=None) -> AsyncIterator[str]:
+    """
+    Streaming variant of achat_with_history, yields the reply text as it is generated
+
+    The exchange is saved (or queued, with write-behind) once the reply is complete;
+    a turn abandoned by the consumer before the end is not stored.
+    """
+    if model is None:
+        model = default_model()
+
+    conv_id, prompt = await _aprepare_turn(db, session_id, new_query, policy)
+
+    parts = []
+    async for chunk in model.astream(prompt):
+        parts.append(chunk.content)
+        yield chunk.content
+
+    await db.queue_messages(conv_id, [('human', new_query), ('ai', ''.join(parts))])
+
+
 def demonstrate_database_features():
     """Demonstrate various database features"""
 
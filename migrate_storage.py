@@ -0,0 +1,67 @@
+"""
+Storage migration tool
+Converts an existing chat history database to the compact storage mode
+(compressed content, interned metadata) or back to plain text, then vacuums
+the file so the freed pages are returned to the filesystem.
+
+Usage:
+    python3 migrate_storage.py chat_history.db --algorithm zlib
+    python3 migrate_storage.py chat_history.db --algorithm zstd --threshold 256
+    python3 migrate_storage.py chat_history.db --algorithm none   # back to plain text
+"""
+
+import argparse
+import os
+import sqlite3
+
+from chat_database import ChatDatabase
+
+
+def file_size(path):
+    """Size of a database including its WAL file"""
+    return sum(os.path.getsize(p) for p in (path, f'{path}-wal') if os.path.exists(p))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert a chat history database between storage modes')
+    parser.add_argument('db', help='Database file to migrate in place')
+    parser.add_argument('--algorithm', default='zlib', choices=['zlib', 'zstd', 'none'],
+                        help='Compression algorithm, or none for plain text')
+    parser.add_argument('--threshold', type=int, default=512, help='Bytes above which content is compressed on its own')
+    parser.add_argument('--dictionary-size', type=int, default=16384,
+                        help='Size of the dictionary trained for short messages, 0 to skip')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Messages rewritten per transaction')
+    parser.add_argument('--no-backup', action='store_true', help='Skip copying the database to <db>.bak first')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        parser.error(f"{args.db} does not exist")
+
+    if not args.no_backup:
+        # The SQLite backup API produces a consistent copy even if the database is in WAL mode
+        with sqlite3.connect(args.db) as source, sqlite3.connect(f'{args.db}.bak') as backup:
+            source.backup(backup)
+        print(f"Backed up {args.db} to {args.db}.bak")
+
+    size_before = file_size(args.db)
+    algorithm = None if args.algorithm == 'none' else args.algorithm
+
+    with ChatDatabase(args.db, compression=algorithm, compression_threshold=args.threshold) as db:
+        if algorithm is not None and args.dictionary_size:
+            dict_id = db.train_compression_dictionary(size=args.dictionary_size)
+            if dict_id is not None:
+                print(f"Trained {algorithm} dictionary {dict_id} for messages under {args.threshold} bytes")
+
+        stats = db.recompress_messages(batch_size=args.batch_size)
+        print(f"Rewrote {stats['messages']:,} messages in {stats['seconds']:.1f}s: content "
+              f"{stats['bytes_before']:,} -> {stats['bytes_after']:,} bytes")
+
+        # Compressed rows leave free pages behind, VACUUM returns them to the filesystem
+        db.conn.execute('VACUUM')
+
+    size_after = file_size(args.db)
+    print(f"Database file {size_before:,} -> {size_after:,} bytes ({size_after / size_before - 1:+.0%})")
+
+
+if __name__ == '__main__':
+    main()
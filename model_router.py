@@ -0,0 +1,416 @@
+"""
+Model Router Module
+Chat model that spreads calls over several providers. It keeps a rolling p95
+latency and error rate per provider and sends each request to the fastest
+healthy one. A provider whose error rate crosses the threshold is benched for a
+cooldown, and failed calls fail over to the next provider at once. When the
+first provider has not answered by the hedge deadline, a second request goes to
+the runner-up and whichever answers first wins.
+
+Providers are configured once through LLM_PROVIDERS, a comma-separated list of
+provider:model specs tried in that order until latency data says otherwise.
+
+Usage:
+    LLM_PROVIDERS="openai:gpt-4o,anthropic:claude-3-5-sonnet-latest,google:gemini-1.5-pro"
+    model = build_router(max_tokens=2000)
+    model.invoke('Summarize attention is all you need')
+    print(model.stats())
+"""
+
+import asyncio
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_PROVIDERS = 'openai:gpt-4o'
+
+# Threads running sync provider calls, shared by all routers; hedged losers finish here
+_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix='model-router')
+
+
+class ProviderStats:
+    """Rolling latency and error window of one provider"""
+
+    def __init__(self, window: int = 100):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)  # True for a failed call
+        self.calls = 0
+        self.errors = 0
+        self.wins = 0
+        self.down_until = 0.0
+
+    def record(self, seconds: Optional[float], error: bool):
+        self.calls += 1
+        self.outcomes.append(error)
+        if error:
+            self.errors += 1
+        elif seconds is not None:
+            self.latencies.append(seconds)
+
+    def p95(self) -> Optional[float]:
+        """95th percentile of recent successful call latencies, None without data"""
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[max(0, math.ceil(0.95 * len(ordered)) - 1)]
+
+    def error_rate(self) -> float:
+        return sum(self.outcomes) / len(self.outcomes) if self.outcomes else 0.0
+
+
+class ModelRouter(BaseChatModel):
+    """Routes each call to the fastest healthy provider, with failover and hedging"""
+
+    providers: Dict[str, BaseChatModel]
+    """Provider name -> chat model, in preference order for providers without latency data"""
+    window: int = 100
+    """Calls per provider in the rolling latency and error window"""
+    max_error_rate: float = 0.5
+    """Error rate at which a provider is benched"""
+    min_samples: int = 5
+    """Calls needed before a provider can be benched or its p95 used as hedge deadline"""
+    cooldown_seconds: float = 30.0
+    """How long a benched provider gets no traffic before it is tried again"""
+    hedge: bool = True
+    """Send a second request when the first one is slow"""
+    hedge_after: Optional[float] = None
+    """Hedge deadline in seconds, None uses the chosen provider's rolling p95"""
+
+    _stats: Dict[str, ProviderStats] = PrivateAttr(default_factory=dict)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _hedges: int = PrivateAttr(default=0)
+
+    def model_post_init(self, __context: Any):
+        self._stats = {name: ProviderStats(self.window) for name in self.providers}
+
+    @property
+    def _llm_type(self) -> str:
+        return 'model-router'
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {'providers': list(self.providers)}
+
+    @property
+    def model_name(self) -> str:
+        return '|'.join(self.providers)
+
+    def ranked(self) -> List[str]:
+        """Providers to try in order: healthy ones fastest first, benched ones last"""
+        now = time.monotonic()
+        with self._lock:
+            order = list(self.providers)
+            healthy = [name for name in order if self._stats[name].down_until <= now]
+            benched = [name for name in order if name not in healthy]
+            # No data yet counts as fastest, so every provider gets measured
+            healthy.sort(key=lambda name: (self._stats[name].p95() or 0.0, order.index(name)))
+            return healthy + benched
+
+    def _record(self, name: str, seconds: Optional[float], error: bool):
+        """Update a provider's window and bench it when its error rate is too high"""
+        with self._lock:
+            stats = self._stats[name]
+            stats.record(seconds, error)
+            if error and len(stats.outcomes) >= self.min_samples and stats.error_rate() >= self.max_error_rate:
+                stats.down_until = time.monotonic() + self.cooldown_seconds
+                # Start from a clean window after the cooldown
+                stats.outcomes.clear()
+                logger.warning("Provider %s benched for %.0fs after repeated errors", name, self.cooldown_seconds)
+
+    def _hedge_delay(self, name: str) -> Optional[float]:
+        if not self.hedge:
+            return None
+        if self.hedge_after is not None:
+            return self.hedge_after
+        with self._lock:
+            stats = self._stats[name]
+            return stats.p95() if len(stats.latencies) >= self.min_samples else None
+
+    def _result(self, name: str, message: BaseMessage) -> ChatResult:
+        with self._lock:
+            self._stats[name].wins += 1
+        message = message.model_copy(update={'response_metadata': {**message.response_metadata, 'provider': name}})
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        candidates = self.ranked()
+        deadline = None
+        hedge_delay = self._hedge_delay(candidates[0])
+        if hedge_delay is not None:
+            deadline = time.monotonic() + hedge_delay
+        pending = {}
+        last_error = None
+
+        def launch(name):
+            start = time.monotonic()
+            future = _executor.submit(self.providers[name].invoke, messages, stop=stop, **kwargs)
+            # Recorded on completion, also for hedged calls that lost the race
+            future.add_done_callback(
+                lambda f: self._record(name, time.monotonic() - start, f.exception() is not None)
+            )
+            pending[future] = name
+
+        launch(candidates.pop(0))
+        while pending:
+            timeout = None
+            if deadline is not None and candidates:
+                timeout = max(0.0, deadline - time.monotonic())
+            done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                deadline = None
+                with self._lock:
+                    self._hedges += 1
+                launch(candidates.pop(0))
+                continue
+            for future in done:
+                name = pending.pop(future)
+                if future.exception() is None:
+                    return self._result(name, future.result())
+                last_error = future.exception()
+                logger.warning("Provider %s failed: %s", name, last_error)
+            if not pending and candidates:
+                launch(candidates.pop(0))
+        raise last_error
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                         **kwargs: Any) -> ChatResult:
+        candidates = self.ranked()
+        deadline = None
+        hedge_delay = self._hedge_delay(candidates[0])
+        if hedge_delay is not None:
+            deadline = time.monotonic() + hedge_delay
+        pending = {}
+        started = {}
+        last_error = None
+
+        async def call(name):
+            start = time.monotonic()
+            try:
+                message = await self.providers[name].ainvoke(messages, stop=stop, **kwargs)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self._record(name, time.monotonic() - start, True)
+                raise
+            self._record(name, time.monotonic() - start, False)
+            return message
+
+        def launch(name):
+            task = asyncio.ensure_future(call(name))
+            pending[task] = name
+            started[task] = time.monotonic()
+
+        launch(candidates.pop(0))
+        try:
+            while pending:
+                timeout = None
+                if deadline is not None and candidates:
+                    timeout = max(0.0, deadline - time.monotonic())
+                done, _ = await asyncio.wait(list(pending), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    deadline = None
+                    with self._lock:
+                        self._hedges += 1
+                    launch(candidates.pop(0))
+                    continue
+                for task in done:
+                    name = pending.pop(task)
+                    if task.exception() is None:
+                        # A request that lost the race is cancelled below and records nothing
+                        # itself; its time so far is a lower bound, so a slow provider still
+                        # drops down the ranking instead of staying "unmeasured" and first
+                        now = time.monotonic()
+                        for loser, loser_name in pending.items():
+                            if not loser.done():
+                                self._record(loser_name, now - started[loser], False)
+                        return self._result(name, task.result())
+                    last_error = task.exception()
+                    logger.warning("Provider %s failed: %s", name, last_error)
+                if not pending and candidates:
+                    launch(candidates.pop(0))
+            raise last_error
+        finally:
+            # The losing request is no longer needed
+            for task in pending:
+                task.cancel()
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None,
+                **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        # Streams fail over until the first chunk arrives; they are not hedged. The latency
+        # sample is the time spent waiting on the provider for the whole reply, which matches
+        # _generate and leaves out however long the caller takes with each chunk
+        last_error = None
+        for name in self.ranked():
+            chunks = self.providers[name].stream(messages, stop=stop, **kwargs)
+            start = time.perf_counter()
+            try:
+                first = next(chunks)
+            except StopIteration:
+                self._record(name, time.perf_counter() - start, False)
+                return
+            except Exception as exc:
+                self._record(name, None, True)
+                last_error = exc
+                logger.warning("Provider %s failed: %s", name, exc)
+                continue
+            waited = time.perf_counter() - start
+
+            chunk = first
+            while True:
+                generation = ChatGenerationChunk(message=chunk)
+                if run_manager:
+                    run_manager.on_llm_new_token(chunk.content, chunk=generation)
+                yield generation
+                start = time.perf_counter()
+                try:
+                    chunk = next(chunks)
+                except StopIteration:
+                    break
+                except Exception:
+                    self._record(name, None, True)
+                    raise
+                finally:
+                    waited += time.perf_counter() - start
+            self._record(name, waited, False)
+            return
+        raise last_error
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        last_error = None
+        for name in self.ranked():
+            chunks = self.providers[name].astream(messages, stop=stop, **kwargs).__aiter__()
+            start = time.perf_counter()
+            try:
+                first = await chunks.__anext__()
+            except StopAsyncIteration:
+                self._record(name, time.perf_counter() - start, False)
+                return
+            except Exception as exc:
+                self._record(name, None, True)
+                last_error = exc
+                logger.warning("Provider %s failed: %s", name, exc)
+                continue
+            waited = time.perf_counter() - start
+
+            chunk = first
+            while True:
+                generation = ChatGenerationChunk(message=chunk)
+                if run_manager:
+                    await run_manager.on_llm_new_token(chunk.content, chunk=generation)
+                yield generation
+                start = time.perf_counter()
+                try:
+                    chunk = await chunks.__anext__()
+                except StopAsyncIteration:
+                    break
+                except Exception:
+                    self._record(name, None, True)
+                    raise
+                finally:
+                    waited += time.perf_counter() - start
+            self._record(name, waited, False)
+            return
+        raise last_error
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-provider calls, errors, rolling error rate and p95, plus the hedge count"""
+        now = time.monotonic()
+        with self._lock:
+            providers = {}
+            for name, s in self._stats.items():
+                p95 = s.p95()
+                providers[name] = {
+                    'calls': s.calls,
+                    'errors': s.errors,
+                    'wins': s.wins,
+                    'error_rate': s.error_rate(),
+                    'p95_ms': p95 * 1000 if p95 is not None else None,
+                    'healthy': s.down_until <= now
+                }
+            return {'providers': providers, 'hedges': self._hedges}
+
+
+def _openai(model: str, **kwargs) -> BaseChatModel:
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(model=model, **kwargs)
+
+
+def _anthropic(model: str, **kwargs) -> BaseChatModel:
+    from langchain_anthropic import ChatAnthropic
+    return ChatAnthropic(model=model, **kwargs)
+
+
+def _google(model: str, **kwargs) -> BaseChatModel:
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    if 'max_tokens' in kwargs:
+        kwargs['max_output_tokens'] = kwargs.pop('max_tokens')
+    return ChatGoogleGenerativeAI(model=model, **kwargs)
+
+
+def _huggingface(model: str, **kwargs) -> BaseChatModel:
+    from langchain_huggingface import ChatHuggingFace, HuggingFaceEndpoint
+    if 'max_tokens' in kwargs:
+        kwargs['max_new_tokens'] = kwargs.pop('max_tokens')
+    return ChatHuggingFace(llm=HuggingFaceEndpoint(repo_id=model, **kwargs))
+
+
+def _fake(latency: str, **kwargs) -> BaseChatModel:
+    from fake_chat_model import FakeChatModel
+    return FakeChatModel(model_name=f'fake-{latency or 0}', latency=float(latency or 0))
+
+
+# provider prefix of an LLM_PROVIDERS spec -> factory taking the model name and shared settings
+PROVIDER_FACTORIES: Dict[str, Callable[..., BaseChatModel]] = {
+    'openai': _openai,
+    'anthropic': _anthropic,
+    'google': _google,
+    'huggingface': _huggingface,
+    'fake': _fake  # fake:<latency seconds>, offline
+}
+
+
+def build_router(spec: Optional[str] = None, **model_kwargs) -> ModelRouter:
+    """
+    Create a router from provider:model specs
+
+    Args:
+        spec: Comma-separated provider:model list, defaults to LLM_PROVIDERS or openai:gpt-4o
+        model_kwargs: Settings passed to every provider, e.g. max_tokens and temperature
+
+    Providers whose integration package is not installed are skipped with a warning.
+    """
+    spec = spec or os.getenv('LLM_PROVIDERS') or DEFAULT_PROVIDERS
+    providers = {}
+    for item in (part.strip() for part in spec.split(',')):
+        if not item:
+            continue
+        provider, _, model = item.partition(':')
+        factory = PROVIDER_FACTORIES.get(provider)
+        if factory is None:
+            raise ValueError(f"Unknown provider {provider!r} in {item!r}, expected one of {list(PROVIDER_FACTORIES)}")
+        try:
+            providers[item] = factory(model, **model_kwargs)
+        except ImportError as exc:
+            logger.warning("Skipping provider %s: %s", item, exc)
+    if not providers:
+        raise ValueError(f"No usable provider in {spec!r}")
+    return ModelRouter(providers=providers)
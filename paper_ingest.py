@@ -0,0 +1,248 @@
+"""
+Paper Ingest Module
+Summarizes full paper text map-reduce style: the paper is streamed page by page,
+split into token-bounded chunks, each chunk is summarized in parallel (map), and
+the partial summaries are combined in the style and length asked for by
+template.json (reduce). Chunk summaries are cached by content hash, so re-running
+on an unchanged paper only pays for the reduce step.
+
+Usage:
+    python3 paper_ingest.py paper.pdf --title "Attention Is All You Need" --style Technical
+"""
+
+import argparse
+import asyncio
+import hashlib
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional
+
+from langchain_core.prompts import PromptTemplate
+
+from history_compaction import count_tokens
+from summary_options import TEMPLATE_PATH, TEMPLATE_VARIABLES
+from summary_store import SummaryStore
+from template_registry import registry
+
+
+MAP_PROMPT = PromptTemplate.from_template(
+    'Summarize this excerpt from the research paper "{title}". Keep definitions, '
+    'equations, key results and numbers, and skip boilerplate.\n\n{chunk}'
+)
+
+COLLAPSE_PROMPT = PromptTemplate.from_template(
+    'Merge these consecutive section notes from the research paper "{title}" into one '
+    'shorter set of notes without losing equations or results.\n\n{notes}'
+)
+
+REDUCE_SUFFIX = PromptTemplate.from_template(
+    '\nBase the summary only on the following notes taken from the full paper text:\n{notes}\n'
+)
+
+# Text files have no pages, so they are streamed in blocks of this many characters
+TEXT_PAGE_CHARS = 8000
+
+
+def iter_pages(path: str) -> Iterator[str]:
+    """Yield the text of a PDF or plain text file one page (or block) at a time"""
+    if Path(path).suffix.lower() == '.pdf':
+        try:
+            from pypdf import PdfReader
+        except ImportError as exc:
+            raise ImportError("Reading PDF files requires pypdf: pip install pypdf") from exc
+
+        reader = PdfReader(path)
+        for page in reader.pages:
+            # Pages end mid-paragraph, the newline keeps their last and first words apart
+            yield (page.extract_text() or '') + '\n'
+        return
+
+    with open(path, encoding='utf-8', errors='replace') as f:
+        while True:
+            block = f.read(TEXT_PAGE_CHARS)
+            if not block:
+                break
+            # Form feeds are the conventional page separator in extracted text
+            yield block.replace('\f', '\n\n')
+
+
+def iter_chunks(pages: Iterable[str], max_tokens: int = 1500) -> Iterator[str]:
+    """
+    Split a stream of pages into chunks of at most max_tokens tokens
+
+    Chunks are cut at paragraph boundaries where possible; paragraphs larger than
+    the budget are split on whitespace. Only the chunk being built is held in memory.
+    """
+    current: List[str] = []
+    current_tokens = 0
+
+    for piece in _iter_pieces(pages, max_chars=max_tokens * 4):  # inverse of count_tokens
+        tokens = count_tokens(piece)
+        if current and current_tokens + tokens > max_tokens:
+            yield '\n\n'.join(current)
+            current, current_tokens = [], 0
+        current.append(piece)
+        current_tokens += tokens
+
+    if current:
+        yield '\n\n'.join(current)
+
+
+def _iter_pieces(pages: Iterable[str], max_chars: int) -> Iterator[str]:
+    """Yield paragraphs of at most max_chars, joining paragraphs that span a page break"""
+    carry = ''
+    for page in pages:
+        paragraphs = (carry + page).split('\n\n')
+        # The last paragraph may continue on the next page
+        carry = paragraphs.pop()
+        if len(carry) > max_chars:
+            # Keep only the unfinished tail so a paragraph-free text can't pile up in memory
+            pieces = list(_split_oversized(carry, max_chars))
+            carry = pieces.pop()
+            paragraphs.extend(pieces)
+
+        for paragraph in paragraphs:
+            yield from _split_oversized(paragraph.strip(), max_chars)
+
+    yield from _split_oversized(carry.strip(), max_chars)
+
+
+def _split_oversized(paragraph: str, max_chars: int) -> Iterator[str]:
+    """Yield a paragraph in pieces of at most max_chars, cutting on whitespace"""
+    while len(paragraph) > max_chars:
+        cut = paragraph.rfind(' ', 0, max_chars)
+        if cut <= 0:
+            cut = max_chars
+        yield paragraph[:cut]
+        paragraph = paragraph[cut:].lstrip()
+    if paragraph:
+        yield paragraph
+
+
+def chunk_key(chunk: str, model_name: str) -> str:
+    """Cache key of a chunk summary: the chunk text plus the model that summarized it"""
+    return hashlib.sha256(f'{model_name}\x00{chunk}'.encode('utf-8')).hexdigest()
+
+
+async def map_chunks(chunks: Iterable[str], model, title: str, store: SummaryStore,
+                     model_name: str, concurrency: int = 4) -> List[str]:
+    """
+    Summarize chunks in parallel, reusing cached summaries of unchanged chunks
+
+    At most `concurrency` chunks are held in memory or in flight at any time;
+    only the (much smaller) partial summaries are kept.
+    """
+    map_chain = MAP_PROMPT | model
+    summaries: List[Optional[str]] = []
+    in_flight = set()
+
+    async def summarize(index: int, chunk: str):
+        key = chunk_key(chunk, model_name)
+        summary = store.get_chunk_summary(key)
+        if summary is None:
+            summary = (await map_chain.ainvoke({'title': title, 'chunk': chunk})).content
+            store.save_chunk_summary(key, summary)
+        summaries[index] = summary
+
+    try:
+        for index, chunk in enumerate(chunks):
+            summaries.append(None)
+            in_flight.add(asyncio.ensure_future(summarize(index, chunk)))
+            if len(in_flight) >= concurrency:
+                done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    task.result()
+
+        if in_flight:
+            await asyncio.gather(*in_flight)
+    finally:
+        # After a failure the other chunks are not needed, stop their model calls
+        for task in in_flight:
+            task.cancel()
+        await asyncio.gather(*in_flight, return_exceptions=True)
+
+    return summaries
+
+
+async def collapse(summaries: List[str], model, title: str, max_tokens: int) -> List[str]:
+    """Merge neighbouring summaries until all of them fit in max_tokens together"""
+    collapse_chain = COLLAPSE_PROMPT | model
+    while sum(count_tokens(s) for s in summaries) > max_tokens and len(summaries) > 1:
+        groups, group, group_tokens = [], [], 0
+        for summary in summaries:
+            tokens = count_tokens(summary)
+            if group and group_tokens + tokens > max_tokens:
+                groups.append(group)
+                group, group_tokens = [], 0
+            group.append(summary)
+            group_tokens += tokens
+        groups.append(group)
+
+        if len(groups) == len(summaries):
+            # Every summary fills a group on its own, pair them up to make progress
+            groups = [summaries[i:i + 2] for i in range(0, len(summaries), 2)]
+
+        results = await asyncio.gather(*(
+            collapse_chain.ainvoke({'title': title, 'notes': '\n\n'.join(g)}) for g in groups
+        ))
+        summaries = [result.content for result in results]
+    return summaries
+
+
+async def summarize_paper(path: str, title: str, style: str, length: str, model,
+                          store: SummaryStore, model_name: str, chunk_tokens: int = 1500,
+                          reduce_tokens: int = 6000, concurrency: int = 4) -> str:
+    """
+    Summarize a paper file in the given style and length
+
+    Args:
+        path: PDF or plain text file with the paper
+        title, style, length: Values for the a/b/c variables of template.json
+        model: Chat model used for map, collapse and reduce calls
+        store: SummaryStore holding the chunk summary cache
+        model_name: Model identifier used in the chunk cache key
+        chunk_tokens: Token budget of each chunk sent to the map step
+        reduce_tokens: Token budget of the notes sent to the final reduce call
+        concurrency: Maximum number of map calls in flight
+    """
+    chunks = iter_chunks(iter_pages(path), max_tokens=chunk_tokens)
+    partials = await map_chunks(chunks, model, title, store, model_name, concurrency)
+    notes = await collapse(partials, model, title, reduce_tokens)
+
+    reduce_chain = (registry.get_template(TEMPLATE_PATH, TEMPLATE_VARIABLES) + REDUCE_SUFFIX) | model
+    result = await reduce_chain.ainvoke({'a': title, 'b': style, 'c': length, 'notes': '\n\n'.join(notes)})
+    return result.content
+
+
+def main():
+    from dotenv import load_dotenv
+    from summary_options import LENGTHS, STYLES
+
+    parser = argparse.ArgumentParser(description='Summarize a full paper from a PDF or text file')
+    parser.add_argument('path', help='PDF or plain text file')
+    parser.add_argument('--title', help='Paper title (default: file name)')
+    parser.add_argument('--style', default=STYLES[1], choices=STYLES)
+    parser.add_argument('--length', default=LENGTHS[0], choices=LENGTHS)
+    parser.add_argument('--db', default='chat_history.db', help='Database holding the chunk summary cache')
+    parser.add_argument('--model', default='gpt-4o', help='OpenAI model name')
+    parser.add_argument('--concurrency', type=int, default=4, help='Maximum chunk summaries in flight')
+    parser.add_argument('--fake', action='store_true', help='Use the offline fake chat model')
+    args = parser.parse_args()
+
+    load_dotenv()
+    if args.fake:
+        from fake_chat_model import FakeChatModel
+        model, model_name = FakeChatModel(), 'fake-chat'
+    else:
+        from langchain_openai import ChatOpenAI
+        model, model_name = ChatOpenAI(model=args.model, max_tokens=2000), args.model
+
+    with SummaryStore(args.db) as store:
+        summary = asyncio.run(summarize_paper(
+            args.path, args.title or Path(args.path).stem, args.style, args.length,
+            model, store, model_name, concurrency=args.concurrency
+        ))
+    print(summary)
+
+
+if __name__ == '__main__':
+    main()
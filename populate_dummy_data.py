@@ -131,25 +131,16 @@ def create_dummy_conversations():
     print("Creating dummy conversations in database...")
 
     for conv_data in conversations:
-        # Create conversation
-        conv_id = db.create_conversation(
-            session_id=conv_data['session_id'],
-            title=conv_data['title'],
-            metadata={'source': 'dummy_data', 'created_by': 'populate_script'}
-        )
+        conv_data['metadata'] = {'source': 'dummy_data', 'created_by': 'populate_script'}
+        conv_data['messages'] = [
+            (role, content, {'generated': True}) for role, content in conv_data['messages']
+        ]
+        print(f"Queued conversation: {conv_data['title']} ({len(conv_data['messages'])} messages)")
 
-        print(f"Created conversation: {conv_data['title']} (ID: {conv_id})")
-
-        # Add messages with slight time delays to simulate real conversation
-        for role, content in conv_data['messages']:
-            db.add_message(
-                conversation_id=conv_id,
-                role=role,
-                content=content,
-                metadata={'generated': True}
-            )
-
-        print(f"  - Added {len(conv_data['messages'])} messages")
+    # Write everything in batched transactions instead of two commits per message
+    stats = db.import_conversations(conversations)
+    print(f"\nImported {stats['messages']} messages in {stats['seconds']:.3f}s "
+          f"({stats['rows_per_sec']:.0f} rows/sec)")
 
     print(f"\nSuccessfully created {len(conversations)} conversations")
 
@@ -1,32 +1,45 @@
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import PromptTemplate, load_prompt
 from dotenv import load_dotenv
+from response_cache import SQLiteResponseCache
+from summary_options import PAPERS, STYLES, LENGTHS, TEMPLATE_PATH, TEMPLATE_VARIABLES
+from template_registry import registry
 import streamlit as st
 import os
 
 load_dotenv()
 
-model = ChatOpenAI(model='gpt-4o', max_tokens=2000)
+
+@st.cache_resource
+def get_response_cache():
+    """Response cache shared by every session and rerun"""
+    return SQLiteResponseCache()
+
+
+@st.cache_resource
+def get_model():
+    """Chat model shared by every session and rerun, so its HTTP client is created once"""
+    # Repeated (paper, style, length) requests are answered from the cache
+    if os.getenv('USE_FAKE_LLM'):
+        # Offline mode for testing cache hit rates and latency without an API key
+        from fake_chat_model import FakeChatModel
+        return FakeChatModel(latency=float(os.getenv('FAKE_LLM_LATENCY', '1.0')), cache=get_response_cache())
+
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(model='gpt-4o', max_tokens=2000, cache=get_response_cache())
+
+
+model = get_model()
 
 st.header('Research Tool')
 
-paper_input = st.selectbox("Select Research Paper Name", ["Attention Is All You Need", 
-                                                          "BERT: Pre-training of Deep Bidirectional Transformers", 
-                                                          "GPT-3: Language Models are Few-Shot Learners", 
-                                                          "Diffusion Models Beat GANs on Image Synthesis"])
+paper_input = st.selectbox("Select Research Paper Name", PAPERS)
 
-style_input = st.selectbox("Select Summary Style", ["Beginner_Friendly",
-                                                     "Technical",
-                                                     "Code_Oriented",
-                                                     "Mathematical"])
+style_input = st.selectbox("Select Summary Style", STYLES)
 
-length_input = st.selectbox("Select Summary Length", ["Short (1-2 paragraphs)",
-                                                       "Medium (3-5 paragraphs)",
-                                                       "Long (detailed_explanation)"])
+length_input = st.selectbox("Select Summary Length", LENGTHS)
 
-# Template
+# Template, parsed once and re-read only when template.json changes
 
-template = load_prompt('template.json')
+template = registry.get_template(TEMPLATE_PATH, TEMPLATE_VARIABLES)
 
 #fill the placeholders
 prompt = template.invoke({
@@ -38,4 +51,5 @@ prompt = template.invoke({
 
 if st.button('Summarize'):
     result = model.invoke(prompt)
-    st.write(result.content)
\ No newline at end of file
+    st.write(result.content)
+    st.caption(f"Response cache hit rate: {get_response_cache().stats()['hit_rate']:.0%}")
\ No newline at end of file
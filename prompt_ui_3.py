@@ -1,38 +1,88 @@
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import PromptTemplate, load_prompt
 from dotenv import load_dotenv
+from response_cache import SQLiteResponseCache, stream_with_cache
+from summary_options import PAPERS, STYLES, LENGTHS, TEMPLATE_PATH, TEMPLATE_VARIABLES
+from template_registry import registry
+from summary_store import SummaryStore
+from streaming import timed_stream
 import streamlit as st
+import asyncio
 import os
+import tempfile
 
 load_dotenv()
 
-model = ChatOpenAI(model='gpt-4o', max_tokens=2000)
+
+@st.cache_resource
+def get_response_cache():
+    """Response cache shared by every session and rerun"""
+    return SQLiteResponseCache()
+
+
+@st.cache_resource
+def get_model():
+    """Chat model shared by every session and rerun, so its HTTP client is created once"""
+    from llm_scheduler import scheduled
+    from model_router import build_router
+
+    # Providers come from LLM_PROVIDERS; USE_FAKE_LLM is an offline mode for testing
+    # cache hit rates and latency without an API key
+    spec = f"fake:{os.getenv('FAKE_LLM_LATENCY', '1.0')}" if os.getenv('USE_FAKE_LLM') else None
+    model = build_router(spec, max_tokens=2000)
+    # Every session queues through one scheduler; repeated (paper, style, length)
+    # requests are answered from the cache without taking a rate-limit slot
+    return scheduled(model, cache=get_response_cache())
+
+
+model = get_model()
 
 st.header('Research Tool')
 
-paper_input = st.selectbox("Select Research Paper Name", ["Attention Is All You Need", 
-                                                          "BERT: Pre-training of Deep Bidirectional Transformers", 
-                                                          "GPT-3: Language Models are Few-Shot Learners", 
-                                                          "Diffusion Models Beat GANs on Image Synthesis"])
+paper_input = st.selectbox("Select Research Paper Name", PAPERS)
+
+style_input = st.selectbox("Select Summary Style", STYLES)
 
-style_input = st.selectbox("Select Summary Style", ["Beginner_Friendly",
-                                                     "Technical",
-                                                     "Code_Oriented",
-                                                     "Mathematical"])
+length_input = st.selectbox("Select Summary Length", LENGTHS)
 
-length_input = st.selectbox("Select Summary Length", ["Short (1-2 paragraphs)",
-                                                       "Medium (3-5 paragraphs)",
-                                                       "Long (detailed_explanation)"])
+paper_file = st.file_uploader("Upload the paper (optional)", type=['pdf', 'txt'])
 
-# Template
+# Summary template, reloaded only when template.json changes
 
-template = load_prompt('template.json')
+template = registry.get_template(TEMPLATE_PATH, TEMPLATE_VARIABLES)
 
 if st.button('Summarize'):
-    chain = template | model
-    result = chain.invoke({
-    'a':paper_input,
-    'b':style_input,
-    'c':length_input
-})
-    st.write(result.content)
\ No newline at end of file
+    if paper_file is not None:
+        # Summarize the full paper text map-reduce style instead of relying on the title
+        from paper_ingest import summarize_paper
+
+        suffix = os.path.splitext(paper_file.name)[1]
+        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+            tmp.write(paper_file.getbuffer())
+        try:
+            with st.spinner('Summarizing the full paper...'), SummaryStore() as store:
+                summary = asyncio.run(summarize_paper(
+                    tmp.name, paper_input, style_input, length_input,
+                    model, store, model.model_name
+                ))
+        finally:
+            os.remove(tmp.name)
+        st.write(summary)
+    else:
+        # Summaries precomputed by batch_summarize.py are shown without calling the model
+        with SummaryStore() as store:
+            summary = store.get_summary(paper_input, style_input, length_input)
+
+        if summary is not None:
+            st.write(summary)
+            st.caption("Precomputed summary")
+        else:
+            # Render tokens as they arrive instead of waiting for the whole summary;
+            # streaming skips LangChain's cache, so stream_with_cache checks it first
+            summary = st.write_stream(timed_stream(stream_with_cache(model, template.invoke({
+            'a':paper_input,
+            'b':style_input,
+            'c':length_input
+        })), label='summarize'))
+            # Persist the finished summary once, so the next request is served from the store
+            with SummaryStore() as store:
+                store.save_summary(paper_input, style_input, length_input, summary, model.model_name)
+            st.caption(f"Response cache hit rate: {get_response_cache().stats()['hit_rate']:.0%}")
\ No newline at end of file
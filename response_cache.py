@@ -0,0 +1,188 @@
+"""
+LLM Response Cache Module
+SQLite-backed LangChain cache with TTL and size-based eviction, plus
+stream_with_cache for streamed calls, which LangChain does not cache
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional, Sequence
+
+from langchain_core.caches import BaseCache
+from langchain_core.language_models import BaseChatModel
+from langchain_core.load import dumps, loads
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, Generation
+
+
+class SQLiteResponseCache(BaseCache):
+    """
+    Persistent cache of model responses keyed on model, parameters and prompt
+
+    LangChain passes every chat model call through the configured cache with the
+    rendered prompt and an llm_string that encodes the model name and its
+    parameters, so the cache works for direct model.invoke calls and for
+    template | model chains alike.
+    """
+
+    def __init__(self, db_path: str = "llm_cache.db", ttl_seconds: Optional[float] = 7 * 24 * 3600,
+                 max_bytes: int = 64 * 1024 * 1024):
+        """
+        Args:
+            db_path: Path to the SQLite file holding cached responses
+            ttl_seconds: Age after which an entry is ignored and removed, None keeps entries forever
+            max_bytes: Upper bound on the total size of cached responses, least recently
+                used entries are evicted beyond it
+        """
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # Streamlit serves each session from its own thread, so share one connection under a lock
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,  -- sha256 of llm_string and prompt
+                value TEXT NOT NULL,   -- JSON list of serialized generations
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        ''')
+        self.conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_responses_last_access
+            ON responses(last_access)
+        ''')
+        self.conn.commit()
+        self._bytes = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        """Hash the model description and prompt into a fixed-size key"""
+        return hashlib.sha256(f'{llm_string}\x00{prompt}'.encode('utf-8')).hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[Sequence[Generation]]:
+        """Return the cached generations for a prompt, or None on a miss"""
+        key = self._key(prompt, llm_string)
+        now = time.time()
+
+        with self._lock:
+            row = self.conn.execute(
+                'SELECT value, size, created_at FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+
+            if row is not None and self.ttl_seconds is not None and now - row[2] > self.ttl_seconds:
+                self.conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+                self.conn.commit()
+                self._bytes -= row[1]
+                row = None
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.conn.execute('UPDATE responses SET last_access = ? WHERE key = ?', (now, key))
+            self.conn.commit()
+
+        return [loads(generation) for generation in json.loads(row[0])]
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Generation]) -> None:
+        """Store the generations for a prompt and evict old entries if over budget"""
+        value = json.dumps([dumps(generation) for generation in return_val])
+        size = len(value.encode('utf-8'))
+        key = self._key(prompt, llm_string)
+        now = time.time()
+
+        with self._lock:
+            old = self.conn.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            self.conn.execute('''
+                INSERT OR REPLACE INTO responses (key, value, size, created_at, last_access)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (key, value, size, now, now))
+            self._bytes += size - (old[0] if old else 0)
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes"""
+        while self._bytes > self.max_bytes:
+            rows = self.conn.execute(
+                'SELECT key, size FROM responses ORDER BY last_access ASC LIMIT 100'
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if self._bytes <= self.max_bytes:
+                    break
+                self.conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+                self._bytes -= size
+                self.evictions += 1
+
+    def clear(self, **kwargs: Any) -> None:
+        """Remove every cached response"""
+        with self._lock:
+            self.conn.execute('DELETE FROM responses')
+            self.conn.commit()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss/eviction counters and the current size"""
+        with self._lock:
+            entries = self.conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': entries,
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes
+            }
+
+    def close(self):
+        """Close the cache database"""
+        self.conn.close()
+
+
+def stream_with_cache(model: BaseChatModel, prompt: Any) -> Iterator[str]:
+    """
+    Stream a chat model's reply as text through the model's response cache
+
+    model.stream() never consults the cache, only invoke() does. A cached reply
+    is yielded whole without calling the model; a streamed reply is stored once
+    it is complete. Entries use the keys invoke() uses, so both paths share them.
+
+    Args:
+        model: Chat model, its cache field holds the BaseCache to use
+        prompt: Anything model.stream() accepts, e.g. a rendered PromptValue
+    """
+    cache = model.cache if isinstance(model.cache, BaseCache) else None
+    if cache is None:
+        for chunk in model.stream(prompt):
+            yield chunk.content
+        return
+
+    # Same normalization and key as BaseChatModel._generate_with_cache
+    messages = [message.model_copy(update={'id': None}) if getattr(message, 'id', None) is not None else message
+                for message in model._convert_input(prompt).to_messages()]
+    key, llm_string = dumps(messages), model._get_llm_string()
+    cached = cache.lookup(key, llm_string)
+    if cached:
+        yield cached[0].text
+        return
+
+    parts = []
+    for chunk in model.stream(messages):
+        parts.append(chunk.content)
+        yield chunk.content
+    cache.update(key, llm_string, [ChatGeneration(message=AIMessage(content=''.join(parts)))])
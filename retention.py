@@ -0,0 +1,383 @@
+"""
+Retention Module
+Keeps chat_history.db small by moving conversations that have been idle longer
+than a configurable age into per-month archive databases next to it
+(chat_history.archive-2025-01.db, ...). The hot database only holds active
+sessions, so its queries stay fast however much history accumulates; archived
+conversations remain readable and searchable through ATTACH.
+
+Usage:
+    python3 retention.py --max-idle-days 90
+    python3 retention.py --restore session_001
+"""
+
+import argparse
+import glob
+import logging
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from chat_database import ChatDatabase
+
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_COLUMNS = 'id, conversation_id, role, content, timestamp, metadata, metadata_id'
+CONVERSATION_COLUMNS = 'id, session_id, title, created_at, updated_at, metadata'
+SUMMARY_COLUMNS = 'conversation_id, summary, covered_messages, updated_at'
+
+
+class RetentionManager:
+    """Moves idle conversations between a hot ChatDatabase and monthly archive databases"""
+
+    def __init__(self, db: ChatDatabase, archive_dir: Optional[str] = None, max_idle_days: int = 90):
+        """
+        Args:
+            db: Hot database; archives are written through its writer connection
+            archive_dir: Directory of the archive files, defaults to the database's directory
+            max_idle_days: Conversations not updated for this many days are archived
+        """
+        self.db = db
+        self.max_idle_days = max_idle_days
+        base = os.path.splitext(os.path.basename(db.db_path))[0]
+        self.archive_dir = archive_dir or os.path.dirname(os.path.abspath(db.db_path))
+        self.archive_prefix = os.path.join(self.archive_dir, f'{base}.archive-')
+
+    def archive_path(self, month: str) -> str:
+        """Archive file for a 'YYYY-MM' month"""
+        return f'{self.archive_prefix}{month}.db'
+
+    def archive_months(self) -> List[str]:
+        """Months that have an archive file, newest first"""
+        pattern = re.compile(re.escape(self.archive_prefix) + r'(\d{4}-\d{2})\.db$')
+        months = [pattern.match(path) for path in glob.glob(f'{glob.escape(self.archive_prefix)}*.db')]
+        return sorted((match.group(1) for match in months if match), reverse=True)
+
+    def archive_idle(self, max_idle_days: Optional[int] = None, now: Optional[datetime] = None) -> Dict[str, int]:
+        """
+        Move every conversation idle for longer than max_idle_days into its month's archive
+
+        Conversations are filed by the month of their last update. Each month is
+        moved in one transaction spanning both files, so a conversation is never
+        in both databases or in neither.
+
+        Returns:
+            Number of conversations archived per month
+        """
+        days = self.max_idle_days if max_idle_days is None else max_idle_days
+        cutoff = ((now or datetime.now(timezone.utc)) - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+
+        cursor = self.db._read_cursor()
+        # Served by idx_conversations_updated, only the idle range is read
+        cursor.execute('''
+            SELECT substr(updated_at, 1, 7) AS month, COUNT(*) AS conversations
+            FROM conversations
+            WHERE updated_at < ?
+            GROUP BY month
+        ''', (cutoff,))
+        months = {row['month']: row['conversations'] for row in cursor.fetchall()}
+
+        for month in months:
+            with self._attached([self.archive_path(month)], create=True) as (schema,):
+                self._move(f'''
+                    SELECT id FROM main.conversations
+                    WHERE updated_at < ? AND substr(updated_at, 1, 7) = ?
+                ''', (cutoff, month), source='main', target=schema)
+            logger.info("Archived %d conversations to %s", months[month], self.archive_path(month))
+        return months
+
+    def restore_conversation(self, session_id: str) -> bool:
+        """
+        Move an archived conversation back into the hot database, return False if not archived
+
+        A session that was resumed after archiving already has a new conversation
+        in the hot database; the archived history is merged into it. Parts of the
+        session archived in several months are all restored.
+        """
+        restored = False
+        for month in self.archive_months():
+            with self._attached([self.archive_path(month)]) as (schema,):
+                row = self.db.conn.execute(f'''
+                    SELECT id FROM {schema}.conversations WHERE session_id = ?
+                ''', (session_id,)).fetchone()
+                if row is None:
+                    continue
+                self._move(f'SELECT id FROM {schema}.conversations WHERE session_id = ?',
+                           (session_id,), source=schema, target='main')
+                restored = True
+        if restored and self.db.history_cache is not None:
+            self.db.history_cache.invalidate(self.db.db_path, session_id)
+        return restored
+
+    def get_conversation_messages(self, session_id: str) -> List[Tuple[str, str]]:
+        """Messages of a session from the hot database and every archive holding part of it"""
+        with self.db._write_lock:
+            rows = self._session_messages('main', session_id)
+        for schemas in self._archive_groups():
+            with self._attached(schemas) as attached:
+                for schema in attached:
+                    rows.extend(self._session_messages(schema, session_id))
+        # Message IDs come from the hot database's sequence, so they are in conversation order
+        rows.sort(key=lambda row: row['id'])
+        return [(row['role'], self.db.codec.decode(row['content'])) for row in rows]
+
+    def _session_messages(self, schema: str, session_id: str) -> List[sqlite3.Row]:
+        """Message rows of a session in one attached database"""
+        return self.db.conn.execute(f'''
+            SELECT m.id, m.role, m.content
+            FROM {schema}.messages m
+            JOIN {schema}.conversations c ON m.conversation_id = c.id
+            WHERE c.session_id = ?
+        ''', (session_id,)).fetchall()
+
+    def search_messages(self, query: str, limit: int = 20) -> List[Dict]:
+        """Full-text search over the hot database and every archive, best matches first"""
+        match_expr = self.db._fts_match_expression(query)
+        if not self.db.fts_enabled or match_expr is None:
+            return self.db.search_messages(query, limit)
+
+        ranked = [(result.pop('rank'), result) for result in self._search_schema('main', match_expr, limit)]
+        for schemas in self._archive_groups():
+            with self._attached(schemas) as attached:
+                for schema in attached:
+                    ranked.extend((result.pop('rank'), result)
+                                  for result in self._search_schema(schema, match_expr, limit))
+        # BM25 scores are negative, lower is better
+        ranked.sort(key=lambda item: item[0])
+        return [result for _, result in ranked[:limit]]
+
+    def _search_schema(self, schema: str, match_expr: str, limit: int) -> List[Dict]:
+        """Run the FTS query against one attached database"""
+        with self.db._write_lock:
+            rows = self.db.conn.execute(f'''
+                SELECT m.role, m.content, m.timestamp, c.session_id, c.title,
+                       snippet(messages_fts, 0, '[', ']', '...', 16) AS snippet,
+                       bm25(messages_fts) AS rank
+                FROM {schema}.messages_fts
+                JOIN {schema}.messages m ON m.id = messages_fts.rowid
+                JOIN {schema}.conversations c ON m.conversation_id = c.id
+                WHERE messages_fts MATCH ?
+                ORDER BY rank
+                LIMIT ?
+            ''', (match_expr, limit)).fetchall()
+
+        results = []
+        for row in rows:
+            result = self.db._search_result(row, row['snippet'], self.db.codec.decode(row['content']))
+            result['rank'] = row['rank']
+            results.append(result)
+        return results
+
+    def _archive_groups(self) -> Iterator[List[str]]:
+        """Archive paths, newest first, in groups small enough to attach at once"""
+        paths = [self.archive_path(month) for month in self.archive_months()]
+        # SQLite caps attached databases (10 by default)
+        size = max(1, self.db.conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED) - 1)
+        for start in range(0, len(paths), size):
+            yield paths[start:start + size]
+
+    @contextmanager
+    def _attached(self, paths: List[str], create: bool = False):
+        """Attach archive files to the writer connection for the duration of the block"""
+        with self.db._write_lock:
+            schemas = []
+            try:
+                for index, path in enumerate(paths):
+                    if create and not os.path.exists(path):
+                        self._create_archive(path)
+                    schema = f'archive{index}'
+                    self.db.conn.execute('ATTACH DATABASE ? AS ' + schema, (path,))
+                    schemas.append(schema)
+                yield schemas
+            finally:
+                for schema in schemas:
+                    self.db.conn.execute(f'DETACH DATABASE {schema}')
+
+    def _create_archive(self, path: str):
+        """Create an archive database with the full ChatDatabase schema"""
+        # Compressed rows are copied verbatim, so the archive's search index must decode
+        # content; a compression mode gives it the decoding triggers in every case
+        with ChatDatabase(path, compression=self.db.codec.algorithm or 'zlib'):
+            pass
+
+    def _move(self, id_query: str, params: Tuple, source: str, target: str):
+        """
+        Copy the selected conversations with their messages between schemas, then delete them
+
+        A session can reach a database that already holds it, e.g. when it was
+        resumed after archiving (the new hot conversation meets the archived one
+        on restore, or the archive's copy when it goes idle again). Such a pair
+        is merged into the target's conversation: messages keep their IDs, so the
+        combined history stays in order, and only the older conversation's
+        summary is kept, since it covers the leading messages of the merge.
+        """
+        conn = self.db.conn
+        try:
+            conn.execute('CREATE TEMP TABLE IF NOT EXISTS moving (id INTEGER PRIMARY KEY, target_id INTEGER)')
+            conn.execute('DELETE FROM temp.moving')
+            conn.execute(f'INSERT INTO temp.moving (id) {id_query}', params)
+            # Conversations whose session already exists in the target are merged into it
+            conn.execute(f'''
+                UPDATE temp.moving SET target_id = (
+                    SELECT t.id FROM {target}.conversations t
+                    JOIN {source}.conversations s ON s.session_id = t.session_id
+                    WHERE s.id = temp.moving.id
+                )
+            ''')
+            conn.execute(f'''
+                UPDATE {target}.conversations AS t SET
+                    title = COALESCE(t.title, s.title),
+                    created_at = MIN(t.created_at, s.created_at),
+                    updated_at = MAX(t.updated_at, s.updated_at),
+                    metadata = COALESCE(t.metadata, s.metadata)
+                FROM temp.moving mv JOIN {source}.conversations s ON s.id = mv.id
+                WHERE t.id = mv.target_id
+            ''')
+
+            # Dictionaries and interned metadata are shared by all rows, copy them wholesale
+            conn.execute(f'''
+                INSERT OR IGNORE INTO {target}.compression_dictionaries
+                SELECT * FROM {source}.compression_dictionaries
+            ''')
+            conn.execute(f'''
+                INSERT OR IGNORE INTO {target}.message_metadata (id, json)
+                SELECT id, json FROM {source}.message_metadata
+                WHERE id IN (SELECT metadata_id FROM {source}.messages
+                             WHERE conversation_id IN (SELECT id FROM temp.moving))
+            ''')
+            conn.execute(f'''
+                INSERT INTO {target}.conversations ({CONVERSATION_COLUMNS})
+                SELECT {CONVERSATION_COLUMNS} FROM {source}.conversations
+                WHERE id IN (SELECT id FROM temp.moving WHERE target_id IS NULL)
+            ''')
+            conn.execute(f'''
+                INSERT INTO {target}.messages ({MESSAGE_COLUMNS})
+                SELECT m.id, COALESCE(mv.target_id, mv.id), m.role, m.content, m.timestamp,
+                       m.metadata, m.metadata_id
+                FROM {source}.messages m JOIN temp.moving mv ON m.conversation_id = mv.id
+            ''')
+            # A newer conversation's summary no longer covers the leading messages of the merge
+            conn.execute(f'''
+                DELETE FROM {target}.conversation_summaries
+                WHERE conversation_id IN (SELECT target_id FROM temp.moving WHERE target_id > id)
+            ''')
+            conn.execute(f'''
+                INSERT INTO {target}.conversation_summaries ({SUMMARY_COLUMNS})
+                SELECT COALESCE(mv.target_id, mv.id), s.summary, s.covered_messages, s.updated_at
+                FROM {source}.conversation_summaries s JOIN temp.moving mv ON s.conversation_id = mv.id
+                WHERE mv.target_id IS NULL OR mv.target_id > mv.id
+            ''')
+            for table, key in (('messages', 'conversation_id'), ('conversation_summaries', 'conversation_id'),
+                               ('conversations', 'id')):
+                conn.execute(f'''
+                    DELETE FROM {source}.{table} WHERE {key} IN (SELECT id FROM temp.moving)
+                ''')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        if source == 'main':
+            # Archived sessions must not be served from memory any more
+            self.db.forget_conversation_ids()
+            if self.db.history_cache is not None:
+                self.db.history_cache.clear()
+
+
+class VacuumScheduler:
+    """Background thread that archives idle conversations and compacts the hot database"""
+
+    def __init__(self, db: ChatDatabase, retention: Optional[RetentionManager] = None,
+                 interval_seconds: float = 3600, min_free_ratio: float = 0.2):
+        """
+        Args:
+            db: Database to compact
+            retention: Archives idle conversations before each compaction, if given
+            interval_seconds: Time between runs
+            min_free_ratio: VACUUM only when at least this share of pages is free
+        """
+        self.db = db
+        self.retention = retention
+        self.interval_seconds = interval_seconds
+        self.min_free_ratio = min_free_ratio
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run_once(self) -> Dict[str, object]:
+        """Archive, optimize the search index and VACUUM if enough pages are free"""
+        report = {'archived': {}, 'vacuumed': False}
+        if self.retention is not None:
+            report['archived'] = self.retention.archive_idle()
+
+        with self.db._write_lock:
+            conn = self.db.conn
+            if self.db.fts_enabled:
+                # Merge the index's b-trees after many deletes, this frees most of its pages
+                conn.execute("INSERT INTO messages_fts(messages_fts) VALUES ('optimize')")
+                conn.commit()
+
+            page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+            free_pages = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            report['free_ratio'] = free_pages / page_count if page_count else 0.0
+            if report['free_ratio'] >= self.min_free_ratio:
+                try:
+                    conn.execute('VACUUM')
+                    report['vacuumed'] = True
+                except sqlite3.OperationalError as exc:
+                    # A reader held the database for longer than busy_timeout, retry next run
+                    logger.warning("VACUUM skipped: %s", exc)
+            conn.execute('PRAGMA optimize')
+        return report
+
+    def start(self):
+        """Run in a daemon thread every interval_seconds until stop() is called"""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name='chat-db-vacuum', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the background thread, waiting for a run in progress"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _loop(self):
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                report = self.run_once()
+                logger.info("Maintenance run: %s", report)
+            except Exception:
+                logger.exception("Maintenance run failed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Archive idle conversations into monthly databases')
+    parser.add_argument('--db', default='chat_history.db', help='Hot chat history database')
+    parser.add_argument('--archive-dir', help='Directory of the archive files (default: next to the database)')
+    parser.add_argument('--max-idle-days', type=int, default=90, help='Archive conversations idle this long')
+    parser.add_argument('--restore', metavar='SESSION_ID', help='Move an archived session back instead')
+    args = parser.parse_args()
+
+    with ChatDatabase(args.db) as db:
+        retention = RetentionManager(db, args.archive_dir, args.max_idle_days)
+        if args.restore:
+            found = retention.restore_conversation(args.restore)
+            print(f"Restored {args.restore}" if found else f"{args.restore} is not in any archive")
+            return
+
+        archived = retention.archive_idle()
+        for month, count in sorted(archived.items()):
+            print(f"  {month}: {count} conversations -> {retention.archive_path(month)}")
+        report = VacuumScheduler(db, min_free_ratio=0.0).run_once()
+        print(f"Archived {sum(archived.values())} conversations, vacuumed: {report['vacuumed']}")
+
+
+if __name__ == '__main__':
+    main()
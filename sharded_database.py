@@ -0,0 +1,591 @@
+"""
+Sharded Chat Database Module
+Spreads conversations over several SQLite files, so writers to different shards
+never wait on the same lock. Each session_id is routed to one shard by consistent
+hashing, so changing the shard count moves only the sessions whose owner changes
+(about 1/N of them when a shard is added).
+
+ShardedChatDatabase offers the ChatDatabase methods. Calls that name a session
+or a conversation go to its shard. get_recent_conversations, search_messages
+and stats query all shards in parallel and merge the results.
+
+A shard directory holds shard-000.db, shard-001.db, ... plus shards.json, which
+records the shard count. Conversation and message IDs carry their shard number
+in the low SHARD_BITS bits, so they are unique across the whole set.
+
+Usage:
+    python3 sharded_database.py init chat_shards --shards 8
+    python3 sharded_database.py rebalance chat_shards --shards 12
+    python3 sharded_database.py stats chat_shards
+"""
+
+import argparse
+import bisect
+import hashlib
+import heapq
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from chat_database import ChatDatabase
+from history_cache import HistoryCache
+
+logger = logging.getLogger(__name__)
+
+
+MANIFEST = 'shards.json'
+DEFAULT_SHARDS = 4
+DEFAULT_VNODES = 64
+
+# Low bits of every conversation and message ID hold the shard number
+SHARD_BITS = 10
+MAX_SHARDS = 1 << SHARD_BITS
+
+
+def shard_path(directory: str, index: int) -> str:
+    return os.path.join(directory, f'shard-{index:03d}.db')
+
+
+def read_manifest(directory: str) -> Optional[Dict[str, int]]:
+    """Shard count and virtual nodes of a shard directory, None if it has no manifest"""
+    path = os.path.join(directory, MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_manifest(directory: str, shards: int, vnodes: int):
+    """Replace the manifest atomically, so readers see the old or the new shard count"""
+    path = os.path.join(directory, MANIFEST)
+    with open(path + '.tmp', 'w') as f:
+        json.dump({'shards': shards, 'vnodes': vnodes}, f)
+    os.replace(path + '.tmp', path)
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """Consistent hash ring mapping keys to shard numbers through virtual nodes"""
+
+    def __init__(self, shards: int, vnodes: int = DEFAULT_VNODES):
+        points = sorted((_hash(f'shard-{index}#{node}'), index)
+                        for index in range(shards) for node in range(vnodes))
+        self.shards = shards
+        self._hashes = [point for point, _ in points]
+        self._owners = [index for _, index in points]
+
+    def shard_for(self, key: str) -> int:
+        position = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._owners[position]
+
+
+def to_global(local_id: int, shard: int) -> int:
+    """Set-wide ID of a row of one shard; IDs of one shard keep their order"""
+    return local_id << SHARD_BITS | shard
+
+
+def split_id(global_id: int) -> Tuple[int, int]:
+    """(shard, local ID) of a set-wide ID"""
+    return global_id & (MAX_SHARDS - 1), global_id >> SHARD_BITS
+
+
+class ShardedChatDatabase:
+    """ChatDatabase interface over a directory of SQLite shards"""
+
+    def __init__(self, directory: str, shards: Optional[int] = None, vnodes: Optional[int] = None,
+                 pooled: bool = True, history_cache: Optional[HistoryCache] = None, **shard_kwargs):
+        """
+        Open a shard directory, creating it with the given shard count if it is new
+
+        Args:
+            directory: Folder holding the shard files and shards.json
+            shards: Shard count of a new directory (default 4); an existing one must
+                match its manifest, change it with rebalance()
+            vnodes: Virtual nodes per shard on the hash ring of a new directory
+            pooled: Open shards in pooled WAL mode; required for the parallel
+                fan-out and for using the instance from several threads
+            history_cache: Cache of formatted history kept up to date on writes
+            **shard_kwargs: Passed to every shard's ChatDatabase (busy_timeout,
+                synchronous, compression, metrics, ...)
+        """
+        os.makedirs(directory, exist_ok=True)
+        manifest = read_manifest(directory)
+        if manifest is None:
+            manifest = {'shards': shards or DEFAULT_SHARDS, 'vnodes': vnodes or DEFAULT_VNODES}
+            if not 1 <= manifest['shards'] <= MAX_SHARDS:
+                raise ValueError(f"Shard count must be between 1 and {MAX_SHARDS}")
+            write_manifest(directory, manifest['shards'], manifest['vnodes'])
+        elif shards is not None and shards != manifest['shards']:
+            raise ValueError(f"{directory} has {manifest['shards']} shards, "
+                             f"use rebalance() to change it to {shards}")
+
+        self.db_path = directory
+        self.history_cache = history_cache
+        self.vector_index = None
+        self.ring = HashRing(manifest['shards'], manifest['vnodes'])
+        self.shards = [ChatDatabase(shard_path(directory, index), pooled=pooled, **shard_kwargs)
+                       for index in range(manifest['shards'])]
+        # Non-pooled connections are bound to the opening thread, query them in turn
+        self._executor = (ThreadPoolExecutor(max_workers=len(self.shards), thread_name_prefix='chat-shard')
+                          if pooled and len(self.shards) > 1 else None)
+
+    def shard_for(self, session_id: str) -> int:
+        """Shard number owning a session"""
+        return self.ring.shard_for(session_id)
+
+    def _session_shard(self, session_id: str) -> Tuple[int, ChatDatabase]:
+        index = self.ring.shard_for(session_id)
+        return index, self.shards[index]
+
+    def _fan_out(self, call: Callable[[ChatDatabase], Any]) -> List[Any]:
+        """Run call on every shard, in parallel when pooled, results in shard order"""
+        if self._executor is None:
+            return [call(shard) for shard in self.shards]
+        return list(self._executor.map(call, self.shards))
+
+    @staticmethod
+    def _global_rows(rows: Iterable[Tuple[int, str, str]], index: int) -> List[Tuple[int, str, str]]:
+        return [(to_global(message_id, index), role, content) for message_id, role, content in rows]
+
+    def create_conversation(self, session_id: str, title: Optional[str] = None,
+                            metadata: Optional[Dict] = None) -> int:
+        """Create a new conversation and return its ID, or the existing ID of a known session"""
+        index, shard = self._session_shard(session_id)
+        return to_global(shard.create_conversation(session_id, title, metadata), index)
+
+    def get_or_create_conversation_with_history(self, session_id: str, title: Optional[str] = None,
+                                                metadata: Optional[Dict] = None,
+                                                since_id: int = 0) -> Tuple[int, List[Tuple[int, str, str]]]:
+        """Return a session's conversation ID with its messages newer than since_id, creating it if needed"""
+        index, shard = self._session_shard(session_id)
+        conversation_id, rows = shard.get_or_create_conversation_with_history(
+            session_id, title, metadata, split_id(since_id)[1]
+        )
+        return to_global(conversation_id, index), self._global_rows(rows, index)
+
+    def add_message(self, conversation_id: int, role: str, content: str,
+                    metadata: Optional[Dict] = None) -> int:
+        """Add a message to a conversation"""
+        return self.add_messages(conversation_id, [(role, content, metadata)])[0]
+
+    def add_messages(self, conversation_id: int, messages: List[Tuple]) -> List[int]:
+        """Add several messages to a conversation in a single transaction"""
+        return self.add_message_groups([(conversation_id, messages)])[0]
+
+    def add_message_groups(self, groups: List[Tuple[int, List[Tuple]]]) -> List[List[int]]:
+        """
+        Add messages to several conversations, one transaction per shard involved
+
+        Groups on different shards are committed separately, so a failure can
+        leave the groups of earlier shards written.
+        """
+        by_shard: Dict[int, List[Tuple[int, int, List[Tuple]]]] = {}
+        for position, (conversation_id, messages) in enumerate(groups):
+            index, local_id = split_id(conversation_id)
+            by_shard.setdefault(index, []).append((position, local_id, messages))
+
+        results: List[List[int]] = [[] for _ in groups]
+        for index, items in by_shard.items():
+            shard_ids = self.shards[index].add_message_groups([(local_id, messages) for _, local_id, messages in items])
+            for (position, _, _), ids in zip(items, shard_ids):
+                results[position] = [to_global(message_id, index) for message_id in ids]
+
+        if self.history_cache is not None:
+            for (conversation_id, messages), ids in zip(groups, results):
+                for message_id, message in zip(ids, messages):
+                    self.history_cache.on_message_added(self.db_path, conversation_id, message_id,
+                                                        message[0], message[1])
+        return results
+
+    def add_messages_bulk(self, messages: Iterable[Tuple], batch_size: int = 1000) -> Dict:
+        """Insert many (conversation_id, role, content[, metadata]) messages, batched per shard"""
+        start = time.perf_counter()
+        batches: Dict[int, List[Tuple]] = {}
+        touched = set()
+        total = 0
+
+        def flush(index):
+            nonlocal total
+            total += self.shards[index].add_messages_bulk(batches.pop(index), batch_size)['messages']
+
+        for message in messages:
+            index, local_id = split_id(message[0])
+            touched.add(message[0])
+            batch = batches.setdefault(index, [])
+            batch.append((local_id,) + tuple(message[1:]))
+            if len(batch) >= batch_size:
+                flush(index)
+        for index in list(batches):
+            flush(index)
+
+        if self.history_cache is not None:
+            # Bulk rows bypass the write-through path, so cached sessions must reload
+            for conversation_id in touched:
+                self.history_cache.invalidate_conversation(self.db_path, conversation_id)
+        stats = ChatDatabase._ingest_stats(start, conversations=len(touched), messages=total)
+        del stats['conversations']
+        return stats
+
+    def import_conversations(self, conversations: Iterable[Dict], batch_size: int = 1000) -> Dict:
+        """Import whole conversations (see ChatDatabase.import_conversations) into their shards"""
+        start = time.perf_counter()
+        buffers: Dict[int, List[Dict]] = {}
+        sizes: Dict[int, int] = {}
+        counts = {'conversations': 0, 'messages': 0}
+
+        def flush(index):
+            stats = self.shards[index].import_conversations(buffers.pop(index), batch_size)
+            sizes.pop(index)
+            counts['conversations'] += stats['conversations']
+            counts['messages'] += stats['messages']
+
+        for conversation in conversations:
+            index = self.ring.shard_for(conversation['session_id'])
+            # Messages may be a generator tied to the input stream, read them now
+            conversation = dict(conversation, messages=list(conversation.get('messages', ())))
+            buffers.setdefault(index, []).append(conversation)
+            sizes[index] = sizes.get(index, 0) + len(conversation['messages']) + 1
+            if self.history_cache is not None:
+                self.history_cache.invalidate(self.db_path, conversation['session_id'])
+            if sizes[index] >= batch_size:
+                flush(index)
+        for index in list(buffers):
+            flush(index)
+
+        return ChatDatabase._ingest_stats(start, **counts)
+
+    def get_conversation_messages(self, session_id: str) -> List[Tuple[str, str]]:
+        """Get all messages from a conversation by session ID"""
+        return self._session_shard(session_id)[1].get_conversation_messages(session_id)
+
+    def get_messages_since(self, session_id: str, since_id: int = 0) -> List[Tuple[int, str, str]]:
+        """Get (id, role, content) for messages of a session with an ID greater than since_id"""
+        index, shard = self._session_shard(session_id)
+        return self._global_rows(shard.get_messages_since(session_id, split_id(since_id)[1]), index)
+
+    def get_messages_page(self, session_id: str, after_id: int = 0,
+                          limit: int = 500) -> Tuple[List[Tuple[int, str, str]], Optional[int]]:
+        """Get one page of a conversation after a keyset cursor, and the next cursor"""
+        index, shard = self._session_shard(session_id)
+        rows, next_cursor = shard.get_messages_page(session_id, split_id(after_id)[1], limit)
+        return self._global_rows(rows, index), (to_global(next_cursor, index) if next_cursor is not None else None)
+
+    def iter_conversation_messages(self, session_id: str, batch_size: int = 500, since_id: int = 0,
+                                   last_n: Optional[int] = None) -> Iterator[List[Tuple[int, str, str]]]:
+        """Stream a conversation as batches of (id, role, content) rows in message order"""
+        index, shard = self._session_shard(session_id)
+        for batch in shard.iter_conversation_messages(session_id, batch_size, split_id(since_id)[1], last_n):
+            yield self._global_rows(batch, index)
+
+    def iter_all_messages(self, since_id: int = 0,
+                          batch_size: int = 5000) -> Iterator[List[Tuple[int, str, str]]]:
+        """
+        Stream (id, role, content) rows of every shard in global ID order, in batches
+
+        IDs of different shards are not in write order: a quiet shard's new rows
+        can sort below rows another shard wrote earlier. A watermark over this
+        stream therefore misses rows, which is why ShardedVectorIndex keeps one
+        index per shard instead.
+        """
+        def rows(index, shard):
+            # Global ID > since_id exactly when the local ID is above this bound
+            for batch in shard.iter_all_messages((since_id - index) >> SHARD_BITS, batch_size):
+                yield from self._global_rows(batch, index)
+
+        merged = heapq.merge(*(rows(index, shard) for index, shard in enumerate(self.shards)),
+                             key=lambda row: row[0])
+        batch = []
+        for row in merged:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def get_message_ids(self, session_id: str) -> List[int]:
+        """Get the IDs of all messages of a conversation in order"""
+        index, shard = self._session_shard(session_id)
+        return [to_global(message_id, index) for message_id in shard.get_message_ids(session_id)]
+
+    def get_messages_by_ids(self, message_ids: Iterable[int]) -> List[Tuple[int, str, str]]:
+        """Get (id, role, content) for the given message IDs, ordered by ID within each shard"""
+        by_shard: Dict[int, List[int]] = {}
+        for message_id in message_ids:
+            index, local_id = split_id(message_id)
+            by_shard.setdefault(index, []).append(local_id)
+        rows = []
+        for index in sorted(by_shard):
+            rows.extend(self._global_rows(self.shards[index].get_messages_by_ids(by_shard[index]), index))
+        return rows
+
+    def get_summary(self, conversation_id: int) -> Optional[Tuple[str, int]]:
+        """Get the rolling summary of a conversation and the number of messages it covers"""
+        index, local_id = split_id(conversation_id)
+        return self.shards[index].get_summary(local_id)
+
+    def save_summary(self, conversation_id: int, summary: str, covered_messages: int):
+        """Store the rolling summary of a conversation"""
+        index, local_id = split_id(conversation_id)
+        self.shards[index].save_summary(local_id, summary, covered_messages)
+
+    def get_recent_conversations(self, limit: int = 10) -> List[Dict]:
+        """Get the most recently updated conversations of all shards"""
+        merged = []
+        for index, conversations in enumerate(self._fan_out(lambda shard: shard.get_recent_conversations(limit))):
+            for conversation in conversations:
+                merged.append(dict(conversation, id=to_global(conversation['id'], index)))
+        merged.sort(key=lambda conversation: conversation['updated_at'], reverse=True)
+        return merged[:limit]
+
+    def delete_conversation(self, session_id: str):
+        """Delete a conversation and all its messages"""
+        self._session_shard(session_id)[1].delete_conversation(session_id)
+        if self.history_cache is not None:
+            self.history_cache.invalidate(self.db_path, session_id)
+
+    def search_messages(self, query: str, limit: int = 20) -> List[Dict]:
+        """Search all shards and merge the results, best BM25 matches first"""
+        results = [result for shard_results in self._fan_out(lambda shard: shard.search_messages(query, limit))
+                   for result in shard_results]
+        if all(result['rank'] is not None for result in results):
+            results.sort(key=lambda result: result['rank'])
+        else:
+            # Substring matches have no score, newest first like the single-file fallback
+            results.sort(key=lambda result: result['timestamp'] or '', reverse=True)
+        return results[:limit]
+
+    def export_conversation(self, session_id: str) -> Dict:
+        """Export a conversation in a structured format"""
+        return self._session_shard(session_id)[1].export_conversation(session_id)
+
+    def iter_export_rows(self, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """Stream every message of every shard as flat rows, grouped by conversation"""
+        for shard in self.shards:
+            yield from shard.iter_export_rows(batch_size)
+
+    def stats(self) -> Dict[str, Any]:
+        """Row counts summed over the shards, plus the per-shard split"""
+        per_shard = self._fan_out(lambda shard: shard.stats())
+        by_role: Dict[str, int] = {}
+        for stats in per_shard:
+            for role, count in stats['messages_by_role'].items():
+                by_role[role] = by_role.get(role, 0) + count
+        return {
+            'conversations': sum(stats['conversations'] for stats in per_shard),
+            'messages': sum(stats['messages'] for stats in per_shard),
+            'messages_by_role': by_role,
+            'shards': [{'conversations': stats['conversations'], 'messages': stats['messages']}
+                       for stats in per_shard]
+        }
+
+    def close(self):
+        """Close every shard"""
+        if self._executor is not None:
+            self._executor.shutdown()
+        for shard in self.shards:
+            shard.close()
+
+    def __enter__(self):
+        """Context manager entry"""
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Context manager exit - ensure connections are closed"""
+        self.close()
+
+
+class ShardedVectorIndex:
+    """
+    VectorIndex interface over one index per shard, next to each shard file
+
+    VectorIndex needs IDs that only grow, which holds for local IDs within a
+    shard but not for global IDs across shards. Searches are split by the
+    shard of the requested IDs and the hits merged by score.
+    """
+
+    def __init__(self, db: ShardedChatDatabase, **index_kwargs):
+        from vector_index import VectorIndex
+        self.indexes = [VectorIndex(shard.db_path, **index_kwargs) for shard in db.shards]
+
+    def __len__(self) -> int:
+        return sum(len(index) for index in self.indexes)
+
+    def sync(self, db: ShardedChatDatabase, batch_size: int = 5000) -> int:
+        """Index every message each shard holds beyond its index, return the count"""
+        return sum(index.sync(shard, batch_size) for index, shard in zip(self.indexes, db.shards))
+
+    def add(self, ids: Sequence[int], texts: Sequence[str]):
+        """Append texts by global ID to the indexes of their shards"""
+        by_shard: Dict[int, Tuple[List[int], List[str]]] = {}
+        for global_id, text in zip(ids, texts):
+            index, local_id = split_id(global_id)
+            local_ids, local_texts = by_shard.setdefault(index, ([], []))
+            local_ids.append(local_id)
+            local_texts.append(text)
+        for index, (local_ids, local_texts) in by_shard.items():
+            self.indexes[index].add(local_ids, local_texts)
+
+    def search(self, query: str, k: int = 5,
+               ids: Optional[Iterable[int]] = None) -> List[Tuple[int, float]]:
+        """Return the k most similar (global id, cosine score) pairs, optionally only among the given IDs"""
+        if ids is None:
+            wanted = {index: None for index in range(len(self.indexes))}
+        else:
+            wanted = {}
+            for global_id in ids:
+                index, local_id = split_id(global_id)
+                wanted.setdefault(index, []).append(local_id)
+        hits = [(to_global(local_id, index), score)
+                for index, local_ids in wanted.items()
+                for local_id, score in self.indexes[index].search(query, k, ids=local_ids)]
+        return heapq.nlargest(k, hits, key=lambda hit: hit[1])
+
+
+def open_database(path: str, **kwargs):
+    """ChatDatabase for a database file, ShardedChatDatabase for a shard directory"""
+    if os.path.isdir(path):
+        return ShardedChatDatabase(path, **kwargs)
+    return ChatDatabase(path, **kwargs)
+
+
+def _session_summary(db: ChatDatabase, session_id: str) -> Optional[Tuple[str, int]]:
+    """(summary, covered_messages) stored for a session, None if it has none"""
+    cursor = db._read_cursor()
+    cursor.execute('''
+        SELECT s.summary, s.covered_messages
+        FROM conversation_summaries s
+        JOIN conversations c ON c.id = s.conversation_id
+        WHERE c.session_id = ?
+    ''', (session_id,))
+    row = cursor.fetchone()
+    return (row['summary'], row['covered_messages']) if row else None
+
+
+def rebalance(directory: str, shards: int, batch_size: int = 1000, **shard_kwargs) -> Dict[str, Any]:
+    """
+    Change the shard count of a directory, moving each session whose owner changes
+
+    A session moves with its messages, timestamps and rolling summary. Run it
+    while nothing else has the directory open. Sessions are copied to
+    their new shard, deleted from the old one, and only then is the manifest
+    switched. An interrupted run can simply be repeated: a partial copy left in
+    a target shard is replaced, not appended to.
+
+    Returns:
+        Old and new shard count, sessions moved and seconds taken
+    """
+    from conversation_archive import JSON_FIELDS, group_conversations
+
+    manifest = read_manifest(directory)
+    if manifest is None:
+        raise ValueError(f"{directory} is not a shard directory (no {MANIFEST})")
+    if not 1 <= shards <= MAX_SHARDS:
+        raise ValueError(f"Shard count must be between 1 and {MAX_SHARDS}")
+
+    start = time.perf_counter()
+    old_count, vnodes = manifest['shards'], manifest['vnodes']
+    ring = HashRing(shards, vnodes)
+    databases = [ChatDatabase(shard_path(directory, index), **shard_kwargs)
+                 for index in range(max(old_count, shards))]
+    moved = 0
+
+    def decoded(rows):
+        for row in rows:
+            for field in JSON_FIELDS:
+                if row[field] is not None:
+                    row[field] = json.loads(row[field])
+            yield row
+
+    try:
+        for index, source in enumerate(databases):
+            leaving = []
+            buffers: Dict[int, List[Dict]] = {}
+            summaries: Dict[str, Tuple[str, int]] = {}
+
+            def flush(target):
+                conversations = buffers.pop(target)
+                databases[target].import_conversations(conversations, batch_size)
+                for conversation in conversations:
+                    summary = summaries.pop(conversation['session_id'], None)
+                    if summary is not None:
+                        # Every message is copied in order, so the summary still covers the same ones
+                        conversation_id = databases[target].create_conversation(conversation['session_id'])
+                        databases[target].save_summary(conversation_id, *summary)
+
+            for conversation in group_conversations(decoded(source.iter_export_rows(batch_size))):
+                target = ring.shard_for(conversation['session_id'])
+                if target == index:
+                    continue
+                conversation['messages'] = list(conversation['messages'])
+                # Leftover of an interrupted run, the source still holds the full copy
+                databases[target].delete_conversation(conversation['session_id'])
+                summary = _session_summary(source, conversation['session_id'])
+                if summary is not None:
+                    summaries[conversation['session_id']] = summary
+                buffers.setdefault(target, []).append(conversation)
+                leaving.append(conversation['session_id'])
+                if sum(len(c['messages']) + 1 for c in buffers[target]) >= batch_size:
+                    flush(target)
+            for target in list(buffers):
+                flush(target)
+
+            for session_id in leaving:
+                source.delete_conversation(session_id)
+            if leaving:
+                logger.info("Moved %d sessions out of shard %d", len(leaving), index)
+            moved += len(leaving)
+
+        write_manifest(directory, shards, vnodes)
+    finally:
+        for database in databases:
+            database.close()
+
+    for index in range(shards, old_count):
+        # The shard's vector index files go with it, if retrieval mode built them
+        for suffix in ('', '-wal', '-shm', '.vectors.f32', '.vectors.ids', '.vectors.json'):
+            path = shard_path(directory, index) + suffix
+            if os.path.exists(path):
+                os.remove(path)
+
+    return {'from_shards': old_count, 'to_shards': shards, 'moved_sessions': moved,
+            'seconds': time.perf_counter() - start}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage a directory of chat database shards')
+    commands = parser.add_subparsers(dest='command', required=True)
+    for name, help_text in (('init', 'Create a shard directory'),
+                            ('rebalance', 'Change the shard count, moving sessions to their new shards'),
+                            ('stats', 'Print conversation and message counts per shard')):
+        command_parser = commands.add_parser(name, help=help_text)
+        command_parser.add_argument('directory', help='Shard directory')
+        if name != 'stats':
+            command_parser.add_argument('--shards', type=int, required=name == 'rebalance',
+                                        default=None if name == 'rebalance' else DEFAULT_SHARDS,
+                                        help='Number of shards')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='[%(name)s] %(message)s')
+    if args.command == 'rebalance':
+        report = rebalance(args.directory, args.shards)
+        print(f"{report['from_shards']} -> {report['to_shards']} shards: moved "
+              f"{report['moved_sessions']:,} sessions in {report['seconds']:.1f}s")
+        return
+
+    with ShardedChatDatabase(args.directory, shards=args.shards if args.command == 'init' else None) as db:
+        stats = db.stats()
+    print(f"{len(stats['shards'])} shards, {stats['conversations']:,} conversations, {stats['messages']:,} messages")
+    for index, shard in enumerate(stats['shards']):
+        print(f"  {shard_path(args.directory, index)}: {shard['conversations']:,} conversations, "
+              f"{shard['messages']:,} messages")
+
+
+if __name__ == '__main__':
+    main()
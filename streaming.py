@@ -0,0 +1,41 @@
+"""
+Streaming helpers
+Turn model/chain chunk streams into text streams and log time-to-first-token
+"""
+
+import logging
+import time
+from typing import AsyncIterable, AsyncIterator, Iterable, Iterator
+
+logger = logging.getLogger(__name__)
+
+
+def _chunk_text(chunk) -> str:
+    """Return the text of a LangChain message chunk or a plain string"""
+    return chunk if isinstance(chunk, str) else chunk.content
+
+
+def timed_stream(chunks: Iterable, label: str = 'model') -> Iterator[str]:
+    """Yield the text of each chunk, logging time-to-first-token and total stream time"""
+    start = time.perf_counter()
+    first_token = False
+    for chunk in chunks:
+        text = _chunk_text(chunk)
+        if text and not first_token:
+            first_token = True
+            logger.info('%s time to first token: %.0f ms', label, (time.perf_counter() - start) * 1000)
+        yield text
+    logger.info('%s stream finished in %.0f ms', label, (time.perf_counter() - start) * 1000)
+
+
+async def atimed_stream(chunks: AsyncIterable, label: str = 'model') -> AsyncIterator[str]:
+    """Async version of timed_stream for astream() sources"""
+    start = time.perf_counter()
+    first_token = False
+    async for chunk in chunks:
+        text = _chunk_text(chunk)
+        if text and not first_token:
+            first_token = True
+            logger.info('%s time to first token: %.0f ms', label, (time.perf_counter() - start) * 1000)
+        yield text
+    logger.info('%s stream finished in %.0f ms', label, (time.perf_counter() - start) * 1000)
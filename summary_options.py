@@ -0,0 +1,27 @@
+"""
+Research summary options shared by the Streamlit UIs and the batch summarizer
+"""
+
+PAPERS = [
+    "Attention Is All You Need",
+    "BERT: Pre-training of Deep Bidirectional Transformers",
+    "GPT-3: Language Models are Few-Shot Learners",
+    "Diffusion Models Beat GANs on Image Synthesis"
+]
+
+STYLES = [
+    "Beginner_Friendly",
+    "Technical",
+    "Code_Oriented",
+    "Mathematical"
+]
+
+LENGTHS = [
+    "Short (1-2 paragraphs)",
+    "Medium (3-5 paragraphs)",
+    "Long (detailed_explanation)"
+]
+
+# Summary prompt saved by prompt_generator.py, filled with paper (a), style (b) and length (c)
+TEMPLATE_PATH = 'template.json'
+TEMPLATE_VARIABLES = ('a', 'b', 'c')
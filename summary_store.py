@@ -0,0 +1,94 @@
+"""
+Summary Store Module
+Persists generated research paper summaries keyed by (paper, style, length)
+"""
+
+import sqlite3
+from typing import Dict, List, Optional, Set, Tuple
+
+
+class SummaryStore:
+    """Stores one summary per (paper, style, length) combination in SQLite"""
+
+    def __init__(self, db_path: str = "chat_history.db"):
+        """Open the database and create the summaries table if needed"""
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.row_factory = sqlite3.Row  # Enable column access by name
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS paper_summaries (
+                paper TEXT NOT NULL,
+                style TEXT NOT NULL,
+                length TEXT NOT NULL,
+                summary TEXT NOT NULL,
+                model TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (paper, style, length)
+            )
+        ''')
+        # Map-step summaries of paper chunks, keyed by a hash of model and chunk text
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS chunk_summaries (
+                chunk_hash TEXT PRIMARY KEY,
+                summary TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        self.conn.commit()
+
+    def save_summary(self, paper: str, style: str, length: str, summary: str,
+                     model: Optional[str] = None):
+        """Store (or replace) a summary and commit it right away"""
+        self.conn.execute('''
+            INSERT OR REPLACE INTO paper_summaries (paper, style, length, summary, model)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (paper, style, length, summary, model))
+        self.conn.commit()
+
+    def get_summary(self, paper: str, style: str, length: str) -> Optional[str]:
+        """Return the stored summary for a combination, if any"""
+        row = self.conn.execute('''
+            SELECT summary FROM paper_summaries
+            WHERE paper = ? AND style = ? AND length = ?
+        ''', (paper, style, length)).fetchone()
+        return row['summary'] if row else None
+
+    def completed(self) -> Set[Tuple[str, str, str]]:
+        """Return every (paper, style, length) combination that already has a summary"""
+        rows = self.conn.execute('SELECT paper, style, length FROM paper_summaries').fetchall()
+        return {(row['paper'], row['style'], row['length']) for row in rows}
+
+    def get_paper_summaries(self, paper: str) -> List[Dict]:
+        """Return all stored summaries of a paper"""
+        rows = self.conn.execute('''
+            SELECT style, length, summary, model, created_at FROM paper_summaries
+            WHERE paper = ?
+            ORDER BY style, length
+        ''', (paper,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_chunk_summary(self, chunk_hash: str) -> Optional[str]:
+        """Return the cached summary of a chunk, if any"""
+        row = self.conn.execute('''
+            SELECT summary FROM chunk_summaries WHERE chunk_hash = ?
+        ''', (chunk_hash,)).fetchone()
+        return row['summary'] if row else None
+
+    def save_chunk_summary(self, chunk_hash: str, summary: str):
+        """Cache the summary of a chunk"""
+        self.conn.execute('''
+            INSERT OR REPLACE INTO chunk_summaries (chunk_hash, summary) VALUES (?, ?)
+        ''', (chunk_hash, summary))
+        self.conn.commit()
+
+    def close(self):
+        """Close database connection"""
+        self.conn.close()
+
+    def __enter__(self):
+        """Context manager entry"""
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Context manager exit - ensure connection is closed"""
+        self.close()
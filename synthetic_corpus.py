@@ -0,0 +1,131 @@
+"""
+Synthetic Corpus Module
+Generates customer-support conversations of any size for benchmarks and load tests.
+Output is deterministic for a given seed and streams as import_conversations
+input, so millions of messages never have to be held in memory.
+
+Usage:
+    python3 synthetic_corpus.py bench.db --sessions 10000 --messages-per-session 40
+    python3 synthetic_corpus.py bench.db --sessions 1000 --length-distribution fixed --mean-words 20
+"""
+
+import argparse
+import math
+import random
+from typing import Dict, Iterator, List, Tuple
+
+
+# Topical words, what searches look for
+KEYWORDS = [
+    'order', 'refund', 'shipping', 'tracking', 'package', 'delivery', 'account',
+    'password', 'login', 'subscription', 'premium', 'cancel', 'payment', 'charge',
+    'card', 'invoice', 'laptop', 'warranty', 'exchange', 'return', 'label', 'app',
+    'update', 'crash', 'photo', 'upload', 'email', 'support', 'issue', 'help',
+    'thanks', 'please', 'status', 'days', 'business', 'credit', 'discount', 'cart'
+]
+
+WORDS = KEYWORDS + ['the', 'my', 'your', 'is', 'was', 'to', 'for', 'and', 'can', 'you', 'I', 'we']
+
+TOPICS = ['Order Refund Request', 'Shipping Inquiry', 'Account Access', 'Billing Question',
+          'Product Warranty', 'Subscription Change', 'Technical Support', 'Return Label']
+
+LENGTH_DISTRIBUTIONS = ('lognormal', 'uniform', 'fixed')
+
+
+class MessageLengths:
+    """Draws message lengths in words from a named distribution"""
+
+    def __init__(self, distribution: str = 'lognormal', mean_words: int = 30,
+                 min_words: int = 1, max_words: int = 2000):
+        """
+        Args:
+            distribution: 'lognormal' (many short messages, a long tail of pastes),
+                'uniform' (1 to twice the mean) or 'fixed' (always the mean)
+            mean_words: Average message length in words
+            min_words: Shortest message
+            max_words: Longest message, caps the lognormal tail
+        """
+        if distribution not in LENGTH_DISTRIBUTIONS:
+            raise ValueError(f"Unknown length distribution {distribution!r}, expected one of {LENGTH_DISTRIBUTIONS}")
+        self.distribution = distribution
+        self.mean_words = mean_words
+        self.min_words = min_words
+        self.max_words = max_words
+        # sigma 1 gives a heavy tail, mu is chosen so the mean comes out at mean_words
+        self._sigma = 1.0
+        self._mu = math.log(mean_words) - self._sigma ** 2 / 2
+
+    def sample(self, rng: random.Random) -> int:
+        if self.distribution == 'fixed':
+            words = self.mean_words
+        elif self.distribution == 'uniform':
+            words = rng.randint(1, 2 * self.mean_words - 1)
+        else:
+            words = round(rng.lognormvariate(self._mu, self._sigma))
+        return max(self.min_words, min(self.max_words, words))
+
+
+def make_message(rng: random.Random, words: int) -> str:
+    """Random support-style text with an order number so searches have something to find"""
+    text = rng.choices(WORDS, k=max(words - 1, 0))
+    text.insert(rng.randint(0, len(text)), f'#{rng.randint(10000, 99999)}')
+    return ' '.join(text)
+
+
+def generate_messages(rng: random.Random, count: int, lengths: MessageLengths) -> List[Tuple[str, str]]:
+    """Alternating human/ai messages of one session"""
+    return [('human' if i % 2 == 0 else 'ai', make_message(rng, lengths.sample(rng)))
+            for i in range(count)]
+
+
+def generate_conversations(sessions: int, messages_per_session: int = 20,
+                           distribution: str = 'lognormal', mean_words: int = 30,
+                           seed: int = 42, prefix: str = 'synthetic') -> Iterator[Dict]:
+    """
+    Yield conversations in ChatDatabase.import_conversations format
+
+    Args:
+        sessions: Number of conversations
+        messages_per_session: Messages in each conversation
+        distribution: Message length distribution, see MessageLengths
+        mean_words: Average message length in words
+        seed: Same seed, same corpus
+        prefix: Session IDs are '{prefix}_{n}'
+    """
+    rng = random.Random(seed)
+    lengths = MessageLengths(distribution, mean_words)
+    for n in range(sessions):
+        yield {
+            'session_id': f'{prefix}_{n}',
+            'title': rng.choice(TOPICS),
+            'messages': generate_messages(rng, messages_per_session, lengths)
+        }
+
+
+def session_ids(sessions: int, prefix: str = 'synthetic') -> List[str]:
+    """Session IDs generate_conversations produces for the same arguments"""
+    return [f'{prefix}_{n}' for n in range(sessions)]
+
+
+def main():
+    from chat_database import ChatDatabase
+
+    parser = argparse.ArgumentParser(description='Fill a chat database with synthetic conversations')
+    parser.add_argument('db', help='Database file to write to')
+    parser.add_argument('--sessions', type=int, default=1000, help='Number of conversations')
+    parser.add_argument('--messages-per-session', type=int, default=20, help='Messages per conversation')
+    parser.add_argument('--length-distribution', default='lognormal', choices=LENGTH_DISTRIBUTIONS)
+    parser.add_argument('--mean-words', type=int, default=30, help='Average message length in words')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    with ChatDatabase(args.db) as db:
+        stats = db.import_conversations(generate_conversations(
+            args.sessions, args.messages_per_session, args.length_distribution, args.mean_words, args.seed
+        ))
+    print(f"Imported {stats['conversations']:,} conversations and {stats['messages']:,} messages "
+          f"({stats['rows_per_sec']:,.0f} rows/sec)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Template Registry Module
+Loads prompt templates from disk once and shares compiled templates, models and
+chains across Streamlit reruns and repeated calls. Templates are re-read only
+when their file's modification time changes, so edits are picked up without a
+restart.
+"""
+
+import os
+import threading
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+from langchain_core.prompts import load_prompt
+
+
+class TemplateRegistry:
+    """Process-wide cache of prompt templates keyed by path and mtime, plus shared models and chains"""
+
+    def __init__(self):
+        self._templates: Dict[str, Tuple[int, Any]] = {}
+        self._models: Dict[Hashable, Any] = {}
+        self._chains: Dict[Tuple, Any] = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def get_template(self, path: str, required_variables: Optional[Iterable[str]] = None):
+        """
+        Return the template stored at path, loading it again only if the file changed
+
+        Args:
+            path: Template file saved with PromptTemplate.save (e.g. template.json)
+            required_variables: Variables the caller will pass; a template whose
+                input variables differ is rejected with ValueError
+        """
+        mtime = os.stat(path).st_mtime_ns
+        with self._lock:
+            cached = self._templates.get(path)
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
+
+            template = load_prompt(path)
+            if required_variables is not None and set(template.input_variables) != set(required_variables):
+                raise ValueError(
+                    f"Template {path} expects variables {sorted(template.input_variables)}, "
+                    f"not {sorted(required_variables)}"
+                )
+            # Render once with placeholders so a malformed template fails here, not mid-request
+            template.format(**{name: name for name in template.input_variables})
+
+            self._templates[path] = (mtime, template)
+            self.loads += 1
+            return template
+
+    def get_model(self, key: Hashable, factory: Callable[[], Any]):
+        """Return the shared model registered under key, creating it with factory on first use"""
+        with self._lock:
+            model = self._models.get(key)
+            if model is None:
+                model = self._models[key] = factory()
+            return model
+
+    def get_chain(self, path: str, model_key: Hashable, model_factory: Callable[[], Any],
+                  required_variables: Optional[Iterable[str]] = None):
+        """Return the shared `template | model` chain, rebuilt only when the template file changes"""
+        template = self.get_template(path, required_variables)
+        model = self.get_model(model_key, model_factory)
+        key = (path, id(template), model_key)
+        with self._lock:
+            chain = self._chains.get(key)
+            if chain is None:
+                # Drop chains built from an older version of this template
+                for stale in [k for k in self._chains if k[0] == path and k[2] == model_key]:
+                    del self._chains[stale]
+                chain = self._chains[key] = template | model
+            return chain
+
+
+# Shared by every entry point in the process; Streamlit keeps imported modules across reruns
+registry = TemplateRegistry()
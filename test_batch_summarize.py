@@ -0,0 +1,39 @@
+"""
+Tests for the batch summarizer using the offline fake chat model
+"""
+
+import asyncio
+
+import pytest
+
+pytest.importorskip('langchain_core')
+
+from langchain_core.prompts import load_prompt
+
+from batch_summarize import read_papers, run_batch
+from fake_chat_model import FakeChatModel
+from summary_store import SummaryStore
+
+
+def test_batch_stores_results_and_resumes(tmp_path):
+    model = FakeChatModel(latency=0.05)
+    chain = load_prompt('template.json') | model
+    jobs = [('Paper A', 'Technical', 'Short'), ('Paper B', 'Technical', 'Short'),
+            ('Paper C', 'Mathematical', 'Long')]
+
+    with SummaryStore(str(tmp_path / 'summaries.db')) as store:
+        stored, failures = asyncio.run(run_batch(jobs[:2], chain, store, 'fake-chat', concurrency=2))
+        assert (stored, failures) == (2, [])
+
+        remaining = [job for job in jobs if job not in store.completed()]
+        stored, _ = asyncio.run(run_batch(remaining, chain, store, 'fake-chat', concurrency=2))
+
+        assert stored == 1
+        assert model.calls == 3
+        assert store.get_summary('Paper C', 'Mathematical', 'Long')
+
+
+def test_read_papers_skips_blanks_and_indented_comments(tmp_path):
+    papers = tmp_path / 'papers.txt'
+    papers.write_text('# reading list\nAttention Is All You Need\n\n  # indented comment\n  BERT  \n')
+    assert read_papers(str(papers)) == ['Attention Is All You Need', 'BERT']
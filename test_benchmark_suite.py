@@ -0,0 +1,38 @@
+"""
+Tests for the synthetic corpus generator and the benchmark suite
+"""
+
+import random
+import statistics
+
+from benchmark_suite import SCENARIOS, compare, run_suite
+from synthetic_corpus import MessageLengths, generate_conversations
+
+
+def test_corpus_is_deterministic_and_follows_the_length_distribution():
+    first = list(generate_conversations(50, 4, seed=7))
+    assert first == list(generate_conversations(50, 4, seed=7))
+    assert first != list(generate_conversations(50, 4, seed=8))
+    assert [role for role, _ in first[0]['messages']] == ['human', 'ai', 'human', 'ai']
+
+    rng = random.Random(1)
+    assert {MessageLengths('fixed', 12).sample(rng) for _ in range(10)} == {12}
+    lognormal = [MessageLengths('lognormal', 30).sample(rng) for _ in range(20000)]
+    assert 27 < statistics.mean(lognormal) < 33
+    assert statistics.median(lognormal) < statistics.mean(lognormal)  # long tail
+
+
+def test_suite_reports_every_scenario_and_flags_regressions(tmp_path):
+    config = {'sessions': 20, 'messages_per_session': 6, 'length_distribution': 'uniform',
+              'mean_words': 10, 'seed': 1, 'operations': 5, 'model_latency_ms': 0.0}
+    report = run_suite(str(tmp_path / 'bench.db'), config)
+
+    assert tuple(report['scenarios']) == SCENARIOS
+    chat = report['scenarios']['chat_turn']
+    assert chat['operations'] == 5 and chat['p50_ms'] <= chat['p95_ms'] <= chat['p99_ms']
+
+    slower = {'scenarios': {'search': {'p50_ms': 10.0, 'p95_ms': 10.0, 'p99_ms': 10.0}}}
+    faster = {'scenarios': {'search': {'p50_ms': 1.0, 'p95_ms': 1.0, 'p99_ms': 1.0}}}
+    assert not any(row['regression'] for row in compare(faster, slower))
+    rows = compare(slower, faster, tolerance=0.2)
+    assert len(rows) == 3 and all(row['regression'] for row in rows)
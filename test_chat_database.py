@@ -0,0 +1,467 @@
+"""
+Unit tests for ChatDatabase running against throwaway database files
+"""
+
+import asyncio
+import sqlite3
+import threading
+from collections import namedtuple
+
+import pytest
+
+from async_chat_database import AsyncChatDatabase
+from chat_database import ChatDatabase
+from history_cache import HistoryCache
+from history_compaction import LastNTokensPolicy, RollingSummaryPolicy
+from vector_index import VectorIndex
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Fresh database in a temporary directory"""
+    with ChatDatabase(str(tmp_path / 'chat.db')) as database:
+        yield database
+
+
+def test_search_ranks_and_highlights_matches(db):
+    conv_id = db.create_conversation('s1', 'Refunds')
+    db.add_message(conv_id, 'human', 'I want a refund for my order')
+    db.add_message(conv_id, 'ai', 'Your refund is approved, the refund arrives in 3 days')
+    db.add_message(conv_id, 'human', 'Where is my package?')
+
+    results = db.search_messages('refund')
+
+    assert db.fts_enabled
+    assert len(results) == 2
+    assert results[0]['content'].startswith('Your refund')
+    assert '[refund]' in results[0]['snippet']
+    assert results[0]['session_id'] == 's1'
+
+
+def test_search_index_follows_deletes(db):
+    conv_id = db.create_conversation('s1')
+    db.add_message(conv_id, 'human', 'tracking number please')
+    db.cursor.execute('DELETE FROM messages WHERE conversation_id = ?', (conv_id,))
+    db.conn.commit()
+
+    assert db.search_messages('tracking') == []
+
+
+def test_existing_database_is_backfilled(tmp_path):
+    db_path = str(tmp_path / 'legacy.db')
+    conn = sqlite3.connect(db_path)
+    conn.executescript('''
+        CREATE TABLE conversations (id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT UNIQUE NOT NULL,
+            title TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, metadata TEXT);
+        CREATE TABLE messages (id INTEGER PRIMARY KEY AUTOINCREMENT, conversation_id INTEGER NOT NULL,
+            role TEXT NOT NULL, content TEXT NOT NULL, timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            metadata TEXT);
+        INSERT INTO conversations (session_id, title) VALUES ('old', 'Legacy');
+        INSERT INTO messages (conversation_id, role, content) VALUES (1, 'human', 'legacy shipping question');
+    ''')
+    conn.commit()
+    conn.close()
+
+    with ChatDatabase(db_path) as db:
+        assert [r['session_id'] for r in db.search_messages('shipping')] == ['old']
+
+
+def test_like_fallback_when_fts_unavailable(db):
+    conv_id = db.create_conversation('s1')
+    db.add_message(conv_id, 'human', 'partial substring match')
+    db.fts_enabled = False
+
+    results = db.search_messages('substr')
+
+    assert [r['content'] for r in results] == ['partial substring match']
+
+
+def test_import_conversations_batches_messages(db):
+    existing_id = db.create_conversation('s1', 'Existing')
+    conversations = (
+        {'session_id': f's{i}', 'title': f'Chat {i}',
+         'messages': ((('human', 'q'), ('ai', 'a', {'generated': True})))}
+        for i in range(1, 4)
+    )
+
+    stats = db.import_conversations(conversations, batch_size=4)
+
+    assert stats['conversations'] == 3
+    assert stats['messages'] == 6
+    assert stats['rows_per_sec'] > 0
+    assert db.get_conversation_messages('s1') == [('human', 'q'), ('ai', 'a')]
+    assert db.create_conversation('s1') == existing_id
+
+
+def test_add_messages_bulk_rejects_invalid_role_atomically(db):
+    conv_id = db.create_conversation('s1')
+
+    with pytest.raises(ValueError):
+        db.add_messages_bulk([(conv_id, 'human', 'ok'), (conv_id, 'robot', 'bad')])
+
+    assert db.get_conversation_messages('s1') == []
+
+
+STRESS_READERS = 8
+STRESS_WRITES = 300
+
+
+def test_pooled_readers_run_alongside_writer(tmp_path):
+    """Stress test: N reader threads hammer the database while one writer appends"""
+    db = ChatDatabase(str(tmp_path / 'pooled.db'), pooled=True, busy_timeout=2000)
+    conv_id = db.create_conversation('stress')
+    done = threading.Event()
+    errors = []
+    reads = []
+
+    def reader():
+        count = 0
+        last_seen = 0
+        try:
+            while True:
+                seen = len(db.get_conversation_messages('stress'))
+                # Each reader sees a committed snapshot that only ever grows
+                assert seen >= last_seen
+                last_seen = seen
+                db.search_messages('message')
+                count += 1
+                if done.is_set():
+                    break
+        except Exception as exc:
+            errors.append(exc)
+        reads.append(count)
+
+    threads = [threading.Thread(target=reader) for _ in range(STRESS_READERS)]
+    for thread in threads:
+        thread.start()
+    for i in range(STRESS_WRITES):
+        db.add_message(conv_id, 'human', f'message {i}')
+    done.set()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(reads) == STRESS_READERS and all(count > 0 for count in reads)
+    assert len(db.get_conversation_messages('stress')) == STRESS_WRITES
+    assert db.conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    db.close()
+
+
+def test_async_database_serves_concurrent_sessions(tmp_path):
+    async def session(db, i):
+        conv_id = await db.create_conversation(f'async_{i}')
+        await db.add_message(conv_id, 'human', f'question {i}')
+        await db.add_message(conv_id, 'ai', f'answer {i}')
+        return await db.get_conversation_messages(f'async_{i}')
+
+    async def main():
+        async with AsyncChatDatabase(str(tmp_path / 'async.db'), max_workers=4) as db:
+            histories = await asyncio.gather(*(session(db, i) for i in range(200)))
+            export = await db.export_conversation('async_7')
+        return histories, export
+
+    histories, export = asyncio.run(main())
+
+    assert all(history == [('human', f'question {i}'), ('ai', f'answer {i}')]
+               for i, history in enumerate(histories))
+    assert [m['content'] for m in export['messages']] == ['question 7', 'answer 7']
+
+
+def test_history_cache_reads_only_new_rows(tmp_path):
+    cache = HistoryCache(formatter=lambda role, content: f'{role}:{content}')
+    db = ChatDatabase(str(tmp_path / 'cached.db'), history_cache=cache)
+    conv_id = db.create_conversation('s1')
+    db.add_message(conv_id, 'human', 'hello')
+
+    assert cache.last_id(db.db_path, 's1') is None
+    history = cache.extend(db.db_path, 's1', conv_id, db.get_messages_since('s1'))
+    assert history == ['human:hello']
+
+    # Write-through: the cache is extended without another read
+    db.add_message(conv_id, 'ai', 'hi there')
+    since_id = cache.last_id(db.db_path, 's1')
+    assert db.get_messages_since('s1', since_id) == []
+    assert cache.extend(db.db_path, 's1', conv_id, []) == ['human:hello', 'ai:hi there']
+
+    # A recreated session replaces the cached copy of its old conversation
+    assert cache.extend(db.db_path, 's1', conv_id + 1, [(9, 'human', 'fresh')]) == ['human:fresh']
+
+    db.delete_conversation('s1')
+    assert cache.stats()['sessions'] == 0
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+    db.close()
+
+
+def test_history_cache_evicts_least_recently_used():
+    cache = HistoryCache(formatter=lambda role, content: content, max_bytes=10)
+    cache.extend('db', 'a', 1, [(1, 'human', 'aaaa')])
+    cache.extend('db', 'b', 2, [(2, 'human', 'bbbb')])
+    cache.last_id('db', 'a')
+    cache.extend('db', 'c', 3, [(3, 'human', 'cccc')])
+
+    assert cache.last_id('db', 'b') is None
+    assert cache.last_id('db', 'a') == 1
+    assert cache.stats()['evictions'] == 1
+
+
+def test_shared_history_cache_keeps_databases_apart(tmp_path):
+    pytest.importorskip('langchain_core')
+    from message_placeholder_db import history_cache, load_chat_history
+
+    first = ChatDatabase(str(tmp_path / 'first.db'), history_cache=history_cache)
+    second = ChatDatabase(str(tmp_path / 'second.db'), history_cache=history_cache)
+    first.add_messages(first.create_conversation('cache-s1'), [('human', 'first question')])
+    second.add_messages(second.create_conversation('cache-s1'), [('human', 'second question')])
+
+    assert [m.content for m in load_chat_history(first, 'cache-s1')[1]] == ['first question']
+    assert [m.content for m in load_chat_history(second, 'cache-s1')[1]] == ['second question']
+    first.add_messages(first.create_conversation('cache-s1'), [('ai', 'first answer')])
+    assert [m.content for m in load_chat_history(first, 'cache-s1')[1]] == ['first question', 'first answer']
+    assert [m.content for m in load_chat_history(second, 'cache-s1')[1]] == ['second question']
+
+    # Deleted and recreated by another instance, the old transcript is not served
+    with ChatDatabase(first.db_path) as other:
+        other.delete_conversation('cache-s1')
+        other.add_messages(other.create_conversation('cache-s1'), [('human', 'new question')])
+    assert [m.content for m in load_chat_history(first, 'cache-s1')[1]] == ['new question']
+    first.close()
+    second.close()
+
+
+def test_keyset_pagination_and_tail(db):
+    conv_id = db.create_conversation('long')
+    db.add_messages_bulk((conv_id, 'human', f'm{i}') for i in range(25))
+
+    batches = list(db.iter_conversation_messages('long', batch_size=10))
+    assert [len(batch) for batch in batches] == [10, 10, 5]
+    assert [content for batch in batches for _, _, content in batch] == [f'm{i}' for i in range(25)]
+
+    tail = [content for batch in db.iter_conversation_messages('long', last_n=3) for _, _, content in batch]
+    assert tail == ['m22', 'm23', 'm24']
+
+    first_id = batches[0][0][0]
+    rows, next_cursor = db.get_messages_page('long', after_id=first_id + 20, limit=10)
+    assert [content for _, _, content in rows] == ['m21', 'm22', 'm23', 'm24']
+    assert next_cursor is None
+
+    plan = ' '.join(row[3] for row in db.cursor.execute(
+        'EXPLAIN QUERY PLAN SELECT id FROM messages WHERE conversation_id = ? AND id > ? ORDER BY id LIMIT 10',
+        (conv_id, 0)))
+    assert 'idx_messages_conversation_id' in plan
+
+
+def test_rolling_summary_is_persisted_and_reused(db):
+    Message = namedtuple('Message', ['type', 'content'])
+    calls = []
+
+    def summarizer(previous, messages):
+        calls.append(len(messages))
+        return f'summary of {len(messages)}'
+
+    policy = RollingSummaryPolicy(summarizer, Message, max_tokens=60, summary_tokens=20)
+    conv_id = db.create_conversation('long')
+    history = [Message('human', 'x' * 40) for _ in range(10)]
+
+    first = policy.compact(history, db, conv_id)
+    second = policy.compact(history, db, conv_id)
+
+    assert len(calls) == 1
+    assert first == second
+    assert first[0].content.startswith('Summary of the earlier conversation')
+    assert db.get_summary(conv_id)[1] == 10 - (len(first) - 1)
+    assert LastNTokensPolicy(max_tokens=30).compact(history) == history[-2:]
+
+
+def test_add_messages_writes_exchange_in_one_transaction(db):
+    conv_id = db.create_conversation('s1')
+    commits = []
+    db.conn.set_trace_callback(lambda sql: commits.append(sql) if sql.strip().upper() == 'COMMIT' else None)
+
+    ids = db.add_messages(conv_id, [('human', 'question'), ('ai', 'streamed answer')])
+
+    assert len(ids) == 2 and ids[0] < ids[1]
+    assert len(commits) == 1
+    assert db.get_conversation_messages('s1') == [('human', 'question'), ('ai', 'streamed answer')]
+
+
+def trace_queries(db):
+    """Collect the data statements run on a non-pooled database, without trigger bodies"""
+    queries = []
+    db.conn.set_trace_callback(
+        lambda sql: queries.append(sql) if sql.split(None, 1)[0].upper() in ('SELECT', 'INSERT', 'UPDATE', 'DELETE') else None
+    )
+    return queries
+
+
+def test_conversation_lookups_take_one_query(tmp_path):
+    path = str(tmp_path / 'chat.db')
+    with ChatDatabase(path) as db:
+        queries = trace_queries(db)
+        conv_id = db.create_conversation('s1', 'Refunds')
+        # A remembered ID is only confirmed with a read, no write
+        assert db.create_conversation('s1') == conv_id
+        assert len(queries) == 2 and 'RETURNING' in queries[0] and queries[1].lstrip().startswith('SELECT')
+        db.add_messages(conv_id, [('human', 'question'), ('ai', 'answer')])
+
+    # A fresh instance finds the conversation and its messages together
+    with ChatDatabase(path) as db:
+        queries = trace_queries(db)
+        assert db.get_or_create_conversation_with_history('s1') == (conv_id, [
+            (1, 'human', 'question'), (2, 'ai', 'answer')])
+        assert db.get_or_create_conversation_with_history('s1', since_id=1)[1] == [(2, 'ai', 'answer')]
+        assert len(queries) == 2 and 'WHERE c.id =' in queries[1]
+
+        new_id, rows = db.get_or_create_conversation_with_history('s2', 'New')
+        assert rows == [] and new_id != conv_id and len(queries) == 4
+
+        queries.clear()
+        export = db.export_conversation('s1')
+        assert len(queries) == 1
+        assert export['title'] == 'Refunds' and len(export['messages']) == 2
+        assert db.export_conversation('s2')['messages'] == []
+
+        db.delete_conversation('s1')
+        assert db.create_conversation('s1') != conv_id
+
+
+def test_remembered_conversation_deleted_by_another_instance(tmp_path):
+    path = str(tmp_path / 'chat.db')
+    with ChatDatabase(path) as first, ChatDatabase(path) as second:
+        conv_id = first.create_conversation('s1')
+        first.add_messages(conv_id, [('human', 'old question')])
+
+        second.delete_conversation('s1')
+        new_id, rows = first.get_or_create_conversation_with_history('s1')
+        assert new_id != conv_id and rows == []
+        first.add_messages(new_id, [('human', 'new question')])
+        assert second.get_conversation_messages('s1') == [('human', 'new question')]
+
+        second.delete_conversation('s1')
+        assert first.create_conversation('s1') not in (conv_id, new_id)
+
+
+def test_chat_turn_reads_conversation_once(db):
+    pytest.importorskip('langchain_core')
+    from fake_chat_model import FakeChatModel
+    from message_placeholder_db import chat_with_history
+
+    chat_with_history('query-count-session', 'first question', db=db, model=FakeChatModel())
+    queries = trace_queries(db)
+    chat_with_history('query-count-session', 'second question', db=db, model=FakeChatModel())
+
+    selects = [sql for sql in queries if sql.lstrip().upper().startswith('SELECT')]
+    assert len(selects) == 1 and 'WHERE c.id =' in selects[0]
+    assert len(db.get_conversation_messages('query-count-session')) == 4
+
+
+def test_owned_database_is_closed_when_the_turn_fails(tmp_path, monkeypatch):
+    pytest.importorskip('langchain_core')
+    import message_placeholder_db
+    from fake_chat_model import FakeChatModel, FakeRateLimitError
+
+    closed = []
+
+    class TrackedDatabase(ChatDatabase):
+        def close(self):
+            closed.append(self.db_path)
+            super().close()
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(message_placeholder_db, 'ChatDatabase', TrackedDatabase)
+    with pytest.raises(FakeRateLimitError):
+        message_placeholder_db.chat_with_history('failing-turn', 'question', model=FakeChatModel(fail_calls=1))
+    assert closed == ['chat_history.db']
+
+
+def test_vector_index_tracks_new_messages(tmp_path):
+    db_path = str(tmp_path / 'vectors.db')
+    db = ChatDatabase(db_path)
+    conv_id = db.create_conversation('s1')
+    db.add_message(conv_id, 'human', 'my package tracking number is missing')
+
+    index = VectorIndex(db_path)
+    assert index.sync(db) == 1
+    db.vector_index = index
+    db.add_message(conv_id, 'ai', 'your refund was sent to your credit card')
+    other = db.create_conversation('s2')
+    db.add_message(other, 'human', 'refund to credit card please')
+
+    assert len(index) == 3
+    top_id, _ = index.search('credit card refund', k=1, ids=db.get_message_ids('s1'))[0]
+    assert db.get_messages_by_ids([top_id])[0][2] == 'your refund was sent to your credit card'
+    assert index.sync(db) == 0
+    db.close()
+
+
+def test_vector_index_drops_vectors_left_without_an_id(tmp_path):
+    index = VectorIndex(str(tmp_path / 'crashed.db'))
+    index.add([1, 2], ['order status question', 'refund to credit card'])
+    # A crash after the vector append but before the ID append
+    with open(index.vectors_path, 'ab') as f:
+        f.write(index.embedder.embed(['lost message']).tobytes())
+
+    index.add([3], ['new shipping address'])
+    assert len(index) == 3
+    assert index.search('new shipping address', k=1)[0][0] == 3
+    assert index.search('refund to credit card', k=1)[0][0] == 2
+
+
+def test_retrieval_turns_keep_one_index_per_database(tmp_path):
+    pytest.importorskip('langchain_core')
+    from fake_chat_model import FakeChatModel
+    from message_placeholder_db import chat_with_history
+
+    databases = [ChatDatabase(str(tmp_path / name)) for name in ('a.db', 'b.db')]
+    for turn in range(2):
+        for db in databases:
+            chat_with_history(f'{db.db_path}-session', f'question {turn}', retrieval_k=2,
+                              db=db, model=FakeChatModel())
+    for db in databases:
+        assert db.vector_index is None
+        index = VectorIndex(db.db_path)
+        # Only this database's own first exchange, the second is indexed by the next turn
+        assert len(index) == 2 and index.sync(db) == 2
+        db.close()
+
+
+@pytest.mark.parametrize('algorithm', ['zlib', 'zstd'])
+def test_compact_storage_round_trips_and_migrates(tmp_path, algorithm):
+    if algorithm == 'zstd':
+        pytest.importorskip('zstandard')
+    path = str(tmp_path / 'chat.db')
+    long_answer = 'Your refund for order 12345 has been approved. ' * 40
+
+    with ChatDatabase(path) as plain:
+        conv_id = plain.create_conversation('s1', 'Refunds')
+        plain.add_messages(conv_id, [('human', 'Where is my refund for order 12345?'),
+                                     ('ai', long_answer, {'generated': True})])
+
+    with ChatDatabase(path, compression=algorithm, compression_threshold=256) as db:
+        # Opening in compact mode switched the search index over without losing rows
+        assert len(db.search_messages('refund')) == 2
+
+        stats = db.recompress_messages()
+        assert stats['messages'] == 2 and stats['bytes_after'] < stats['bytes_before']
+        db.add_messages_bulk((conv_id, 'human', f'Is the refund for order {n} going to my credit card?')
+                             for n in range(300))
+        assert db.train_compression_dictionary() is not None
+        db.add_message(conv_id, 'human', 'Thanks, is the refund going to my credit card?', {'generated': True})
+
+        rows = db.conn.execute('SELECT typeof(content), metadata, metadata_id FROM messages ORDER BY id').fetchall()
+        # Short messages are only compressed once a dictionary exists
+        assert [rows[0][0], rows[1][0], rows[-1][0]] == ['text', 'blob', 'blob']
+        assert rows[1][1] is None and rows[1][2] == rows[-1][2]
+        assert db.conn.execute('SELECT COUNT(*) FROM message_metadata').fetchone()[0] == 1
+
+        assert db.get_conversation_messages('s1')[1] == ('ai', long_answer)
+        assert db.search_messages('Thanks credit card')[0]['content'].startswith('Thanks')
+        exported = db.export_conversation('s1')['messages']
+        assert exported[1] == {'role': 'ai', 'content': long_answer, 'metadata': {'generated': True}}
+
+    # Compressed rows stay readable after reopening without compression
+    with ChatDatabase(path) as reopened:
+        assert reopened.get_messages_since('s1')[-1][2].startswith('Thanks')
+        reopened.recompress_messages()
+        assert reopened.conn.execute("SELECT COUNT(*) FROM messages WHERE typeof(content) = 'blob'").fetchone()[0] == 0
+        assert len(reopened.search_messages('Thanks refund')) == 1
@@ -0,0 +1,132 @@
+"""
+Tests for the chat server using an in-process server and the offline fake chat model
+"""
+
+import asyncio
+import itertools
+
+import pytest
+
+pytest.importorskip('langchain_core')
+
+from async_chat_database import AsyncChatDatabase
+from chat_load_test import HTTPChatClient, WebSocketChatClient, run_load
+from chat_server import ChatServer
+from fake_chat_model import FakeChatModel
+from message_placeholder_db import history_cache
+
+# history_cache is shared by the whole process, keep session IDs unique across tests
+_sessions = itertools.count()
+
+
+def session_id():
+    return f'server-test-{next(_sessions)}'
+
+
+def run_server(tmp_path, check, model=None, **kwargs):
+    """Start a server on a free port, run check(server), shut it down"""
+    async def scenario():
+        db = AsyncChatDatabase(str(tmp_path / 'server.db'), history_cache=history_cache)
+        server = ChatServer(db, model or FakeChatModel(reply_words=8), port=0, **kwargs)
+        await server.start()
+        try:
+            return await check(server)
+        finally:
+            if not server.draining:
+                await server.shutdown()
+    return asyncio.run(scenario())
+
+
+def test_http_and_websocket_turns_stream_and_are_stored(tmp_path):
+    sid = session_id()
+
+    async def check(server):
+        http = HTTPChatClient('127.0.0.1', server.port, sid)
+        first = await http.send('Where is my order?')
+        ws = WebSocketChatClient('127.0.0.1', server.port, sid)
+        second = await ws.send('It has been a week')
+        await ws.close()
+        history = await http.history()
+        await http.close()
+        return first, second, history
+
+    first, second, history = run_server(tmp_path, check)
+    assert first.status == second.status == 200
+    assert len(first.reply.split()) == 8
+    assert [m['role'] for m in history] == ['human', 'ai', 'human', 'ai']
+    assert history[1]['content'] == first.reply and history[3]['content'] == second.reply
+
+
+def test_turns_beyond_the_queue_are_rejected(tmp_path):
+    async def check(server):
+        report = await run_load('127.0.0.1', server.port, sessions=4, turns=1, concurrency=4,
+                                prefix=session_id())
+        return report, server.stats()
+
+    report, stats = run_server(tmp_path, check, model=FakeChatModel(latency=0.2),
+                               max_active_turns=1, max_queued_turns=1)
+    assert report['rejected_turns'] == 2 and report['turn']['operations'] == 2
+    assert stats['turns'] == 2 and stats['rejected_turns'] == 2
+
+
+def test_turns_waiting_on_their_session_do_not_hold_slots(tmp_path):
+    chatty, quiet = session_id(), session_id()
+
+    async def check(server):
+        clients = [HTTPChatClient('127.0.0.1', server.port, chatty) for _ in range(3)]
+        turns = [asyncio.create_task(client.send(f'question {i}')) for i, client in enumerate(clients)]
+        while not server.stats()['active_turns']:
+            await asyncio.sleep(0.01)
+        other = HTTPChatClient('127.0.0.1', server.port, quiet)
+        results = [await other.send('Another session')] + list(await asyncio.gather(*turns))
+        for client in clients + [other]:
+            await client.close()
+        return results
+
+    results = run_server(tmp_path, check, model=FakeChatModel(latency=0.1),
+                         max_active_turns=2, max_queued_turns=0)
+    assert [result.status for result in results] == [200] * 4
+
+
+def test_shutdown_lets_running_turns_finish_and_save(tmp_path):
+    sid = session_id()
+
+    async def check(server):
+        client = HTTPChatClient('127.0.0.1', server.port, sid)
+        turn = asyncio.create_task(client.send('Slow question'))
+        while not server.stats()['active_turns']:
+            await asyncio.sleep(0.01)
+        await server.shutdown(grace_seconds=5)
+        await client.close()
+        return await turn
+
+    result = run_server(tmp_path, check, model=FakeChatModel(latency=0.2))
+    assert result.status == 200 and result.reply
+
+    async def stored():
+        async with AsyncChatDatabase(str(tmp_path / 'server.db')) as db:
+            return await db.get_conversation_messages(sid)
+
+    assert [role for role, _ in asyncio.run(stored())] == ['human', 'ai']
+
+
+def test_failed_turns_and_bad_requests_get_error_responses(tmp_path):
+    sid = session_id()
+
+    async def check(server):
+        client = HTTPChatClient('127.0.0.1', server.port, sid)
+        failed = await client.send('First try')
+        # Same keep-alive connection, the next turn is served normally
+        retried = await client.send('Second try')
+        await client.close()
+
+        reader, writer = await asyncio.open_connection('127.0.0.1', server.port)
+        writer.write(f'POST /sessions/{sid}/messages HTTP/1.1\r\nContent-Length: ten\r\n\r\n'.encode())
+        status_line = await reader.readline()
+        writer.close()
+        return failed, retried, status_line, server.stats()
+
+    failed, retried, status_line, stats = run_server(tmp_path, check, model=FakeChatModel(fail_calls=1))
+    assert failed.status == 500 and retried.status == 200 and retried.reply
+    assert stats['failed_turns'] == 1 and stats['turns'] == 1
+    assert status_line.startswith(b'HTTP/1.1 400')
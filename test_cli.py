@@ -0,0 +1,60 @@
+"""
+Tests for the command line entry point
+"""
+
+import json
+import subprocess
+import sys
+
+import pytest
+
+from chat_database import ChatDatabase
+import cli
+
+
+def make_db(path):
+    with ChatDatabase(str(path)) as db:
+        conv_id = db.create_conversation('session_cli', 'Refund question')
+        db.add_messages(conv_id, [('human', 'Where is my refund?'), ('ai', 'It was issued today.')])
+
+
+def test_database_commands(tmp_path, capsys):
+    db_path = tmp_path / 'chat.db'
+    make_db(db_path)
+
+    assert cli.main(['list', '--db', str(db_path)]) == 0
+    assert 'session_cli' in capsys.readouterr().out
+
+    cli.main(['search', 'refund', '--db', str(db_path)])
+    assert '[refund]' in capsys.readouterr().out
+
+    out_path = tmp_path / 'export.json'
+    cli.main(['export', 'session_cli', '--db', str(db_path), '--output', str(out_path)])
+    assert len(json.loads(out_path.read_text())['messages']) == 2
+    assert cli.main(['export', 'missing', '--db', str(db_path)]) == 1
+
+
+def test_database_commands_skip_llm_imports(tmp_path):
+    db_path = tmp_path / 'chat.db'
+    make_db(db_path)
+
+    code = ("import sys, cli; cli.main(['search', 'refund', '--db', sys.argv[1]]); "
+            "print(sorted(m for m in ('langchain_core', 'langchain_openai', 'openai') if m in sys.modules))")
+    result = subprocess.run([sys.executable, '-c', code, str(db_path)],
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.strip().endswith('[]')
+
+
+def test_chat_uses_the_given_database(tmp_path, monkeypatch, capsys):
+    pytest.importorskip('langchain_core')
+    import message_placeholder_db
+    from fake_chat_model import FakeChatModel
+
+    db_path = tmp_path / 'chat.db'
+    make_db(db_path)
+    monkeypatch.setattr(message_placeholder_db, 'default_model', FakeChatModel)
+
+    assert cli.main(['chat', 'session_cli', 'Any news?', '--db', str(db_path)]) == 0
+    assert 'Found 2 messages' in capsys.readouterr().out
+    with ChatDatabase(str(db_path)) as db:
+        assert len(db.get_conversation_messages('session_cli')) == 4
@@ -0,0 +1,49 @@
+"""
+Tests for streaming export and import of the whole chat history
+"""
+
+import pytest
+
+from chat_database import ChatDatabase
+from conversation_archive import export_archive, import_archive
+
+
+def make_source(path):
+    db = ChatDatabase(str(path))
+    conv_id = db.create_conversation('s1', 'Refunds', {'channel': 'web'})
+    db.add_messages(conv_id, [('human', 'Where is my refund?'),
+                              ('ai', 'It was issued today.', {'generated': True})])
+    db.create_conversation('empty', 'No messages yet')
+    conv_id = db.create_conversation('s2', 'Shipping')
+    db.add_message(conv_id, 'human', 'Has my package shipped? ✈')
+    db.conn.execute("UPDATE messages SET timestamp = '2024-01-02 03:04:05'")
+    db.conn.execute("UPDATE conversations SET created_at = '2020-05-01 10:00:00', "
+                    "updated_at = '2020-06-0' || id || ' 12:00:00'")
+    db.conn.commit()
+    return db
+
+
+@pytest.mark.parametrize('name', ['backup.jsonl', 'backup.jsonl.gz', 'backup.parquet'])
+def test_archive_round_trip(tmp_path, name):
+    if name.endswith('.parquet'):
+        pytest.importorskip('pyarrow')
+    archive = str(tmp_path / name)
+
+    with make_source(tmp_path / 'source.db') as source:
+        assert export_archive(source, archive, batch_size=2) == 4
+        expected = {session: source.export_conversation(session) for session in ('s1', 's2', 'empty')}
+
+    with ChatDatabase(str(tmp_path / 'restored.db')) as restored:
+        stats = import_archive(restored, archive, batch_size=2)
+        assert (stats['conversations'], stats['messages']) == (3, 3)
+
+        for session, conversation in expected.items():
+            copy = restored.export_conversation(session)
+            assert copy['title'] == conversation['title']
+            assert copy['messages'] == conversation['messages']
+            # Idle ages survive a restore, retention must not see every session as active
+            for field in ('created_at', 'updated_at'):
+                assert copy[field] == conversation[field]
+        timestamps = restored.conn.execute('SELECT DISTINCT timestamp FROM messages').fetchall()
+        assert [row[0] for row in timestamps] == ['2024-01-02 03:04:05']
+        assert restored.search_messages('package')[0]['session_id'] == 's2'
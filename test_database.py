@@ -41,28 +41,12 @@ def test_database():
     print("\n4. DATABASE STATISTICS:")
     print("-"*40)
 
-    # Count total conversations
-    db.cursor.execute("SELECT COUNT(*) FROM conversations")
-    total_convs = db.cursor.fetchone()[0]
-
-    # Count total messages
-    db.cursor.execute("SELECT COUNT(*) FROM messages")
-    total_msgs = db.cursor.fetchone()[0]
-
-    # Count messages by role
-    db.cursor.execute("""
-        SELECT role, COUNT(*) as count
-        FROM messages
-        GROUP BY role
-        ORDER BY count DESC
-    """)
-    role_counts = db.cursor.fetchall()
-
-    print(f"  • Total Conversations: {total_convs}")
-    print(f"  • Total Messages: {total_msgs}")
+    stats = db.stats()
+    print(f"  • Total Conversations: {stats['conversations']}")
+    print(f"  • Total Messages: {stats['messages']}")
     print(f"  • Messages by Role:")
-    for row in role_counts:
-        print(f"      - {row['role']}: {row['count']} messages")
+    for role, count in stats['messages_by_role'].items():
+        print(f"      - {role}: {count} messages")
 
     # 5. Export a conversation
     print("\n5. EXPORTING CONVERSATION (session_002):")
@@ -0,0 +1,59 @@
+"""
+Tests for ChatDatabase instrumentation
+"""
+
+import json
+
+from chat_database import ChatDatabase
+from db_metrics import DatabaseMetrics
+
+
+def test_disabled_metrics_leave_methods_unwrapped(tmp_path):
+    with ChatDatabase(str(tmp_path / 'chat.db')) as db:
+        assert 'add_message' not in vars(db)
+        db.add_message(db.create_conversation('s1'), 'human', 'hello')
+        assert db.stats() == {'conversations': 1, 'messages': 1, 'messages_by_role': {'human': 1}}
+
+
+def test_methods_record_latency_rows_and_export(tmp_path):
+    metrics = DatabaseMetrics()
+    with ChatDatabase(str(tmp_path / 'chat.db'), metrics=metrics) as db:
+        conv_id = db.create_conversation('s1', 'Refunds')
+        db.add_message(conv_id, 'human', 'I want a refund')
+        db.add_message(conv_id, 'ai', 'Refund approved')
+        assert len(db.get_conversation_messages('s1')) == 2
+        db.search_messages('refund')
+        db.export_conversation('s1')
+        db.get_or_create_conversation_with_history('s1')
+
+        stats = db.stats()
+    methods = stats['methods']
+    assert methods['add_message']['calls'] == 2
+    # add_message runs add_messages and add_message_groups, only the outer call counts
+    assert 'add_messages' not in methods and 'add_message_groups' not in methods
+    assert methods['get_or_create_conversation_with_history']['rows'] == 2
+    assert methods['get_conversation_messages']['rows'] == 2
+    assert methods['search_messages']['rows'] == 2
+    assert methods['export_conversation']['rows'] == 2
+    assert 0 < methods['create_conversation']['p50_ms'] <= methods['create_conversation']['max_ms']
+    assert stats['slow_query_count'] == 0
+
+    text = metrics.to_prometheus()
+    assert 'chat_db_method_duration_seconds_count{method="add_message"} 2' in text
+    assert 'chat_db_method_duration_seconds_bucket{method="add_message",le="+Inf"} 2' in text
+    assert 'chat_db_method_rows_total{method="get_conversation_messages"} 2' in text
+    assert json.loads(metrics.to_json())['methods']['add_message']['calls'] == 2
+
+
+def test_slow_query_log_captures_query_plans(tmp_path):
+    metrics = DatabaseMetrics(slow_query_ms=0)
+    with ChatDatabase(str(tmp_path / 'chat.db'), metrics=metrics) as db:
+        db.add_message(db.create_conversation('s1'), 'human', 'hello')
+        metrics.reset()
+        db.get_conversation_messages('s1')
+
+    [entry] = metrics.stats()['slow_queries']
+    assert entry['method'] == 'get_conversation_messages'
+    [statement] = entry['statements']
+    assert "c.session_id = 's1'" in statement['sql']
+    assert any('conversations' in step for step in statement['plan'])
@@ -0,0 +1,137 @@
+"""
+Tests for the LLM scheduler using the offline fake chat model
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+pytest.importorskip('langchain_core')
+
+from fake_chat_model import FakeChatModel, FakeRateLimitError
+from llm_scheduler import BATCH, INTERACTIVE, LLMScheduler, ScheduledChatModel
+
+
+@pytest.fixture
+def scheduler():
+    sched = LLMScheduler(max_concurrency=1, base_delay=0.01)
+    yield sched
+    sched.close()
+
+
+def test_interactive_lane_is_served_before_queued_batch_work(scheduler):
+    gate = threading.Event()
+    order = []
+    blocker = scheduler.submit(gate.wait, lane=BATCH)
+    batch = [scheduler.submit(lambda i=i: order.append(f'batch{i}'), lane=BATCH) for i in range(3)]
+    interactive = scheduler.submit(lambda: order.append('interactive'), lane=INTERACTIVE)
+
+    gate.set()
+    for future in [blocker, interactive] + batch:
+        future.result(timeout=5)
+    assert order == ['interactive', 'batch0', 'batch1', 'batch2']
+
+
+def test_request_bucket_spaces_out_calls():
+    # 600 requests/minute with a one-request burst: one call every 0.1s
+    sched = LLMScheduler(requests_per_minute=600, burst_seconds=0.1)
+    try:
+        start = time.monotonic()
+        for future in [sched.submit(lambda: None) for _ in range(4)]:
+            future.result(timeout=5)
+        assert time.monotonic() - start >= 0.25
+    finally:
+        sched.close()
+
+
+def test_identical_prompts_in_flight_share_one_call(scheduler):
+    model = ScheduledChatModel(model=FakeChatModel(latency=0.2), scheduler=scheduler)
+
+    async def ask_three_times():
+        return await asyncio.gather(*(model.ainvoke('Where is my order?') for _ in range(3)))
+
+    replies = asyncio.run(ask_three_times())
+    assert len({reply.content for reply in replies}) == 1
+    assert model.model.calls == 1
+    assert scheduler.stats()['coalesced'] == 2
+
+
+def test_rate_limit_errors_are_retried_with_backoff(scheduler):
+    fake = FakeChatModel(fail_calls=2)
+    model = ScheduledChatModel(model=fake, scheduler=scheduler)
+    assert model.invoke('hello').content
+    assert fake.calls == 3 and scheduler.stats()['retries'] == 2
+
+    impatient = LLMScheduler(max_retries=1, base_delay=0.01)
+    try:
+        with pytest.raises(FakeRateLimitError):
+            ScheduledChatModel(model=FakeChatModel(fail_calls=2), scheduler=impatient).invoke('hello')
+        assert impatient.stats()['failed'] == 1
+    finally:
+        impatient.close()
+
+
+def test_streams_hold_a_slot_until_finished(scheduler):
+    model = ScheduledChatModel(model=FakeChatModel(reply_words=5), scheduler=scheduler).with_lane(BATCH)
+    chunks = model.stream('stream please')
+    first = next(chunks)
+    assert scheduler.stats()['running'][BATCH] == 1
+    rest = ''.join(chunk.content for chunk in chunks)
+    assert len((first.content + rest).split()) == 5
+    assert scheduler.stats()['running'][BATCH] == 0
+
+
+def test_cancelled_calls_give_back_their_key_and_slot(scheduler):
+    gate = threading.Event()
+    blocker = scheduler.submit(gate.wait)
+    stale = scheduler.submit(lambda: 'stale', key='prompt')
+    assert stale.cancel()
+    fresh = scheduler.submit(lambda: 'fresh', key='prompt')
+    gate.set()
+    assert blocker.result(timeout=5) and fresh.result(timeout=5) == 'fresh'
+    assert scheduler.submit(lambda: 'again', key='prompt').result(timeout=5) == 'again'
+
+    async def cancel_after_grant():
+        gate.clear()
+        blocker = scheduler.submit(gate.wait)
+        waiter = asyncio.ensure_future(scheduler.aadmit())
+        await asyncio.sleep(0)
+        gate.set()
+        # Block the loop so the grant lands before the waiting task can resume
+        while scheduler.stats()['running'][INTERACTIVE] != 1 or not blocker.done():
+            time.sleep(0.01)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+
+    asyncio.run(cancel_after_grant())
+    assert scheduler.stats()['running'][INTERACTIVE] == 0
+    assert scheduler.submit(lambda: 'after', key='other').result(timeout=5) == 'after'
+
+
+def test_cancelled_caller_does_not_cancel_coalesced_callers(scheduler):
+    model = ScheduledChatModel(model=FakeChatModel(latency=0.2), scheduler=scheduler)
+
+    async def cancel_one_of_two():
+        first = asyncio.ensure_future(model.ainvoke('Where is my order?'))
+        second = asyncio.ensure_future(model.ainvoke('Where is my order?'))
+        await asyncio.sleep(0.05)
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        return first.cancelled(), (await second).content
+
+    cancelled, reply = asyncio.run(cancel_one_of_two())
+    assert cancelled and reply and model.model.calls == 1
+
+    # Once every caller has gone a queued call never runs
+    gate = threading.Event()
+    blocker = scheduler.submit(gate.wait)
+    ran = []
+    callers = [scheduler.submit(lambda: ran.append(1), key='abandoned') for _ in range(2)]
+    assert callers[0].cancel() and not callers[1].cancelled()
+    assert callers[1].cancel()
+    gate.set()
+    assert blocker.result(timeout=5)
+    assert scheduler.submit(lambda: 'after', key='abandoned').result(timeout=5) == 'after'
+    assert ran == []
@@ -0,0 +1,100 @@
+"""
+Tests for the model router using fake providers with scripted latency
+"""
+
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip('langchain_core')
+
+from fake_chat_model import FakeChatModel
+from model_router import ModelRouter, build_router
+
+
+def test_requests_go_to_the_fastest_provider():
+    slow, fast = FakeChatModel(latency=0.03), FakeChatModel(latency=0.0)
+    router = ModelRouter(providers={'slow': slow, 'fast': fast}, hedge=False)
+
+    providers = [router.invoke(f'question {i}').response_metadata['provider'] for i in range(10)]
+
+    # Each provider is measured once, then the fast one takes all traffic
+    assert providers[:2] == ['slow', 'fast']
+    assert set(providers[2:]) == {'fast'}
+    assert router.ranked() == ['fast', 'slow']
+    assert router.stats()['providers']['slow']['p95_ms'] >= 30
+
+
+def test_streamed_calls_feed_the_latency_ranking():
+    slow = FakeChatModel(latency=0.03, token_latency=0.005, reply_words=4)
+    fast = FakeChatModel(latency=0.0, reply_words=4)
+    router = ModelRouter(providers={'slow': slow, 'fast': fast}, hedge=False)
+
+    for i in range(2):
+        for _ in router.stream(f'question {i}'):
+            # Time the caller spends per chunk is not charged to the provider
+            time.sleep(0.02)
+    # The slow provider went first and its sample covers the whole reply
+    assert 45 <= router.stats()['providers']['slow']['p95_ms'] < 100
+    assert router.ranked() == ['fast', 'slow']
+
+    async def astream():
+        return [chunk async for chunk in router.astream('async question')]
+
+    asyncio.run(astream())
+    assert router.stats()['providers']['fast']['p95_ms'] < 45 and fast.calls == 2
+
+
+def test_slow_request_is_hedged_to_the_runner_up():
+    primary = FakeChatModel(latency_script=[2.0])
+    router = ModelRouter(providers={'primary': primary, 'backup': FakeChatModel(latency=0.01)}, hedge_after=0.05)
+
+    start = time.monotonic()
+    reply = router.invoke('hello')
+    assert time.monotonic() - start < 1.0
+    assert reply.response_metadata['provider'] == 'backup'
+    assert router.stats()['hedges'] == 1
+
+    async def hedged():
+        primary.latency_script = [0.0, 2.0]  # second call is slow again
+        return await router.ainvoke('hello again')
+
+    assert asyncio.run(hedged()).response_metadata['provider'] == 'backup'
+    assert router.stats()['hedges'] == 2
+
+
+def test_hedged_async_calls_measure_the_losing_provider():
+    router = ModelRouter(providers={'slow': FakeChatModel(latency=0.5), 'fast': FakeChatModel(latency=0.02)},
+                         hedge_after=0.05)
+
+    async def ask():
+        return [(await router.ainvoke(f'question {i}')).response_metadata['provider'] for i in range(4)]
+
+    # The cancelled slow request leaves a lower-bound sample, so it stops going first
+    assert asyncio.run(ask()) == ['fast'] * 4
+    assert router.ranked() == ['fast', 'slow'] and router.stats()['hedges'] == 1
+
+
+def test_failing_provider_fails_over_and_is_benched():
+    broken = FakeChatModel(fail_calls=100)
+    router = ModelRouter(providers={'broken': broken, 'healthy': FakeChatModel()},
+                         hedge=False, min_samples=3)
+
+    for i in range(6):
+        assert router.invoke(f'question {i}').response_metadata['provider'] == 'healthy'
+    assert ''.join(chunk.content for chunk in router.stream('streamed'))
+
+    # Benched after three straight errors, no traffic until the cooldown ends
+    assert broken.calls == 3
+    stats = router.stats()['providers']
+    assert not stats['broken']['healthy'] and stats['healthy']['wins'] == 6
+
+
+def test_build_router_reads_provider_specs(monkeypatch):
+    monkeypatch.setenv('LLM_PROVIDERS', 'fake:0,fake:0.5')
+    router = build_router()
+    assert list(router.providers) == ['fake:0', 'fake:0.5']
+    assert router.providers['fake:0.5'].latency == 0.5
+    with pytest.raises(ValueError):
+        build_router('nosuch:model')
@@ -0,0 +1,55 @@
+"""
+Tests for the map-reduce paper summarizer using the offline fake chat model
+"""
+
+import asyncio
+
+import pytest
+
+pytest.importorskip('langchain_core')
+
+from fake_chat_model import FakeChatModel, FakeRateLimitError
+from paper_ingest import chunk_key, iter_chunks, map_chunks, summarize_paper
+from summary_store import SummaryStore
+
+
+def test_chunks_respect_token_budget_across_pages():
+    pages = ['intro ' * 50 + '\n\nshort paragraph\n\n' + 'x ' * 3000, 'continued ' * 10 + '\n\nend']
+
+    chunks = list(iter_chunks(pages, max_tokens=200))
+
+    assert len(chunks) > 2
+    assert all(len(chunk) <= 200 * 4 for chunk in chunks)
+    assert ' '.join(chunks).split() == ' '.join(pages).split()
+
+
+def test_rerun_reuses_cached_chunk_summaries(tmp_path):
+    paper = tmp_path / 'paper.txt'
+    paper.write_text('\n\n'.join(f'Section {i}. ' + 'attention weights ' * 300 for i in range(6)))
+    model = FakeChatModel()
+
+    with SummaryStore(str(tmp_path / 'summaries.db')) as store:
+        first = asyncio.run(summarize_paper(str(paper), 'Paper', 'Technical', 'Short', model, store,
+                                            'fake-chat', chunk_tokens=500, reduce_tokens=100))
+        first_calls = model.calls
+        second = asyncio.run(summarize_paper(str(paper), 'Paper', 'Technical', 'Short', model, store,
+                                             'fake-chat', chunk_tokens=500, reduce_tokens=100))
+
+    assert first == second
+    # The map step was cached, only collapse and reduce calls are repeated
+    assert model.calls - first_calls < first_calls - 6
+
+
+def test_failed_chunk_cancels_the_other_chunk_calls(tmp_path):
+    chunks = [f'chunk {i} about attention' for i in range(3)]
+    model = FakeChatModel(fail_calls=1, latency=0.2)
+
+    async def map_then_wait():
+        with pytest.raises(FakeRateLimitError):
+            await map_chunks(chunks, model, 'Paper', store, 'fake-chat')
+        # Calls still running after the failure would finish and save their summaries
+        await asyncio.sleep(0.3)
+
+    with SummaryStore(str(tmp_path / 'summaries.db')) as store:
+        asyncio.run(map_then_wait())
+        assert all(store.get_chunk_summary(chunk_key(chunk, 'fake-chat')) is None for chunk in chunks)
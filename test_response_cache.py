@@ -0,0 +1,72 @@
+"""
+Tests for the SQLite LLM response cache using the offline fake chat model
+"""
+
+import time
+
+import pytest
+
+pytest.importorskip('langchain_core')
+
+from langchain_core.prompts import load_prompt
+
+from fake_chat_model import FakeChatModel
+from response_cache import SQLiteResponseCache, stream_with_cache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    response_cache = SQLiteResponseCache(str(tmp_path / 'llm_cache.db'))
+    yield response_cache
+    response_cache.close()
+
+
+def test_repeat_chain_calls_are_served_from_cache(cache):
+    model = FakeChatModel(latency=0.2, cache=cache)
+    chain = load_prompt('template.json') | model
+    inputs = {'a': 'Attention Is All You Need', 'b': 'Technical', 'c': 'Short (1-2 paragraphs)'}
+
+    first = chain.invoke(inputs)
+    start = time.perf_counter()
+    second = chain.invoke(inputs)
+    elapsed = time.perf_counter() - start
+
+    assert second.content == first.content
+    assert model.calls == 1
+    assert elapsed < 0.1
+    assert cache.stats()['hits'] == 1
+
+
+def test_cache_key_includes_model_parameters(cache):
+    FakeChatModel(cache=cache).invoke('hello')
+    other = FakeChatModel(reply_words=5, cache=cache)
+    other.invoke('hello')
+
+    assert other.calls == 1
+
+
+def test_expired_and_oversized_entries_are_dropped(tmp_path):
+    cache = SQLiteResponseCache(str(tmp_path / 'llm_cache.db'), ttl_seconds=0, max_bytes=10 ** 9)
+    model = FakeChatModel(cache=cache)
+    model.invoke('hello')
+    time.sleep(0.01)
+    model.invoke('hello')
+    assert model.calls == 2
+
+    cache.max_bytes = 1
+    model.invoke('another prompt')
+    assert cache.stats()['entries'] == 0
+    assert cache.stats()['evictions'] >= 1
+    cache.close()
+
+
+def test_streamed_replies_are_cached_and_shared_with_invoke(cache):
+    model = FakeChatModel(reply_words=20, cache=cache)
+    prompt = load_prompt('template.json').invoke(
+        {'a': 'Attention Is All You Need', 'b': 'Technical', 'c': 'Short (1-2 paragraphs)'})
+
+    chunks = list(stream_with_cache(model, prompt))
+    assert len(chunks) > 1 and model.calls == 1
+    assert list(stream_with_cache(model, prompt)) == [''.join(chunks)]
+    assert model.invoke(prompt).content == ''.join(chunks)
+    assert model.calls == 1 and cache.stats()['hits'] == 2
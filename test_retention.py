@@ -0,0 +1,77 @@
+"""
+Tests for archiving idle conversations into monthly databases
+"""
+
+import os
+
+from chat_database import ChatDatabase
+from retention import RetentionManager, VacuumScheduler
+
+
+def test_idle_conversations_move_to_monthly_archives_and_back(tmp_path):
+    with ChatDatabase(str(tmp_path / 'chat.db')) as db:
+        for session, updated_at in (('old_jan', '2024-01-10 08:00:00'), ('old_feb', '2024-02-20 09:00:00'),
+                                    ('active', None)):
+            conv_id = db.create_conversation(session, session)
+            db.add_messages(conv_id, [('human', f'refund request from {session}'), ('ai', 'Refund approved')])
+            if updated_at:
+                db.conn.execute('UPDATE conversations SET updated_at = ? WHERE id = ?', (updated_at, conv_id))
+        db.conn.commit()
+
+        retention = RetentionManager(db, max_idle_days=90)
+        assert retention.archive_idle() == {'2024-01': 1, '2024-02': 1}
+        assert retention.archive_months() == ['2024-02', '2024-01']
+        assert os.path.exists(tmp_path / 'chat.archive-2024-01.db')
+
+        # The hot database only holds the active session
+        assert [c['session_id'] for c in db.get_recent_conversations()] == ['active']
+        assert db.get_conversation_messages('old_jan') == []
+        assert retention.get_conversation_messages('old_jan')[0] == ('human', 'refund request from old_jan')
+        assert {r['session_id'] for r in retention.search_messages('refund request')} == {'old_jan', 'old_feb', 'active'}
+
+        assert retention.restore_conversation('old_feb')
+        assert not retention.restore_conversation('missing')
+        assert len(db.get_conversation_messages('old_feb')) == 2
+        assert len(db.search_messages('old_feb')) == 1
+
+        report = VacuumScheduler(db, retention, min_free_ratio=0.0).run_once()
+        # old_feb keeps its old updated_at, so the next run archives it again
+        assert report['archived'] == {'2024-02': 1} and report['vacuumed']
+
+
+def test_resumed_sessions_merge_with_their_archived_history(tmp_path):
+    with ChatDatabase(str(tmp_path / 'chat.db')) as db:
+        retention = RetentionManager(db, max_idle_days=90)
+
+        def go_idle(conv_id, timestamp):
+            db.conn.execute('UPDATE conversations SET created_at = ?, updated_at = ? WHERE id = ?',
+                            (timestamp, timestamp, conv_id))
+            db.conn.commit()
+
+        first = db.create_conversation('returning', 'Refund')
+        db.add_messages(first, [('human', 'first visit'), ('ai', 'first answer')])
+        db.save_summary(first, 'customer asked about a refund', 2)
+        go_idle(first, '2024-03-05 08:00:00')
+        assert retention.archive_idle() == {'2024-03': 1}
+
+        # The customer comes back: a new, empty conversation starts in the hot database
+        second = db.create_conversation('returning')
+        assert second != first and db.get_conversation_messages('returning') == []
+        db.add_messages(second, [('human', 'second visit'), ('ai', 'second answer')])
+        assert [content for _, content in retention.get_conversation_messages('returning')] == \
+            ['first visit', 'first answer', 'second visit', 'second answer']
+
+        # Idle again in the same month: merged into the archived conversation
+        go_idle(second, '2024-03-20 08:00:00')
+        assert retention.archive_idle() == {'2024-03': 1}
+        third = db.create_conversation('returning')
+        db.add_message(third, 'human', 'third visit')
+
+        assert retention.restore_conversation('returning')
+        contents = [content for _, content in db.get_conversation_messages('returning')]
+        assert contents == ['first visit', 'first answer', 'second visit', 'second answer', 'third visit']
+        assert db.get_summary(third) == ('customer asked about a refund', 2)
+        conversation = db.export_conversation('returning')
+        assert conversation['created_at'].startswith('2024-03-05') and conversation['title'] == 'Refund'
+        with ChatDatabase(retention.archive_path('2024-03')) as archive:
+            assert archive.get_recent_conversations() == [] and archive.stats()['messages'] == 0
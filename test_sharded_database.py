@@ -0,0 +1,111 @@
+"""
+Tests for the sharded chat database and its rebalancing tool
+"""
+
+import os
+
+import pytest
+
+from chat_database import ChatDatabase
+from sharded_database import ShardedChatDatabase, rebalance, shard_path, split_id
+from synthetic_corpus import generate_conversations, session_ids
+
+
+@pytest.fixture
+def shard_dir(tmp_path):
+    directory = str(tmp_path / 'shards')
+    with ShardedChatDatabase(directory, shards=4) as db:
+        db.import_conversations(generate_conversations(200, 6))
+    return directory
+
+
+def test_sessions_are_routed_to_their_shard_and_reads_fan_out(shard_dir):
+    with ShardedChatDatabase(shard_dir) as db:
+        sessions = session_ids(200)
+        stats = db.stats()
+        assert stats['conversations'] == 200 and stats['messages'] == 1200
+        assert all(shard['conversations'] > 20 for shard in stats['shards'])
+
+        for session_id in sessions[:20]:
+            conversation_id, rows = db.get_or_create_conversation_with_history(session_id)
+            assert split_id(conversation_id)[0] == db.shard_for(session_id)
+            assert [(role, content) for _, role, content in rows] == db.get_conversation_messages(session_id)
+
+        conversation_id = db.create_conversation('new-session')
+        ids = db.add_messages(conversation_id, [('human', 'refund please'), ('ai', 'refund approved')])
+        assert db.get_messages_since('new-session', ids[0]) == [(ids[1], 'ai', 'refund approved')]
+        assert db.get_messages_by_ids(ids) == [(ids[0], 'human', 'refund please'), (ids[1], 'ai', 'refund approved')]
+
+        recent = db.get_recent_conversations(5)
+        assert recent[0]['session_id'] == 'new-session' and len(recent) == 5
+        assert [c['updated_at'] for c in recent] == sorted((c['updated_at'] for c in recent), reverse=True)
+
+        results = db.search_messages('refund', limit=10)
+        assert len(results) == 10 and len({r['session_id'] for r in results}) > 1
+        assert [r['rank'] for r in results] == sorted(r['rank'] for r in results)
+
+        with pytest.raises(ValueError):
+            ShardedChatDatabase(shard_dir, shards=8)
+
+
+def test_rebalance_moves_only_reassigned_sessions(shard_dir):
+    with ShardedChatDatabase(shard_dir) as db:
+        before = {s: db.export_conversation(s) for s in session_ids(200)}
+        for session_id in before:
+            db.save_summary(db.create_conversation(session_id), f'summary of {session_id}', 4)
+
+    report = rebalance(shard_dir, 5)
+    # Consistent hashing: the new shard takes roughly a fifth, nothing else moves
+    assert 15 < report['moved_sessions'] < 80
+    with ShardedChatDatabase(shard_dir) as db:
+        assert db.stats()['messages'] == 1200 and len(db.shards) == 5
+        assert all(db.export_conversation(s) == before[s] for s in before)
+        assert db.shards[4].stats()['conversations'] == report['moved_sessions']
+
+    assert rebalance(shard_dir, 2)['to_shards'] == 2
+    assert not os.path.exists(shard_path(shard_dir, 2))
+    with ShardedChatDatabase(shard_dir) as db:
+        assert db.stats()['messages'] == 1200
+        assert all(db.export_conversation(s) == before[s] for s in before)
+        assert all(db.get_summary(db.create_conversation(s)) == (f'summary of {s}', 4) for s in before)
+        for index, shard in enumerate(db.shards):
+            assert {c['session_id'] for c in shard.get_recent_conversations(200)} == \
+                {s for s in before if db.shard_for(s) == index}
+
+
+def test_interrupted_rebalance_can_be_repeated(shard_dir):
+    # A copy left in the new shard by a run that stopped before deleting the source
+    with ShardedChatDatabase(shard_dir) as db:
+        moving = next(s for s in session_ids(200) if db.shard_for(s) != 0)
+        original = db.export_conversation(moving)
+    with ChatDatabase(shard_path(shard_dir, 0)) as leftover:
+        leftover.import_conversations([{'session_id': moving, 'messages': [('human', 'partial copy')]}])
+
+    report = rebalance(shard_dir, 1)
+    with ShardedChatDatabase(shard_dir) as db:
+        assert db.export_conversation(moving) == original
+        assert db.stats()['messages'] == 1200 and report['moved_sessions'] > 100
+
+
+def test_chat_turns_run_against_shards(tmp_path):
+    pytest.importorskip('langchain_core')
+    from fake_chat_model import FakeChatModel
+    from message_placeholder_db import chat_with_history, history_cache
+
+    with ShardedChatDatabase(str(tmp_path / 'shards'), shards=3, history_cache=history_cache) as db:
+        for turn in range(2):
+            for session_id in ('sharded-a', 'sharded-b', 'sharded-c'):
+                chat_with_history(session_id, f'question {turn}', db=db, model=FakeChatModel())
+        assert db.stats()['messages'] == 12
+        assert len(db.get_conversation_messages('sharded-b')) == 4
+
+        ids = [row[0] for batch in db.iter_all_messages(batch_size=5) for row in batch]
+        assert ids == sorted(ids) and len(ids) == 12
+        assert [row[0] for batch in db.iter_all_messages(since_id=ids[5]) for row in batch] == ids[6:]
+
+        # Retrieval keeps one index per shard, a quiet shard's new rows are not skipped
+        assert db.shard_for('sharded-a') != db.shard_for('sharded-b')
+        for session_id in ('sharded-a', 'sharded-a', 'sharded-b', 'sharded-b'):
+            chat_with_history(session_id, 'question 2', retrieval_k=2, db=db, model=FakeChatModel())
+        from message_placeholder_db import get_vector_index
+        assert len(get_vector_index(db)) == db.stats()['messages'] == 20
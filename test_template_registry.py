@@ -0,0 +1,49 @@
+"""
+Tests for the prompt template registry
+"""
+
+import os
+
+import pytest
+
+pytest.importorskip('langchain_core')
+
+from langchain_core.prompts import PromptTemplate
+
+from fake_chat_model import FakeChatModel
+from template_registry import TemplateRegistry
+
+
+def save_template(path, text, mtime):
+    PromptTemplate.from_template(text).save(str(path))
+    os.utime(path, ns=(mtime, mtime))
+
+
+def test_template_loaded_once_and_reloaded_on_change(tmp_path):
+    path = tmp_path / 'template.json'
+    save_template(path, 'Summarize {a} in {b} style, {c}', 1_000_000_000)
+    registry = TemplateRegistry()
+
+    first = registry.get_template(str(path), ('a', 'b', 'c'))
+    assert registry.get_template(str(path), ('a', 'b', 'c')) is first
+    assert registry.loads == 1
+
+    models = []
+    chain = registry.get_chain(str(path), 'fake', lambda: models.append(1) or FakeChatModel())
+    assert registry.get_chain(str(path), 'fake', FakeChatModel) is chain
+
+    save_template(path, 'Explain {a} in {b} style, {c}', 2_000_000_000)
+    reloaded = registry.get_template(str(path), ('a', 'b', 'c'))
+    assert reloaded is not first
+    assert reloaded.template.startswith('Explain')
+    assert registry.get_chain(str(path), 'fake', FakeChatModel) is not chain
+    # The model is shared across template versions
+    assert len(models) == 1
+
+
+def test_template_with_wrong_variables_rejected(tmp_path):
+    path = tmp_path / 'template.json'
+    save_template(path, 'Summarize {paper}', 1_000_000_000)
+
+    with pytest.raises(ValueError, match='expects variables'):
+        TemplateRegistry().get_template(str(path), ('a', 'b', 'c'))
@@ -0,0 +1,94 @@
+"""
+Tests for the write-behind message writer
+"""
+
+import threading
+
+import pytest
+
+from chat_database import ChatDatabase
+from write_behind import WriteBehindWriter
+
+
+@pytest.fixture
+def db(tmp_path):
+    with ChatDatabase(str(tmp_path / 'chat.db'), pooled=True) as database:
+        yield database
+
+
+def test_queued_writes_are_group_committed_in_order(db):
+    conv_ids = [db.create_conversation(f's{i}') for i in range(3)]
+    writer = WriteBehindWriter(db, flush_interval_ms=50)
+
+    futures = [writer.submit(conv_ids[i % 3], [('human', f'question {i}'), ('ai', f'answer {i}')])
+               for i in range(30)]
+    writer.flush()
+
+    assert all(len(future.result(0)) == 2 for future in futures)
+    # 30 turns arrive well within one flush interval
+    assert writer.counters['commits'] == 1 and writer.counters['messages'] == 60
+    assert writer.pending(conv_ids[0]) is None
+    contents = [content for _, content in db.get_conversation_messages('s1')]
+    assert contents[::2] == [f'question {i}' for i in range(1, 30, 3)]
+    writer.close()
+
+
+def test_failed_write_does_not_fail_its_batch(db):
+    conv_id, other_id = db.create_conversation('s1'), db.create_conversation('s2')
+    writer = WriteBehindWriter(db, flush_interval_ms=50)
+
+    good = writer.submit(conv_id, [('human', 'hello')])
+    bad = writer.submit(conv_id, [('robot', 'not a valid role')])
+    later = writer.submit(conv_id, [('ai', 'hi there')])
+    neighbour = writer.submit(other_id, [('human', 'unrelated')])
+    writer.flush()
+
+    assert good.result(0) and neighbour.result(0)
+    with pytest.raises(ValueError):
+        bad.result(0)
+    # Storing the later turn would leave a gap where the failed one was
+    with pytest.raises(RuntimeError):
+        later.result(0)
+    assert db.get_conversation_messages('s1') == [('human', 'hello')]
+    assert db.get_conversation_messages('s2') == [('human', 'unrelated')]
+    assert writer.stats()['failed'] == 2
+
+    # Once the queue behind the failure has drained the conversation takes writes again
+    assert writer.submit(conv_id, [('ai', 'hi there')]).result(5)
+    writer.close()
+    assert db.get_conversation_messages('s1') == [('human', 'hello'), ('ai', 'hi there')]
+
+
+def test_wait_makes_a_conversation_readable(db):
+    conv_id = db.create_conversation('s1')
+    writer = WriteBehindWriter(db)
+    gate = threading.Event()
+    original = db.add_message_groups
+    db.add_message_groups = lambda groups: gate.wait() and original(groups)
+
+    writer.submit(conv_id, [('human', 'queued')])
+    assert db.get_conversation_messages('s1') == []
+    gate.set()
+    writer.wait(conv_id)
+    assert db.get_conversation_messages('s1') == [('human', 'queued')]
+    writer.close()
+    with pytest.raises(RuntimeError):
+        writer.submit(conv_id, [('human', 'too late')])
+
+
+def test_chat_turns_with_write_behind_see_earlier_turns(db):
+    pytest.importorskip('langchain_core')
+    from fake_chat_model import FakeChatModel
+    from message_placeholder_db import chat_with_history
+
+    writer = WriteBehindWriter(db, flush_interval_ms=200)
+    model = FakeChatModel()
+    first = chat_with_history('write-behind-session', 'Where is my order?', writer=writer, model=model)
+    chat_with_history('write-behind-session', 'Any update?', writer=writer, model=model)
+    writer.close()
+
+    messages = db.get_conversation_messages('write-behind-session')
+    assert [role for role, _ in messages] == ['human', 'ai', 'human', 'ai']
+    assert messages[1][1] == first
+    # The second prompt was built after the first exchange was committed
+    assert writer.counters['commits'] == 2
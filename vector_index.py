@@ -0,0 +1,166 @@
+"""
+Vector Index Module
+Local embedding index stored next to the chat database: float32 vectors in an
+append-only memory-mapped file, searched with batched cosine similarity in NumPy
+"""
+
+import json
+import os
+import threading
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class HashingEmbedder:
+    """Offline embedding backend using scikit-learn's stateless HashingVectorizer"""
+
+    def __init__(self, dim: int = 512):
+        from sklearn.feature_extraction.text import HashingVectorizer
+
+        self.dim = dim
+        self.name = f'hashing-{dim}'
+        # Stateless, so vectors computed today stay comparable with vectors computed later
+        self.vectorizer = HashingVectorizer(
+            n_features=dim, ngram_range=(1, 2), alternate_sign=False, norm='l2'
+        )
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """Return an (n, dim) float32 matrix of unit-length vectors"""
+        return self.vectorizer.transform(texts).astype(np.float32).toarray()
+
+
+class VectorIndex:
+    """Append-only cosine similarity index over texts identified by integer IDs"""
+
+    def __init__(self, path: str, embedder: Optional[HashingEmbedder] = None,
+                 block_rows: int = 65536):
+        """
+        Args:
+            path: File prefix, e.g. "chat_history.db" stores chat_history.db.vectors.f32,
+                chat_history.db.vectors.ids and chat_history.db.vectors.json
+            embedder: Embedding backend, defaults to HashingEmbedder()
+            block_rows: Rows scored per NumPy matrix product during search
+        """
+        self.embedder = embedder or HashingEmbedder()
+        self.dim = self.embedder.dim
+        self.block_rows = block_rows
+        self.vectors_path = f'{path}.vectors.f32'
+        self.ids_path = f'{path}.vectors.ids'
+        self.meta_path = f'{path}.vectors.json'
+        self._lock = threading.Lock()
+        self._vectors = None
+        self._ids = None
+        self._mapped_rows = -1
+
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+            if meta['embedder'] != self.embedder.name:
+                raise ValueError(f"Index at {path} was built with {meta['embedder']}, "
+                                 f"not {self.embedder.name}; delete it to rebuild")
+        else:
+            with open(self.meta_path, 'w') as f:
+                json.dump({'embedder': self.embedder.name, 'dim': self.dim}, f)
+
+    def __len__(self) -> int:
+        """Number of indexed vectors"""
+        return os.path.getsize(self.ids_path) // 8 if os.path.exists(self.ids_path) else 0
+
+    def last_id(self) -> int:
+        """Return the highest indexed ID, or 0 for an empty index"""
+        ids = self._mapped()[1]
+        return int(ids[-1]) if len(ids) else 0
+
+    def add(self, ids: Sequence[int], texts: Sequence[str]):
+        """Embed texts and append them, skipping IDs that are already indexed"""
+        last_id = self.last_id()
+        pairs = [(i, text) for i, text in zip(ids, texts) if i > last_id]
+        if not pairs:
+            return
+        ids = [i for i, _ in pairs]
+        vectors = self.embedder.embed([text for _, text in pairs])
+        with self._lock:
+            # A crash between the two appends leaves vectors without IDs; drop them so the
+            # ID file, which decides the length, keeps lining up with the vector file
+            rows = len(self)
+            self._truncate(self.vectors_path, rows * self.dim * 4)
+            self._truncate(self.ids_path, rows * 8)
+            with open(self.vectors_path, 'ab') as f:
+                f.write(vectors.tobytes())
+            with open(self.ids_path, 'ab') as f:
+                f.write(np.asarray(ids, dtype=np.int64).tobytes())
+
+    @staticmethod
+    def _truncate(path: str, size: int):
+        """Cut a file back to size bytes if it is longer"""
+        if os.path.exists(path) and os.path.getsize(path) > size:
+            os.truncate(path, size)
+
+    def sync(self, db, batch_size: int = 5000) -> int:
+        """Index every message of a ChatDatabase newer than the last indexed one, return the count"""
+        added = 0
+        for batch in db.iter_all_messages(since_id=self.last_id(), batch_size=batch_size):
+            self.add([row[0] for row in batch], [row[2] for row in batch])
+            added += len(batch)
+        return added
+
+    def _mapped(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Return memory maps of the vector and ID files, remapping after appends"""
+        with self._lock:
+            rows = len(self)
+            if rows != self._mapped_rows:
+                if rows == 0:
+                    self._vectors = np.zeros((0, self.dim), dtype=np.float32)
+                    self._ids = np.zeros(0, dtype=np.int64)
+                else:
+                    self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r',
+                                              shape=(rows, self.dim))
+                    self._ids = np.memmap(self.ids_path, dtype=np.int64, mode='r', shape=(rows,))
+                self._mapped_rows = rows
+            return self._vectors, self._ids
+
+    def search(self, query: str, k: int = 5,
+               ids: Optional[Iterable[int]] = None) -> List[Tuple[int, float]]:
+        """Return the k most similar (id, cosine score) pairs, optionally only among the given IDs"""
+        return self.search_batch([query], k, ids)[0]
+
+    def search_batch(self, queries: Sequence[str], k: int = 5,
+                     ids: Optional[Iterable[int]] = None) -> List[List[Tuple[int, float]]]:
+        """Top-k cosine search for several queries with one matrix product per block"""
+        vectors, all_ids = self._mapped()
+        query_vectors = self.embedder.embed(list(queries))
+
+        if ids is not None:
+            # IDs are appended in increasing order, so a restricted search is a sorted lookup
+            wanted = np.unique(np.fromiter(ids, dtype=np.int64))
+            positions = np.searchsorted(all_ids, wanted)
+            positions = positions[positions < len(all_ids)]
+            positions = positions[np.isin(all_ids[positions], wanted)]
+            blocks = [(np.asarray(vectors[positions]), np.asarray(all_ids[positions]))]
+        else:
+            blocks = ((np.asarray(vectors[start:start + self.block_rows]),
+                       np.asarray(all_ids[start:start + self.block_rows]))
+                      for start in range(0, len(all_ids), self.block_rows))
+
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_ids = np.zeros((len(queries), 0), dtype=np.int64)
+        for block_vectors, block_ids in blocks:
+            if not len(block_ids):
+                continue
+            # Vectors are unit length, so the dot product is the cosine similarity
+            scores = query_vectors @ block_vectors.T
+            scores = np.concatenate([best_scores, scores], axis=1)
+            candidates = np.concatenate(
+                [best_ids, np.broadcast_to(block_ids, (len(queries), len(block_ids)))], axis=1
+            )
+            keep = min(k, scores.shape[1])
+            top = np.argpartition(-scores, keep - 1, axis=1)[:, :keep]
+            best_scores = np.take_along_axis(scores, top, axis=1)
+            best_ids = np.take_along_axis(candidates, top, axis=1)
+
+        results = []
+        for scores, row_ids in zip(best_scores, best_ids):
+            order = np.argsort(-scores)
+            results.append([(int(row_ids[i]), float(scores[i])) for i in order])
+        return results
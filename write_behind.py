@@ -0,0 +1,212 @@
+"""
+Write-Behind Message Writer
+Takes message inserts off the response path. Callers queue an exchange and return
+at once. A background thread drains the queue and commits everything it finds in
+one transaction (group commit), so a burst of turns costs one commit, not one
+per turn.
+
+Durability knob: with flush_interval_ms=0 a batch is committed as soon as the
+writer picks it up. With N > 0 the writer waits up to N ms to gather a larger
+batch, which means fewer commits but up to N ms more of unsaved turns on a
+crash. Writes are committed in the order they were queued, so after a crash
+each session's history is a prefix of what was sent, never one with a gap. For
+the same reason a write that fails also fails the writes of its conversation
+queued behind it.
+
+Usage:
+    writer = WriteBehindWriter(db, flush_interval_ms=5)
+    writer.submit(conv_id, [('human', query), ('ai', reply)])
+    writer.wait(conv_id)    # before reading that conversation back
+    writer.close()          # flushes whatever is still queued
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class _Write:
+    """Messages queued for one conversation and the future their IDs are delivered on"""
+
+    __slots__ = ('conversation_id', 'messages', 'future')
+
+    def __init__(self, conversation_id: int, messages: List[Tuple]):
+        self.conversation_id = conversation_id
+        self.messages = messages
+        self.future: Future = Future()
+
+
+# Queued by close() after the last write
+_STOP = object()
+
+
+class WriteBehindWriter:
+    """Single background thread that group-commits queued message writes"""
+
+    def __init__(self, db, flush_interval_ms: float = 0, max_batch: int = 1000, max_pending: int = 10000):
+        """
+        Args:
+            db: ChatDatabase the messages are written to; pooled mode lets readers
+                on other threads run while a batch commits
+            flush_interval_ms: 0 commits each batch as soon as it is picked up, N > 0
+                gathers writes for up to N ms per commit
+            max_batch: Most writes committed in one transaction
+            max_pending: Queued writes before submit() blocks
+        """
+        self.db = db
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_batch = max_batch
+        self.counters = {'writes': 0, 'messages': 0, 'commits': 0, 'failed': 0}
+        self._queue: 'queue.Queue' = queue.Queue()
+        # Bounds queued writes without ever blocking while _lock is held
+        self._capacity = threading.Semaphore(max_pending)
+        self._lock = threading.Lock()
+        # Newest uncommitted write per conversation, done means all earlier ones are too
+        self._last: Dict[int, Future] = {}
+        # Conversations with a failed write and later writes still queued, cleared once those are failed too
+        self._failed: Dict[int, Exception] = {}
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='chat-db-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, conversation_id: int, messages: List[Tuple], block: bool = True) -> Future:
+        """
+        Queue messages for a conversation, same tuples as ChatDatabase.add_messages
+
+        Returns:
+            Future resolving to the inserted message IDs once committed
+
+        Raises:
+            queue.Full: block is False and max_pending writes are already queued
+        """
+        write = _Write(conversation_id, list(messages))
+        if not self._capacity.acquire(blocking=block):
+            raise queue.Full
+        with self._lock:
+            if self._closed:
+                self._capacity.release()
+                raise RuntimeError('WriteBehindWriter is closed')
+            # Put under the lock so queue order matches _last
+            self._queue.put(write)
+            self._last[conversation_id] = write.future
+        return write.future
+
+    def pending(self, conversation_id: int) -> Optional[Future]:
+        """Future of the newest queued write for a conversation, None when all are committed"""
+        with self._lock:
+            return self._last.get(conversation_id)
+
+    def wait(self, conversation_id: int, timeout: Optional[float] = None):
+        """Block until every write queued so far for a conversation is committed or has failed"""
+        future = self.pending(conversation_id)
+        if future is not None:
+            future.exception(timeout)
+
+    def flush(self, timeout: Optional[float] = None):
+        """Block until every write queued before this call is committed or has failed"""
+        if self._closed:
+            return  # close() already committed everything
+        marker = threading.Event()
+        self._queue.put(marker)
+        if not marker.wait(timeout):
+            raise TimeoutError('Write-behind flush timed out')
+
+    def close(self):
+        """Commit everything still queued and stop the writer thread"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self.counters, 'queued': self._queue.qsize(), 'sessions_pending': len(self._last)}
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            if self.flush_interval:
+                deadline = time.monotonic() + self.flush_interval
+                # A flush or close marker ends the wait early
+                while len(batch) < self.max_batch and isinstance(batch[-1], _Write):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+            else:
+                while len(batch) < self.max_batch:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+            self._commit([item for item in batch if isinstance(item, _Write)])
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    item.set()
+                elif item is _STOP:
+                    stopping = True
+
+    def _commit(self, writes: List[_Write]):
+        """Write a batch in one transaction, or one write at a time if the batch fails"""
+        writes = [write for write in writes if not self._behind_failure(write)]
+        if not writes:
+            return
+        try:
+            results = self.db.add_message_groups([(w.conversation_id, w.messages) for w in writes])
+        except Exception:
+            # Keep one bad write (e.g. a deleted conversation) from failing other conversations
+            for write in writes:
+                if self._behind_failure(write):
+                    continue
+                try:
+                    ids = self.db.add_messages(write.conversation_id, write.messages)
+                    self.counters['commits'] += 1
+                except Exception as exc:
+                    logger.error("Write-behind insert for conversation %s failed: %s",
+                                 write.conversation_id, exc)
+                    with self._lock:
+                        if self._last.get(write.conversation_id) is not write.future:
+                            self._failed[write.conversation_id] = exc
+                    self._done(write, error=exc)
+                else:
+                    self._done(write, ids)
+        else:
+            self.counters['commits'] += 1
+            for write, ids in zip(writes, results):
+                self._done(write, ids)
+
+    def _behind_failure(self, write: _Write) -> bool:
+        """Fail a write queued behind a failed write of its conversation, it would leave a gap"""
+        cause = self._failed.get(write.conversation_id)
+        if cause is None:
+            return False
+        error = RuntimeError(f'An earlier write for conversation {write.conversation_id} failed: {cause}')
+        error.__cause__ = cause
+        self._done(write, error=error)
+        return True
+
+    def _done(self, write: _Write, ids: Optional[List[int]] = None, error: Optional[Exception] = None):
+        with self._lock:
+            if self._last.get(write.conversation_id) is write.future:
+                del self._last[write.conversation_id]
+                self._failed.pop(write.conversation_id, None)
+        self._capacity.release()
+        if error is None:
+            self.counters['writes'] += 1
+            self.counters['messages'] += len(ids)
+            write.future.set_result(ids)
+        else:
+            self.counters['failed'] += 1
+            write.future.set_exception(error)